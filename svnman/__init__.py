@@ -1,6 +1,9 @@
 import logging
 import os.path
 import string
+import sys
+import threading
+import typing
 from urllib.parse import urljoin
 
 import flask
@@ -10,15 +13,18 @@ import werkzeug.exceptions as wz_exceptions
 import pillarsdk
 from pillar.extension import PillarExtension
 from pillar.auth import current_user
-from pillar.api.projects import utils as proj_utils
 import pillar.api.users.avatar
-from pillar.api.utils import str2id
+from pillar.api.utils import str2id, random_etag, utcnow
 from pillar.api.utils.authorization import require_login
-from pillar.web import utils as web_utils
 from pillar import current_app
 
+if typing.TYPE_CHECKING:
+    from . import audit, events, ratelimit, remote
+
 EXTENSION_NAME = 'svnman'
 UNSET_PASSWORD = '$2y$1$password-empty'
+# Versions of cached fragments, shared by all processes: {'_id': name, 'version': int}
+FRAGMENT_VERSIONS_COLLECTION = 'svnman_fragment_versions'
 
 
 # SVNman stores the following keys in the project extension properties:
@@ -47,10 +53,27 @@ class SVNManExtension(PillarExtension):
     }
 
     def __init__(self):
-        from . import remote
+        from . import cache
 
         self._log = logging.getLogger('%s.SVNManExtension' % __name__)
-        self.remote: remote.API = None
+        self._config: typing.Mapping[str, typing.Any] = {}
+        # Constructed on first use, see the 'remote' and 'rate_limiter' properties.
+        self._remote: 'remote.API' = None
+        # PID of the process that warmed up the connections to the SVNman API.
+        self._warmed_up_pid: int = None
+        self._rate_limiter: 'ratelimit.RateLimiter' = None
+        self._rate_limiter_loaded = False
+        self._lazy_lock = threading.Lock()
+        self.audit_log: 'audit.AuditLog' = None
+        self.event_stream: 'events.EventStream' = None
+        self._stats_cache = cache.TTLCache(ttl=60, maxsize=1)
+        self._user_search_cache = cache.TTLCache(ttl=30, maxsize=1024)
+        self._user_search_indices_created = False
+        self._health_cache = cache.TTLCache(ttl=10, maxsize=1)
+        # Rendered template fragments, see sidebar_links() and routes.index().
+        self.fragment_cache = cache.TTLCache(ttl=300, maxsize=4096)
+        # Projects resolved by routes.require_project_put(), per project URL and user.
+        self.project_cache = cache.TTLCache(ttl=10, maxsize=1024)
 
     @property
     def name(self):
@@ -65,14 +88,88 @@ class SVNManExtension(PillarExtension):
         :rtype: dict
         """
 
-        # Just so that it registers the management commands.
-        from . import cli
+        # Web workers don't need the management commands, so they're only
+        # registered here when the CLI is loaded already; see setup_cli().
+        if 'pillar.cli' in sys.modules:
+            self.setup_cli()
 
         return {
             'SVNMAN_REPO_URL': 'http://SVNMAN_REPO_URL/repo/',
             'SVNMAN_API_URL': 'http://SVNMAN_API_URL/api/',
             'SVNMAN_API_USERNAME': 'SVNMAN_API_USERNAME',
             'SVNMAN_API_PASSWORD': 'SVNMAN_API_PASSWORD',
+            'SVNMAN_REPO_CACHE_SIZE': 1000,
+            'SVNMAN_ACCESS_PAGE_SIZE': 500,
+            'SVNMAN_ACCESS_WORKERS': 1,
+            'SVNMAN_API_TIMEOUT': 30.0,
+            'SVNMAN_API_MAX_RETRIES': 3,
+            # Time budget in seconds for handling a request that communicates with the
+            # SVNman API. Clients can shorten it with the given request header.
+            'SVNMAN_REQUEST_BUDGET': 20.0,
+            'SVNMAN_REQUEST_BUDGET_HEADER': 'X-Request-Budget',
+            # Adaptive limit on concurrent calls to the SVNman API, per process.
+            # Set SVNMAN_CONCURRENCY_MAX to 0 to disable the limit.
+            'SVNMAN_CONCURRENCY_MIN': 1,
+            'SVNMAN_CONCURRENCY_MAX': 20,
+            'SVNMAN_CONCURRENCY_INITIAL': 5,
+            'SVNMAN_CONCURRENCY_QUEUE_SIZE': 5,
+            'SVNMAN_CONCURRENCY_QUEUE_TIMEOUT': 1.0,
+            'SVNMAN_CONCURRENCY_LATENCY_TARGET': 2.0,
+            # Incoming request header to take the request ID from, if present.
+            'SVNMAN_REQUEST_ID_HEADER': 'X-Request-Id',
+            # Token-bucket rate limits per user and per project, {action: {rate, burst}},
+            # where 'rate' is in tokens per second. Set to {} to disable rate limiting.
+            'SVNMAN_RATE_LIMITS': {
+                'create-repo': {'rate': 1 / 60, 'burst': 5},
+                'grant-access': {'rate': 1, 'burst': 60},
+                'revoke-access': {'rate': 1, 'burst': 60},
+            },
+            # Either 'memory' (per process) or 'mongo' (shared between processes).
+            'SVNMAN_RATE_LIMIT_STORE': 'memory',
+            # Number of seconds the usage statistics are cached.
+            'SVNMAN_STATS_CACHE_TTL': 60,
+            # Number of users per page of the access list on the project settings page.
+            'SVNMAN_ACCESS_LIST_PAGE_SIZE': 50,
+            # Number of seconds results of the user typeahead are cached.
+            'SVNMAN_USER_SEARCH_CACHE_TTL': 30,
+            # Number of connections to the SVNman API to open on first use in each
+            # process, at most 10; 0 to disable.
+            'SVNMAN_WARMUP_CONNECTIONS': 0,
+            # Number of seconds the result of the health check probe is cached.
+            'SVNMAN_HEALTH_PROBE_TTL': 10,
+            # Number of seconds rendered sidebar and dashboard fragments are cached.
+            'SVNMAN_FRAGMENT_CACHE_TTL': 300,
+            # Number of seconds projects (and the user's permissions on them) resolved by
+            # the svnman routes are cached; 0 to disable.
+            'SVNMAN_PROJECT_CACHE_TTL': 10,
+            # Record repository and access changes in the svnman_audit collection.
+            'SVNMAN_AUDIT_LOG': True,
+            # Number of days audit entries are kept.
+            'SVNMAN_AUDIT_RETENTION_DAYS': 730,
+            # Audit entries are written in batches of at most this size, at least
+            # every SVNMAN_AUDIT_FLUSH_INTERVAL seconds.
+            'SVNMAN_AUDIT_BATCH_SIZE': 500,
+            'SVNMAN_AUDIT_FLUSH_INTERVAL': 1.0,
+            # Number of seconds between refreshes of the repository statistics by
+            # 'svn refresh_stats', for repositories with a commit in the last day,
+            # in the last 30 days, and for other repositories.
+            'SVNMAN_STATS_REFRESH_ACTIVE': 300,
+            'SVNMAN_STATS_REFRESH_NORMAL': 3600,
+            'SVNMAN_STATS_REFRESH_IDLE': 86400,
+            # Publish repository and access changes in the svnman_events capped
+            # collection, with its maximum size in bytes and number of events.
+            'SVNMAN_EVENTS': True,
+            'SVNMAN_EVENTS_SIZE': 16 * 1024 * 1024,
+            'SVNMAN_EVENTS_MAX': 100000,
+            # File to record SVNman API traffic to, for replaying with 'svn replay'.
+            # Use '{pid}' to get one file per process. Empty to disable recording.
+            'SVNMAN_TRAFFIC_RECORD_PATH': '',
+            # Directory to write profiles to; empty to disable profiling.
+            'SVNMAN_PROFILE_DIR': '',
+            # Fraction of requests and CLI runs to profile, between 0.0 and 1.0.
+            'SVNMAN_PROFILE_SAMPLE_RATE': 0.0,
+            # Requests by admins with this header are always profiled.
+            'SVNMAN_PROFILE_HEADER': 'X-Svnman-Profile',
         }
 
     def eve_settings(self):
@@ -100,15 +197,147 @@ class SVNManExtension(PillarExtension):
             routes.blueprint,
         ]
 
+    def setup_cli(self, manager=None):
+        """Registers the 'svn' management commands.
+
+        Call this from manage.py, after importing the Pillar manager:
+
+            from pillar.cli import manager
+            app.pillar_extensions['svnman'].setup_cli(manager)
+
+        :param manager: the flask_script Manager to register the commands
+            with; defaults to the one of pillar.cli.
+        """
+
+        from . import cli
+
+        cli.register(manager)
+
     def setup_app(self, app):
-        from . import remote
+        app.teardown_request(_flush_trace)
+        app.on_deleted_item_projects += self._project_deleted
+        # Forget cached projects when the permissions on them may have changed.
+        app.on_updated_projects += self._project_updated
+        app.on_replaced_projects += self._project_updated
+        app.on_updated_users += self._user_updated
+        app.on_replaced_users += self._user_updated
+        self._config = app.config
+        self._stats_cache.ttl = app.config['SVNMAN_STATS_CACHE_TTL']
+        self._user_search_cache.ttl = app.config['SVNMAN_USER_SEARCH_CACHE_TTL']
+        self._health_cache.ttl = app.config['SVNMAN_HEALTH_PROBE_TTL']
+        self.fragment_cache.ttl = app.config['SVNMAN_FRAGMENT_CACHE_TTL']
+        self.project_cache.ttl = app.config['SVNMAN_PROJECT_CACHE_TTL']
+
+        if app.config['SVNMAN_AUDIT_LOG']:
+            import atexit
+            from . import audit
+
+            def audit_collection():
+                with app.app_context():
+                    return app.db(audit.COLLECTION)
+
+            self.audit_log = audit.AuditLog(
+                audit_collection,
+                retention_days=app.config['SVNMAN_AUDIT_RETENTION_DAYS'],
+                batch_size=app.config['SVNMAN_AUDIT_BATCH_SIZE'],
+                flush_interval=app.config['SVNMAN_AUDIT_FLUSH_INTERVAL'],
+            )
+            atexit.register(self.audit_log.close)
+
+        if app.config['SVNMAN_EVENTS']:
+            from . import events
+
+            def events_db():
+                with app.app_context():
+                    return app.db()
 
-        self.remote = remote.API(
-            remote_url=app.config['SVNMAN_API_URL'],
-            username=app.config['SVNMAN_API_USERNAME'],
-            password=app.config['SVNMAN_API_PASSWORD'],
+            self.event_stream = events.EventStream(events_db,
+                                                   size=app.config['SVNMAN_EVENTS_SIZE'],
+                                                   max_events=app.config['SVNMAN_EVENTS_MAX'])
+
+    @property
+    def remote(self) -> 'remote.API':
+        """Client for the SVNman API, constructed on first use."""
+
+        if self._remote is None:
+            with self._lazy_lock:
+                if self._remote is None:
+                    self._remote = self._create_remote()
+        if self._warmed_up_pid != os.getpid():
+            self._warm_up_remote()
+        return self._remote
+
+    def _warm_up_remote(self):
+        """Opens connections to the SVNman API in the background.
+
+        Done on first use in each process rather than at startup, because
+        forked worker processes can't share the connections of their parent.
+        """
+
+        with self._lazy_lock:
+            pid = os.getpid()
+            if self._warmed_up_pid == pid:
+                return
+            self._warmed_up_pid = pid
+
+        connections = self._config.get('SVNMAN_WARMUP_CONNECTIONS', 0)
+        if not connections:
+            return
+        # Don't block the request on the SVNman server.
+        threading.Thread(target=self._remote.warm_up, args=(connections,),
+                         name='svnman-warmup', daemon=True).start()
+
+    @remote.setter
+    def remote(self, api: 'remote.API'):
+        self._remote = api
+
+    def _create_remote(self) -> 'remote.API':
+        from . import remote, limiter
+
+        config = self._config
+
+        concurrency_limiter = None
+        if config['SVNMAN_CONCURRENCY_MAX']:
+            concurrency_limiter = limiter.AdaptiveLimiter(
+                min_limit=config['SVNMAN_CONCURRENCY_MIN'],
+                max_limit=config['SVNMAN_CONCURRENCY_MAX'],
+                initial_limit=config['SVNMAN_CONCURRENCY_INITIAL'],
+                queue_size=config['SVNMAN_CONCURRENCY_QUEUE_SIZE'],
+                queue_timeout=config['SVNMAN_CONCURRENCY_QUEUE_TIMEOUT'],
+                latency_target=config['SVNMAN_CONCURRENCY_LATENCY_TARGET'],
+            )
+
+        recorder = None
+        if config['SVNMAN_TRAFFIC_RECORD_PATH']:
+            from . import traffic
+            recorder = traffic.TrafficRecorder(config['SVNMAN_TRAFFIC_RECORD_PATH'])
+
+        return remote.API(
+            remote_url=config['SVNMAN_API_URL'],
+            username=config['SVNMAN_API_USERNAME'],
+            password=config['SVNMAN_API_PASSWORD'],
+            repo_cache_size=config['SVNMAN_REPO_CACHE_SIZE'],
+            access_page_size=config['SVNMAN_ACCESS_PAGE_SIZE'],
+            access_workers=config['SVNMAN_ACCESS_WORKERS'],
+            timeout=config['SVNMAN_API_TIMEOUT'],
+            max_retries=config['SVNMAN_API_MAX_RETRIES'],
+            limiter=concurrency_limiter,
+            recorder=recorder,
         )
 
+    @property
+    def rate_limiter(self) -> typing.Optional['ratelimit.RateLimiter']:
+        """Rate limiter for the svnman routes, or None when rate limiting is disabled."""
+
+        if not self._rate_limiter_loaded:
+            from . import ratelimit
+
+            with self._lazy_lock:
+                if not self._rate_limiter_loaded:
+                    self._rate_limiter = ratelimit.from_config(self._config)
+                    self._rate_limiter_loaded = True
+        return self._rate_limiter
+
     @property
     def template_path(self):
         return os.path.join(os.path.dirname(__file__), 'templates')
@@ -122,7 +351,59 @@ class SVNManExtension(PillarExtension):
             return ''
         if not self.is_svnman_project(project):
             return ''
-        return flask.render_template('svnman/sidebar.html', project=project)
+
+        repo_id = project.extension_props[EXTENSION_NAME].repo_id
+        cache_key = ('sidebar', str(project['_id']), project.url, repo_id)
+        return self.fragment_cache.get_or_compute(
+            cache_key, lambda: flask.render_template('svnman/sidebar.html', project=project))
+
+    def _invalidate_project_caches(self, project_id, project_url: str = None, *,
+                                   projects: bool = True):
+        """Forgets cached information about the project, after it has been changed.
+
+        Without project URL all cached projects are forgotten.
+
+        :param projects: also forget the cached projects. Pass False for
+            changes of the users with access, as the svnman write paths read
+            those from MongoDB and the read-only views don't use them.
+        """
+
+        from . import tracing
+
+        project_id = str(project_id)
+        self.fragment_cache.pop_where(
+            lambda key: key[0] == 'dashboard' or (key[0] == 'sidebar' and key[1] == project_id))
+        # Other processes cache the dashboard as well; this makes them render it again.
+        with tracing.span('mongo', op='bump_dashboard_version'):
+            current_app.db(FRAGMENT_VERSIONS_COLLECTION).update_one(
+                {'_id': 'dashboard'}, {'$inc': {'version': 1}}, upsert=True)
+        if projects:
+            self.project_cache.pop_where(lambda key: project_url is None or key[1] == project_url)
+
+    def dashboard_version(self) -> int:
+        """Returns the version of the dashboard, to include in its cache key.
+
+        Bumped by _invalidate_project_caches(), so that changes made in one
+        process also invalidate the dashboards cached by the others.
+        """
+
+        from . import tracing
+
+        with tracing.span('mongo', op='find_dashboard_version'):
+            doc = current_app.db(FRAGMENT_VERSIONS_COLLECTION).find_one({'_id': 'dashboard'})
+        return doc['version'] if doc else 0
+
+    def _project_updated(self, updates: dict, original: dict):
+        """Eve hook, forgets the cached project, as its permissions may have changed."""
+
+        urls = {original.get('url'), updates.get('url')}
+        self.project_cache.pop_where(lambda key: key[1] in urls)
+
+    def _user_updated(self, updates: dict, original: dict):
+        """Eve hook, forgets the user's cached projects, as their groups may have changed."""
+
+        user_id = str(original['_id'])
+        self.project_cache.pop_where(lambda key: key[2] == user_id)
 
     @property
     def has_project_settings(self) -> bool:
@@ -139,43 +420,104 @@ class SVNManExtension(PillarExtension):
         :returns: a Flask HTTP response
         """
 
-        from .routes import project_settings
+        from . import profiling, tracing
 
+        with profiling.profiled('project_settings'), \
+                tracing.span('route', endpoint='svnman.project_settings'):
+            return self._project_settings(project, **template_args)
+
+    def _project_settings(self, project: pillarsdk.Project, **template_args: dict):
         if not self.is_svnman_project(project):
             return flask.render_template('svnman/project_settings/offer_create_repo.html',
                                          project=project, **template_args)
 
         remote_url = current_app.config['SVNMAN_REPO_URL']
-        users_coll = current_app.db('users')
-
-        # list of {'username': 'uname-on-svn', 'db': user in our DB, 'pw_is_set': bool} dicts.
-        svn_users = []
         eprops = project.extension_props[EXTENSION_NAME]
         repo_id = eprops.repo_id
         svn_url = urljoin(remote_url, repo_id)
 
-        if eprops.users:  # may be None
-            userdict = eprops.users.to_dict()
-            # Jump through some hoops to collect the user info from MongoDB in one query.
-            svninfo = {str2id(uid): userinfo for uid, userinfo in userdict.items()}
-            db_users = users_coll.find(
-                {'_id': {'$in': list(svninfo.keys())}},
-                projection={'full_name': 1, 'email': 1, 'avatar': 1},
-            )
-            for db_user in db_users:
-                svninfo.setdefault(db_user['_id'], {})['db'] = db_user
-                db_user['avatar_url'] = pillar.api.users.avatar.url(db_user)
-
-            svn_users = sorted(svninfo.values(), key=lambda item: item.get('username', ''))
-
+        # The users with access are loaded page by page by the browser, see access_list().
         return flask.render_template('svnman/project_settings/settings.html',
                                      project=project,
                                      svn_url=svn_url,
                                      repo_id=repo_id,
                                      remote_url=remote_url,
-                                     svn_users=svn_users,
+                                     repo_stats=self.repo_stats([project['_id']]).get(
+                                         str(project['_id'])),
+                                     access_page_size=current_app.config[
+                                         'SVNMAN_ACCESS_LIST_PAGE_SIZE'],
                                      **template_args)
 
+    def access_list(self, project_id, *, after: str = '', limit: int = 50,
+                    search: str = '') -> (typing.List[dict], str):
+        """Returns one page of the users with access to the project's repository.
+
+        Users are sorted by their Subversion username, and paginated by
+        keyset: pass the last username of a page as 'after' to get the next.
+
+        :param project_id: ObjectId of the project.
+        :param after: only return users whose username sorts after this one.
+        :param limit: maximum number of users to return.
+        :param search: only return users whose username contains this
+            text, case-insensitively.
+        :returns: tuple (users, next_after), where users is a list of dicts
+            {'user_id', 'username', 'pw_set', 'full_name', 'email', 'avatar_url'}
+            and next_after is the value for 'after' to get the next page,
+            or '' when this was the last page.
+        """
+
+        import re
+        from . import tracing
+
+        match = {}
+        if after:
+            match['username'] = {'$gt': after}
+        if search:
+            match['username'] = dict(match.get('username', {}),
+                                     **{'$regex': re.escape(search), '$options': 'i'})
+
+        prefix = f'extension_props.{EXTENSION_NAME}'
+        pipeline = [
+            {'$match': {'_id': project_id}},
+            {'$project': {'users': {'$objectToArray': {'$ifNull': [f'${prefix}.users', {}]}}}},
+            {'$unwind': '$users'},
+            {'$project': {'_id': 0,
+                          'user_id': '$users.k',
+                          'username': '$users.v.username',
+                          'pw_set': '$users.v.pw_set'}},
+        ]
+        if match:
+            pipeline.append({'$match': match})
+        pipeline += [
+            {'$sort': {'username': 1}},
+            {'$limit': limit + 1},
+        ]
+
+        with tracing.span('mongo', op='access_list'):
+            page = list(current_app.db('projects').aggregate(pipeline))
+
+        next_after = ''
+        if len(page) > limit:
+            page = page[:limit]
+            next_after = page[-1]['username']
+
+        # Collect the user info from MongoDB in one query.
+        user_oids = [str2id(info['user_id']) for info in page]
+        with tracing.span('mongo', op='find_users'):
+            db_users = {db_user['_id']: db_user for db_user in current_app.db('users').find(
+                {'_id': {'$in': user_oids}},
+                projection={'full_name': 1, 'email': 1, 'avatar': 1},
+            )}
+
+        for info, user_oid in zip(page, user_oids):
+            db_user = db_users.get(user_oid, {})
+            info['pw_set'] = bool(info.get('pw_set'))
+            info['full_name'] = db_user.get('full_name', '')
+            info['email'] = db_user.get('email', '')
+            info['avatar_url'] = pillar.api.users.avatar.url(db_user) if db_user else ''
+
+        return page, next_after
+
     def is_svnman_project(self, project: pillarsdk.Project) -> bool:
         """Checks whether the project is correctly set up for SVNman."""
 
@@ -209,10 +551,8 @@ class SVNManExtension(PillarExtension):
         already has a Subversion repository.
         """
 
-        from . import remote, exceptions
-
-        eprops, proj = self._get_prop_props(project)
         project_id = project['_id']
+        eprops = self._db_eprops(project_id)
 
         repo_id = eprops.get('repo_id')
         if repo_id:
@@ -220,9 +560,71 @@ class SVNManExtension(PillarExtension):
                               project_id, repo_id)
             return repo_id
 
+        actual_repo_id = self.create_remote_repo(str(project_id), creator)
+
+        # Update the project to include the repository ID, unless another
+        # request attached a repository in the meantime.
+        stored_repo_id = self._attach_repo(str2id(str(project_id)), actual_repo_id)
+        if stored_repo_id == actual_repo_id:
+            self.record_change('create-repo', actual_repo_id, project_id)
+        self._invalidate_project_caches(project_id, project.url)
+
+        # Make sure that the project object is updated as well.
+        if project.extension_props is None:
+            project.extension_props = {EXTENSION_NAME: pillarsdk.Resource()}
+
+        project.extension_props[EXTENSION_NAME].repo_id = stored_repo_id
+
+        return stored_repo_id
+
+    def _attach_repo(self, project_oid, repo_id: str) -> str:
+        """Stores the repository ID in the project, if it doesn't have one yet.
+
+        :returns: the repository ID of the project after the update. When this
+            is not the given one, the given repository is queued for deletion.
+        """
+
+        from . import sweeper, tracing
+
+        proj_coll = current_app.db('projects')
+        repo_field = f'extension_props.{EXTENSION_NAME}.repo_id'
+
+        with tracing.span('mongo', op='attach_repo'):
+            # A null extension_props can't get a sub-field $set.
+            proj_coll.update_one({'_id': project_oid, 'extension_props': None},
+                                 {'$set': {'extension_props': {}}})
+            res = proj_coll.update_one(
+                {'_id': project_oid, repo_field: {'$in': [None, '']}},
+                {'$set': {repo_field: repo_id, '_etag': random_etag(), '_updated': utcnow()}})
+        if res.matched_count == 1:
+            return repo_id
+
+        proj = proj_coll.find_one({'_id': project_oid}, projection={repo_field: 1})
+        if proj is None:
+            raise ValueError(f'project {project_oid} does not exist')
+        stored_repo_id = proj['extension_props'][EXTENSION_NAME]['repo_id']
+        self._log.warning('project %s got repository %r attached while creating %r',
+                          project_oid, stored_repo_id, repo_id)
+        sweeper.queue_repo_deletion(current_app.db(), repo_id, project_oid,
+                                    'lost race with concurrent repository creation')
+        return stored_repo_id
+
+    def create_remote_repo(self, project_id: str, creator: str) -> str:
+        """Creates a SVN repository with a random ID on the SVNman server.
+
+        Does not touch the project; this only allocates a unique repository ID
+        and creates the repository. Only uses the remote API, so it's safe to
+        call from worker threads. The caller records the 'create-repo' change
+        once the repository ID is stored in the project.
+
+        :returns: the repository ID as returned by the SVNman.
+        """
+
+        from . import remote, exceptions
+
         repo_info = remote.CreateRepo(
             repo_id='',
-            project_id=str(project_id),
+            project_id=project_id,
             creator=creator,
         )
 
@@ -241,46 +643,102 @@ class SVNManExtension(PillarExtension):
             raise ValueError('unable to find unique random repository ID, giving up')
 
         self._log.info('created new Subversion repository: %s', repo_info)
+        return actual_repo_id
 
-        # Update the project to include the repository ID.
-        eprops['repo_id'] = actual_repo_id
-        web_utils.unattach_project_pictures(proj)
-        proj_utils.put_project(proj)
+    def record_change(self, action: str, repo_id: str, project_id, *,
+                      usernames: typing.Iterable[str] = (),
+                      user_ids: typing.Iterable = ()):
+        """Records a change in the audit log and publishes it as event.
 
-        # Make sure that the project object is updated as well.
-        if project.extension_props is None:
-            project.extension_props = {EXTENSION_NAME: pillarsdk.Resource()}
+        See svnman.audit and svnman.events. The actor in the audit log is the
+        user of the current request; it's None for changes made outside of
+        requests, such as through the CLI.
+        """
 
-        project.extension_props[EXTENSION_NAME].repo_id = actual_repo_id
+        project_oid = str2id(str(project_id)) if project_id else None
+        usernames = list(usernames)
 
-        return actual_repo_id
+        if self.audit_log is not None:
+            actor = None
+            if flask.has_request_context() and current_user.is_authenticated:
+                actor = {'user_id': current_user.user_id, 'username': current_user.username}
+
+            self.audit_log.record(action, repo_id,
+                                  project_id=project_oid,
+                                  actor=actor,
+                                  usernames=usernames,
+                                  user_ids=[str2id(str(user_id)) for user_id in user_ids])
+
+        if self.event_stream is not None:
+            # The change has been made already, so don't fail because of the event.
+            try:
+                self.event_stream.publish(action, repo_id,
+                                          project_id=project_oid, usernames=usernames)
+            except Exception:
+                self._log.exception('Unable to publish %s event for repository %s',
+                                    action, repo_id)
+
+    def _db_eprops(self, project_id) -> dict:
+        """Returns the current extension properties of the project from MongoDB.
+
+        The project passed to the write paths may be older than the database,
+        for example when another process changed the repository or its users.
+        """
 
-    def _get_prop_props(self, project: pillarsdk.Project) -> (dict, dict):
-        """Gets the project as dictionary and the extension properties."""
+        from . import tracing
 
-        proj = project.to_dict()
-        eprops = proj.setdefault('extension_props', {}).setdefault(EXTENSION_NAME, {})
-        return eprops, proj
+        with tracing.span('mongo', op='find_eprops'):
+            proj = current_app.db('projects').find_one(
+                {'_id': str2id(str(project_id))},
+                projection={f'extension_props.{EXTENSION_NAME}': 1})
+        if proj is None:
+            raise ValueError(f'project {project_id} does not exist')
+        return (proj.get('extension_props') or {}).get(EXTENSION_NAME) or {}
 
     def delete_repo(self, project: pillarsdk.Project, repo_id: str):
         """Deletes an SVN repository and detaches it from the project."""
 
-        from . import remote, exceptions
+        from . import tracing
 
-        eprops, proj = self._get_prop_props(project)
-        proj_repo_id = eprops.get('repo_id')
+        proj_oid = str2id(str(project['_id']))
+        proj_repo_id = self._db_eprops(proj_oid).get('repo_id')
         if proj_repo_id != repo_id:
             self._log.warning('project %s is linked to repo %r, not to %r, refusing to delete',
-                              proj['_id'], proj_repo_id, repo_id)
+                              proj_oid, proj_repo_id, repo_id)
             raise ValueError()
 
         self.remote.delete_repo(repo_id)
         self._log.info('deleted Subversion repository %s', repo_id)
 
         # Update the project to remove the repository ID and assigned users.
-        eprops.pop('repo_id', None)
-        eprops.pop('users', None)
-        proj_utils.put_project(proj)
+        prefix = f'extension_props.{EXTENSION_NAME}'
+        proj_coll = current_app.db('projects')
+        with tracing.span('mongo', op='detach_repo'):
+            res = proj_coll.update_one(
+                {'_id': proj_oid, f'{prefix}.repo_id': repo_id},
+                {'$unset': {f'{prefix}.repo_id': True,
+                            f'{prefix}.users': True,
+                            f'{prefix}.stats': True},
+                 '$set': {'_etag': random_etag(), '_updated': utcnow()}})
+        if res.matched_count != 1:
+            self._log.warning('project %s was no longer linked to repo %r after deleting it',
+                              proj_oid, repo_id)
+        self.record_change('delete-repo', repo_id, proj_oid)
+        self._invalidate_project_caches(proj_oid, project.url)
+
+    def _project_deleted(self, project: dict):
+        """Eve hook, queues the repository of a deleted project for removal."""
+
+        from . import sweeper
+
+        self.project_cache.pop_where(lambda key: key[1] == project.get('url'))
+
+        eprops = (project.get('extension_props') or {}).get(EXTENSION_NAME) or {}
+        repo_id = eprops.get('repo_id')
+        if not repo_id:
+            return
+
+        sweeper.queue_repo_deletion(current_app.db(), repo_id, project['_id'], 'project deleted')
 
     def svnman_projects(self, *, projection: dict = None):
         """Returns projects with a Subversion repository.
@@ -301,13 +759,181 @@ class SVNManExtension(PillarExtension):
         projects = pillarsdk.Project.all(params, api=api)
         return projects
 
+    def repo_stats(self, project_ids: typing.Iterable) -> typing.Dict[str, dict]:
+        """Returns the repository statistics stored by 'svn refresh_stats'.
+
+        :returns: {project ID as string: stats dict}, see svnman.repostats;
+            the times are datetimes. Projects whose statistics haven't been
+            fetched yet are not included.
+        """
+
+        from . import repostats, tracing
+
+        stats_field = f'extension_props.{EXTENSION_NAME}.stats'
+        proj_coll = current_app.db('projects')
+        with tracing.span('mongo', op='repo_stats'):
+            found = proj_coll.find({'_id': {'$in': [str2id(str(pid)) for pid in project_ids]},
+                                    stats_field: {'$exists': True}},
+                                   projection={stats_field: 1})
+            return {str(proj['_id']): repostats.for_display(
+                        proj['extension_props'][EXTENSION_NAME]['stats'])
+                    for proj in found}
+
+    def usage_stats(self) -> dict:
+        """Returns usage statistics of all Subversion repositories.
+
+        The statistics are computed by MongoDB, and cached for
+        SVNMAN_STATS_CACHE_TTL seconds.
+        """
+
+        return self._stats_cache.get_or_compute('usage_stats', self._compute_usage_stats)
+
+    def _compute_usage_stats(self) -> dict:
+        import datetime
+
+        prefix = f'extension_props.{EXTENSION_NAME}'
+        pipeline = [
+            {'$match': {f'{prefix}.repo_id': {'$exists': True, '$nin': [None, '']},
+                        '_deleted': {'$ne': True}}},
+            {'$project': {
+                '_id': 0,
+                'shard': {'$substrCP': [f'${prefix}.repo_id', 0, 2]},
+                'users': {'$objectToArray': {'$ifNull': [f'${prefix}.users', {}]}},
+            }},
+            {'$facet': {
+                'repos': [{'$count': 'count'}],
+                'users_per_repo': [
+                    {'$group': {'_id': {'$size': '$users'}, 'repos': {'$sum': 1}}},
+                    {'$sort': {'_id': 1}},
+                ],
+                'users_without_password': [
+                    {'$unwind': '$users'},
+                    {'$match': {'users.v.pw_set': False}},
+                    {'$group': {'_id': '$users.k'}},
+                    {'$count': 'count'},
+                ],
+                'repos_per_shard': [
+                    {'$group': {'_id': '$shard', 'repos': {'$sum': 1}}},
+                    {'$sort': {'_id': 1}},
+                ],
+            }},
+        ]
+
+        facets = next(current_app.db('projects').aggregate(pipeline), {})
+
+        def count(facet_name: str) -> int:
+            docs = facets.get(facet_name) or [{}]
+            return docs[0].get('count', 0)
+
+        return {
+            'repos': count('repos'),
+            'users_per_repo': [{'users': doc['_id'], 'repos': doc['repos']}
+                               for doc in facets.get('users_per_repo', [])],
+            'users_without_password': count('users_without_password'),
+            'repos_per_shard': {doc['_id']: doc['repos']
+                                for doc in facets.get('repos_per_shard', [])},
+            'generated': datetime.datetime.now(tz=datetime.timezone.utc).isoformat(),
+        }
+
+    def search_svn_users(self, query: str, *, limit: int = 10) -> typing.List[dict]:
+        """Returns users with the svn-use capability matching the query.
+
+        Matches on the prefix of the username, full name or email address.
+        Results are cached for SVNMAN_USER_SEARCH_CACHE_TTL seconds.
+
+        :returns: list of {'user_id', 'username', 'full_name', 'avatar_url'} dicts.
+        """
+
+        query = query.strip()
+        if not query:
+            return []
+
+        return self._user_search_cache.get_or_compute(
+            (query, limit), lambda: self._search_svn_users(query, limit))
+
+    def _search_svn_users(self, query: str, limit: int) -> typing.List[dict]:
+        import re
+        from . import tracing
+
+        roles = _roles_with_cap('svn-use')
+        if not roles:
+            return []
+
+        users_coll = current_app.db('users')
+        self._ensure_user_search_indices(users_coll)
+
+        # Anchored, case-sensitive regular expressions can use the indices, so
+        # try a few common capitalisations instead of matching case-insensitively.
+        variants = sorted({query, query.lower(), query.capitalize()})
+        prefixes = [re.compile('^' + re.escape(variant)) for variant in variants]
+
+        with tracing.span('mongo', op='search_users'):
+            db_users = users_coll.find(
+                {'roles': {'$in': sorted(roles)},
+                 '_deleted': {'$ne': True},
+                 '$or': [{'username': {'$in': prefixes}},
+                         {'full_name': {'$in': prefixes}},
+                         {'email': {'$in': prefixes}}]},
+                projection={'username': 1, 'full_name': 1, 'email': 1, 'avatar': 1},
+                limit=limit,
+            )
+            db_users = list(db_users)
+
+        db_users.sort(key=lambda db_user: db_user.get('full_name', ''))
+        return [{'user_id': str(db_user['_id']),
+                 'username': db_user.get('username', ''),
+                 'full_name': db_user.get('full_name', ''),
+                 'avatar_url': pillar.api.users.avatar.url(db_user)}
+                for db_user in db_users]
+
+    def _ensure_user_search_indices(self, users_coll):
+        if self._user_search_indices_created:
+            return
+
+        for field in ('username', 'full_name', 'email'):
+            users_coll.create_index([('roles', 1), (field, 1)],
+                                    name=f'svnman_search_roles_{field}',
+                                    background=True)
+        self._user_search_indices_created = True
+
+    def health(self) -> dict:
+        """Returns the reachability and recent latency of the SVNman API.
+
+        The result of the probe is cached for SVNMAN_HEALTH_PROBE_TTL seconds,
+        so that frequent health checks don't flood the SVNman server.
+        """
+
+        info = dict(self._health_cache.get_or_compute('probe', self._probe))
+        info['recent_latency'] = self.remote.latency_summary()
+        return info
+
+    def _probe(self) -> dict:
+        import datetime
+        import time
+        import requests
+
+        info = {'checked_at': datetime.datetime.now(tz=datetime.timezone.utc).isoformat()}
+        start = time.monotonic()
+        try:
+            resp = self.remote.probe()
+        except requests.RequestException as ex:
+            # The exception can contain internal host names, so only log it.
+            self._log.warning('SVNman API health probe failed: %s', ex)
+            info.update(reachable=False, healthy=False, error='unreachable')
+        else:
+            info.update(reachable=True, healthy=resp.status_code < 500, status=resp.status_code)
+        info['probe_ms'] = round((time.monotonic() - start) * 1000, 2)
+        return info
+
     def hash_password(self, passwd: str) -> str:
         """Returns the BCrypt'ed password."""
 
         import bcrypt
+        from . import tracing
 
-        salt = bcrypt.gensalt()
-        hashed = bcrypt.hashpw(passwd.encode(), salt)
+        with tracing.span('bcrypt'):
+            salt = bcrypt.gensalt()
+            hashed = bcrypt.hashpw(passwd.encode(), salt)
         return hashed.decode()
 
     def modify_access(self, project: pillarsdk.Project, repo_id: str, *,
@@ -315,6 +941,8 @@ class SVNManExtension(PillarExtension):
                       revoke_user_id: str = ''):
         """Grants or revokes access to/from the given user."""
 
+        from . import tracing
+
         if bool(grant_user_id) == bool(revoke_user_id):
             raise ValueError('pass either grant_user_id or revoke_user_id, not both/none')
 
@@ -324,9 +952,9 @@ class SVNManExtension(PillarExtension):
         else:
             grant_revoke = 'revoke'
 
-        eprops, proj = self._get_prop_props(project)
+        proj_oid = str2id(str(project['_id']))
+        eprops = self._db_eprops(proj_oid)
         proj_repo_id = eprops.get('repo_id')
-        proj_oid = str2id(proj['_id'])
 
         if proj_repo_id != repo_id:
             self._log.warning('project %s is linked to repo %r, not to %r, '
@@ -334,16 +962,22 @@ class SVNManExtension(PillarExtension):
                               proj_oid, proj_repo_id, grant_revoke, repo_id)
             raise ValueError()
 
-        users = eprops.setdefault('users', {})
+        users = eprops.get('users') or {}
+        users_field = f'extension_props.{EXTENSION_NAME}.users'
         if grant_user_id:
-            db_user = self._get_db_user(proj, repo_id, grant_user_id)
+            db_user = self._get_db_user(proj_oid, repo_id, grant_user_id)
             username = db_user['username']
             grant = [(username, grant_passwd)]
             revoke = []
-            users[grant_user_id] = {'username': username,
-                                    'pw_set': grant_passwd != UNSET_PASSWORD}
+            update = {'$set': {f'{users_field}.{grant_user_id}': {
+                'username': username,
+                'pw_set': grant_passwd != UNSET_PASSWORD,
+                # Keeps 'svn sync' from revoking access it hasn't seen on the server yet.
+                # A timestamp, as pillarsdk stores datetimes back as strings.
+                'granted': utcnow().timestamp(),
+            }}}
         else:
-            user_info = users.pop(revoke_user_id, None)
+            user_info = users.get(revoke_user_id)
             if not user_info:
                 self._log.warning('unable to revoke user %s access from repo %s of project %s:'
                                   ' that user has no access', revoke_user_id, repo_id, proj_oid)
@@ -351,6 +985,7 @@ class SVNManExtension(PillarExtension):
             username = user_info['username']
             grant = []
             revoke = [username]
+            update = {'$unset': {f'{users_field}.{revoke_user_id}': True}}
 
         self._log.info('%sing user %s (%r) access to repo %s of project %s',
                        grant_revoke.rstrip('e'), grant_user_id or revoke_user_id, username,
@@ -358,14 +993,24 @@ class SVNManExtension(PillarExtension):
 
         self.remote.modify_access(repo_id, grant=grant, revoke=revoke)
 
+        # Only touch this user, and only while the project is still linked to the repository.
+        update.setdefault('$set', {}).update({'_etag': random_etag(), '_updated': utcnow()})
         proj_coll = current_app.db('projects')
-        res = proj_coll.update_one({'_id': proj_oid},
-                                   {'$set': {f'extension_props.{EXTENSION_NAME}.users': users}})
+        with tracing.span('mongo', op='update_users'):
+            res = proj_coll.update_one(
+                {'_id': proj_oid, f'extension_props.{EXTENSION_NAME}.repo_id': repo_id},
+                update)
         if res.matched_count != 1:
             self._log.error('Matched count was %d, result: %s', res.matched_count, res.raw_result)
             raise ValueError('Error updating MongoDB')
 
-    def _get_db_user(self, proj, repo_id, user_id) -> dict:
+        # Only publish the change once the project reflects it.
+        self.record_change(grant_revoke, repo_id, proj_oid,
+                           usernames=[username], user_ids=[grant_user_id or revoke_user_id])
+        # Keep the cached project, so that bulk grants don't resolve it for every user.
+        self._invalidate_project_caches(proj_oid, project.url, projects=False)
+
+    def _get_db_user(self, proj_oid, repo_id, user_id) -> dict:
         """Returns the user from the database.
 
         Raises a ValueError if the user is not allowed to use svn.
@@ -373,28 +1018,47 @@ class SVNManExtension(PillarExtension):
 
         from pillar.auth import UserClass
 
+        from . import tracing
+
         user_oid = str2id(user_id)
-        db_user = current_app.db('users').find_one({'_id': user_oid})
+        with tracing.span('mongo', op='find_user'):
+            db_user = current_app.db('users').find_one({'_id': user_oid})
         if not db_user:
             self._log.warning('user %s not found, not modifying access to repo %s of project %s',
-                              user_id, repo_id, proj['_id'])
+                              user_id, repo_id, proj_oid)
             raise ValueError('User not found')
 
         thatuser = UserClass.construct('', db_user)
         if not thatuser.has_cap('svn-use'):
             self._log.warning('user %s has no svn-use cap, not modifying access to repo %s of'
-                              ' project %s', user_id, repo_id, proj['_id'])
+                              ' project %s', user_id, repo_id, proj_oid)
             raise UnavailableForLegalReasons('User is not allowed to use Subversion')
 
         return db_user
 
 
+def _flush_trace(exc):
+    """Teardown handler; only loads the tracing module when the request was traced."""
+
+    if 'svnman_trace' not in flask.g:
+        return
+
+    from . import tracing
+    tracing.flush(exc)
+
+
 def _get_current_svnman() -> SVNManExtension:
     """Returns the SVNMan extension of the current application."""
 
     return flask.current_app.pillar_extensions[EXTENSION_NAME]
 
 
+def _roles_with_cap(cap: str) -> typing.Set[str]:
+    """Returns the roles that grant the given capability."""
+
+    return {role for role, caps in current_app.user_caps.items() if cap in caps}
+
+
 def _random_id(alphabet=string.ascii_letters + string.digits) -> str:
     """Returns a random repository ID.
 
@@ -0,0 +1,218 @@
+"""Structured audit trail of repository and access changes.
+
+Entries are buffered in memory and inserted in batches by a background
+thread, so recording an entry never waits for MongoDB. The collection has a
+TTL index, so entries are removed after SVNMAN_AUDIT_RETENTION_DAYS.
+
+Entries look like this:
+
+    {'timestamp': datetime, 'action': 'grant', 'repo_id': 'repo-id',
+     'project_id': ObjectId, 'actor': {'user_id': ObjectId, 'username': 'harry'},
+     'usernames': ['svn-login', ...], 'user_ids': [ObjectId, ...]}
+"""
+
+import collections
+import datetime
+import logging
+import threading
+import typing
+
+log = logging.getLogger(__name__)
+
+COLLECTION = 'svnman_audit'
+ACTIONS = {'create-repo', 'delete-repo', 'grant', 'revoke'}
+DUPLICATE_KEY = 11000
+
+
+def utcnow() -> datetime.datetime:
+    return datetime.datetime.now(tz=datetime.timezone.utc)
+
+
+class AuditLog:
+    """Buffers audit entries and writes them to MongoDB in batches.
+
+    When MongoDB can't keep up and the buffer holds 'max_buffer' entries, the
+    oldest entries are dropped (and the drop is logged) rather than blocking
+    the request that records a new one.
+    """
+
+    def __init__(self, collection_getter: typing.Callable[[], typing.Any], *,
+                 retention_days: float = 730,
+                 batch_size: int = 500,
+                 flush_interval: float = 1.0,
+                 max_buffer: int = 10000):
+        self._collection_getter = collection_getter
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._buffer = collections.deque(maxlen=max_buffer)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread: typing.Optional[threading.Thread] = None
+        self._indices_created = False
+        self.dropped = 0
+
+    def record(self, action: str, repo_id: str, *,
+               project_id=None,
+               actor: typing.Optional[dict] = None,
+               usernames: typing.Iterable[str] = (),
+               user_ids: typing.Iterable = ()):
+        """Queues an audit entry; returns immediately."""
+
+        if action not in ACTIONS:
+            raise ValueError(f'unknown audit action {action!r}')
+
+        entry = {
+            'timestamp': utcnow(),
+            'action': action,
+            'repo_id': repo_id,
+            'project_id': project_id,
+            'actor': actor,
+            'usernames': list(usernames),
+            'user_ids': list(user_ids),
+        }
+
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+                log.error('Audit log buffer is full, dropping entry %s', self._buffer[0])
+            self._buffer.append(entry)
+            self._start_thread()
+
+            if len(self._buffer) >= self.batch_size:
+                self._wakeup.set()
+
+    def _start_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='svnman-audit', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                log.exception('Unable to write audit log entries, will retry')
+
+    def _take_batch(self) -> list:
+        with self._lock:
+            count = min(self.batch_size, len(self._buffer))
+            return [self._buffer.popleft() for _ in range(count)]
+
+    def _requeue(self, batch: list):
+        with self._lock:
+            # The batch holds the oldest entries, so drop from it when they don't all fit.
+            overflow = len(self._buffer) + len(batch) - self._buffer.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+                log.error('Audit log buffer is full, dropping %d entries that failed to be '
+                          'written, the oldest from %s', overflow, batch[0]['timestamp'])
+                batch = batch[overflow:]
+            self._buffer.extendleft(reversed(batch))
+
+    def flush(self) -> int:
+        """Writes all buffered entries, returns the number of written entries."""
+
+        import pymongo.errors
+
+        written = 0
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return written
+            try:
+                self.collection().insert_many(batch, ordered=False)
+            except pymongo.errors.BulkWriteError as ex:
+                # A retried batch may have been partially written before.
+                errors = ex.details.get('writeErrors', [])
+                if any(error.get('code') != DUPLICATE_KEY for error in errors):
+                    self._requeue(batch)
+                    raise
+            except Exception:
+                self._requeue(batch)
+                raise
+            written += len(batch)
+
+    def close(self):
+        """Stops the background thread after writing the buffered entries."""
+
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def collection(self):
+        coll = self._collection_getter()
+        if not self._indices_created:
+            ensure_indices(coll, self.retention_days)
+            self._indices_created = True
+        return coll
+
+    def find(self, **criteria) -> typing.List[dict]:
+        """Returns audit entries matching the criteria, see find().
+
+        Buffered entries are flushed first, so that they are included.
+        """
+
+        self.flush()
+        return find(self.collection(), **criteria)
+
+
+def ensure_indices(coll, retention_days: float):
+    """Creates the indices used by find() and the TTL index."""
+
+    coll.create_index([('timestamp', -1)],
+                      name='svnman_audit_ttl',
+                      expireAfterSeconds=int(retention_days * 86400))
+    for field in ('repo_id', 'usernames', 'user_ids', 'actor.username', 'project_id'):
+        coll.create_index([(field, 1), ('timestamp', -1)],
+                          name=f'svnman_audit_{field}', background=True)
+
+
+def find(coll, *,
+         username: str = None,
+         user_id=None,
+         actor: str = None,
+         repo_id: str = None,
+         project_id=None,
+         action: str = None,
+         since: datetime.datetime = None,
+         until: datetime.datetime = None,
+         limit: int = 100) -> typing.List[dict]:
+    """Queries the audit collection, most recent entries first.
+
+    :param username: Subversion login that was granted or revoked access.
+    :param actor: Pillar username of the user that made the change.
+    """
+
+    query = {}
+    if username:
+        query['usernames'] = username
+    if user_id:
+        query['user_ids'] = user_id
+    if actor:
+        query['actor.username'] = actor
+    if repo_id:
+        query['repo_id'] = repo_id
+    if project_id:
+        query['project_id'] = project_id
+    if action:
+        query['action'] = action
+    if since or until:
+        query['timestamp'] = {}
+        if since:
+            query['timestamp']['$gte'] = since
+        if until:
+            query['timestamp']['$lt'] = until
+
+    cursor = coll.find(query, projection={'_id': 0}).sort('timestamp', -1).limit(limit)
+    return list(cursor)
@@ -0,0 +1,30 @@
+"""Helpers for bulk operations on many repositories."""
+
+import typing
+from concurrent import futures
+
+T = typing.TypeVar('T')
+R = typing.TypeVar('R')
+
+
+def run_concurrently(func: typing.Callable[[T], R],
+                     items: typing.Iterable[T],
+                     *,
+                     workers: int) -> typing.Iterator[typing.Tuple[T, R, Exception]]:
+    """Calls func(item) for each item, with at most 'workers' calls at a time.
+
+    Yields (item, result, exception) tuples in order of completion, where
+    either result or exception is None. Exceptions are not raised, so that
+    one failing item doesn't stop the others.
+    """
+
+    with futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending = {executor.submit(func, item): item for item in items}
+        for future in futures.as_completed(pending):
+            item = pending[future]
+            try:
+                result = future.result()
+            except Exception as ex:
+                yield item, None, ex
+            else:
+                yield item, result, None
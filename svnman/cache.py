@@ -0,0 +1,79 @@
+"""Small in-process caches."""
+
+import collections
+import threading
+import time
+import typing
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe mapping whose entries expire after a fixed number of seconds.
+
+    When it holds more than 'maxsize' entries, the least recently stored
+    entries are evicted first.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = float(ttl)
+        self.maxsize = maxsize
+        self._entries = collections.OrderedDict()  # key: (expires_at, value)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return default
+            return value
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def pop_where(self, predicate: typing.Callable[[typing.Any], bool]) -> int:
+        """Removes all entries whose key matches the predicate.
+
+        :returns: the number of removed entries.
+        """
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_compute(self, key, compute: typing.Callable[[], typing.Any]):
+        """Returns the cached value, or computes, stores and returns it.
+
+        The value is computed outside the lock, so concurrent callers may
+        compute it more than once; the last one wins.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
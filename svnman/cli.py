@@ -1,6 +1,7 @@
 """Commandline interface for SVNMan."""
 
 import logging
+import typing
 
 from flask import current_app
 from flask_script import Manager
@@ -25,6 +26,16 @@ def info(repo_id):
     log.info('Access : %s', sorted(repoinfo.access))
 
 
+@manager_svnman.command
+def stats():
+    """Shows usage statistics of all Subversion repositories."""
+
+    import json
+    from . import current_svnman
+
+    print(json.dumps(current_svnman.usage_stats(), indent=4, sort_keys=True))
+
+
 @manager_svnman.command
 def create(repo_id, project_url, creator):
     """Creates a new Subversion repository."""
@@ -42,6 +53,7 @@ def create(repo_id, project_url, creator):
 
     log.info('Creating repository %r', repo_id)
     current_svnman.remote.create_repo(creation_info)
+    current_svnman.record_change('create-repo', repo_id, pid)
 
 
 @manager_svnman.command
@@ -56,6 +68,7 @@ def grant(repo_id, username, password):
     log.info('Granting access to repo %r', repo_id)
     log.info('Hashed password: %r', hashed)
     current_svnman.remote.modify_access(repo_id, grant=[(username, hashed)], revoke=[])
+    current_svnman.record_change('grant', repo_id, None, usernames=[username])
     log.info('Done')
 
 
@@ -67,6 +80,7 @@ def revoke(repo_id, username):
 
     log.info('Revoking access from repo %r', repo_id)
     current_svnman.remote.modify_access(repo_id, grant=[], revoke=[username])
+    current_svnman.record_change('revoke', repo_id, None, usernames=[username])
     log.info('Done')
 
 
@@ -80,7 +94,484 @@ def delete(repo_id):
     input('Press ENTER to continue irrevocable repository deletion')
 
     current_svnman.remote.delete_repo(repo_id)
+    current_svnman.record_change('delete-repo', repo_id, None)
     log.info('Done')
 
 
-manager.add_command('svn', manager_svnman)
+@manager_svnman.option('project_urls', nargs='*', metavar='PROJECT_URL',
+                       help='URLs of the projects to create a repository for')
+@manager_svnman.option('-q', '--query', dest='query', default=None,
+                       help='MongoDB query (as JSON) selecting the projects')
+@manager_svnman.option('-c', '--creator', dest='creator', default='SVNman provisioning',
+                       help='Creator to register the repositories with')
+@manager_svnman.option('-w', '--workers', dest='workers', type=int, default=8,
+                       help='Number of repositories to create concurrently')
+def provision(project_urls, query=None, creator='SVNman provisioning', workers=8):
+    """Creates repositories for many projects at once.
+
+    Projects that already have a repository, and deleted projects, are skipped.
+    The project owner is granted access (without password) when they are
+    allowed to use Subversion. When that fails, the repository is still
+    attached to the project, and access can be granted from the web interface.
+    """
+
+    from . import profiling
+
+    with profiling.profiled('cli-provision'):
+        return _provision(project_urls, query, creator, workers)
+
+
+def _provision(project_urls, query, creator, workers):
+    import json
+    import time
+
+    import pymongo
+    import pymongo.errors
+    from pillar.api.utils import random_etag, str2id, utcnow
+    from pillar.auth import UserClass
+
+    from . import EXTENSION_NAME, UNSET_PASSWORD, bulk, current_svnman, sweeper
+
+    if not project_urls and not query:
+        log.error('Give either project URLs or a query')
+        return 1
+
+    criteria = [{'_deleted': {'$ne': True}},
+                {f'extension_props.{EXTENSION_NAME}.repo_id': {'$in': [None, '']}}]
+    if project_urls:
+        criteria.append({'url': {'$in': project_urls}})
+    if query:
+        criteria.append(json.loads(query))
+
+    proj_coll = current_app.db('projects')
+    projects = list(proj_coll.find({'$and': criteria}, projection={'url': 1, 'user': 1}))
+    if not projects:
+        log.info('No projects found that need a repository')
+        return
+
+    # Find the owners that are allowed to use Subversion, in one query.
+    owner_ids = {proj['user'] for proj in projects if proj.get('user')}
+    owners = {}
+    for db_user in current_app.db('users').find({'_id': {'$in': list(owner_ids)}}):
+        if UserClass.construct('', db_user).has_cap('svn-use'):
+            owners[db_user['_id']] = db_user['username']
+
+    # The worker threads have no application context, so don't use the LocalProxy there.
+    svnman = current_svnman._get_current_object()
+
+    def create(proj: dict) -> (str, dict, typing.Optional[Exception]):
+        repo_id = svnman.create_remote_repo(str(proj['_id']), creator)
+        users = {}
+        username = owners.get(proj.get('user'))
+        if username:
+            # The repository exists now, so don't lose its ID when granting access fails.
+            try:
+                svnman.remote.modify_access(repo_id, grant=[(username, UNSET_PASSWORD)],
+                                            revoke=[])
+            except Exception as ex:
+                return repo_id, users, ex
+            users[str(proj['user'])] = {'username': username, 'pw_set': False,
+                                        'granted': utcnow().timestamp()}
+        return repo_id, users, None
+
+    # Projects whose extension_props is null can't get a sub-field $set.
+    proj_coll.update_many({'_id': {'$in': [proj['_id'] for proj in projects]},
+                           'extension_props': None},
+                          {'$set': {'extension_props': {}}})
+
+    def queue_lost_races(updates: list, reason: str) -> set:
+        """Queues the repositories that weren't saved for deletion, like _attach_repo() does.
+
+        :returns: the IDs of the projects whose repository ID wasn't saved.
+        """
+        created = {proj_id: repo_id for proj_id, repo_id, _, _ in updates}
+        lost = set()
+        stored = {}
+        for proj in proj_coll.find({'_id': {'$in': list(created)}},
+                                   projection={f'extension_props.{EXTENSION_NAME}.repo_id': 1}):
+            eprops = (proj.get('extension_props') or {}).get(EXTENSION_NAME) or {}
+            stored[proj['_id']] = eprops.get('repo_id')
+        for proj_id, repo_id in created.items():
+            if stored.get(proj_id) != repo_id:
+                lost.add(proj_id)
+                sweeper.queue_repo_deletion(current_app.db(), repo_id, proj_id, reason)
+        return lost
+
+    def flush(updates: list) -> int:
+        """Saves the repository IDs and records the changes.
+
+        :param updates: list of (project ID, repo ID, users, UpdateOne) tuples.
+        :returns: the number of repository IDs that could not be saved.
+        """
+        if not updates:
+            return 0
+        try:
+            res = proj_coll.bulk_write([update for _, _, _, update in updates], ordered=False)
+        except pymongo.errors.BulkWriteError as ex:
+            # The other updates in the batch were still performed.
+            matched_count = ex.details.get('nMatched', 0)
+            errors = ex.details.get('writeErrors', [])
+        else:
+            matched_count = res.matched_count
+            errors = []
+
+        failed_indices = {error['index'] for error in errors}
+        for error in errors:
+            proj_id, repo_id, _, _ = updates[error['index']]
+            log.error('Project %s: unable to save repository ID %s: %s',
+                      proj_id, repo_id, error.get('errmsg'))
+        lost = queue_lost_races([updates[idx] for idx in sorted(failed_indices)],
+                                'unable to save the repository ID in the project')
+
+        written = [update for idx, update in enumerate(updates) if idx not in failed_indices]
+        if matched_count != len(written):
+            log.warning('Saved %d of %d repository IDs; the other projects got a repository '
+                        'in the meantime', matched_count, len(written))
+            lost |= queue_lost_races(written, 'lost race with concurrent repository creation')
+
+        # Only publish what is actually stored, so that followers never see a
+        # repository that isn't attached to its project.
+        for proj_id, repo_id, users, _ in updates:
+            if proj_id in lost:
+                continue
+            svnman.record_change('create-repo', repo_id, proj_id)
+            for user_id, user_info in users.items():
+                svnman.record_change('grant', repo_id, proj_id,
+                                     usernames=[user_info['username']],
+                                     user_ids=[str2id(user_id)])
+        updates.clear()
+        return len(errors)
+
+    log.info('Creating %d repositories with %d workers', len(projects), workers)
+    start = time.monotonic()
+    updates = []
+    created = failed = failed_grants = failed_saves = 0
+    for proj, result, error in bulk.run_concurrently(create, projects, workers=workers):
+        if error is not None:
+            failed += 1
+            log.error('Unable to create repository for project %s: %s', proj['url'], error)
+            continue
+
+        created += 1
+        repo_id, users, grant_error = result
+        log.info('Project %s: created repository %s', proj['url'], repo_id)
+        if grant_error is not None:
+            failed_grants += 1
+            log.error('Project %s: unable to grant the owner access to repository %s: %s',
+                      proj['url'], repo_id, grant_error)
+        updates.append((proj['_id'], repo_id, users, pymongo.UpdateOne(
+            {'_id': proj['_id'], f'extension_props.{EXTENSION_NAME}.repo_id': {'$in': [None, '']}},
+            {'$set': {f'extension_props.{EXTENSION_NAME}.repo_id': repo_id,
+                      f'extension_props.{EXTENSION_NAME}.users': users,
+                      '_etag': random_etag(),
+                      '_updated': utcnow()}})))
+        if len(updates) >= 100:
+            failed_saves += flush(updates)
+    failed_saves += flush(updates)
+
+    duration = time.monotonic() - start
+    log.info('Created %d repositories in %.1f seconds (%.1f repos/sec), %d failed',
+             created, duration, created / duration if duration else 0.0, failed)
+    if failed_grants:
+        log.error('Unable to grant the owner access to %d repositories', failed_grants)
+    if failed_saves:
+        log.error('Unable to save the repository ID of %d projects', failed_saves)
+    if failed or failed_grants or failed_saves:
+        return 2
+
+
+@manager_svnman.option('-n', '--dry-run', dest='dry_run', action='store_true', default=False,
+                       help='Only report which repositories would be deleted')
+@manager_svnman.option('-w', '--workers', dest='workers', type=int, default=4,
+                       help='Number of repositories to delete concurrently')
+@manager_svnman.option('-b', '--batch-size', dest='batch_size', type=int, default=500,
+                       help='Number of repositories to handle per batch')
+def sweep(dry_run=False, workers=4, batch_size=500):
+    """Deletes repositories of deleted projects."""
+
+    from . import profiling
+
+    with profiling.profiled('cli-sweep'):
+        return _sweep(dry_run, workers, batch_size)
+
+
+def _sweep(dry_run, workers, batch_size):
+    from . import EXTENSION_NAME, current_svnman, sweeper
+
+    db = current_app.db()
+    total_deleted = total_failed = 0
+    while True:
+        report = sweeper.sweep(db, current_svnman.remote, EXTENSION_NAME,
+                               dry_run=dry_run, workers=workers, limit=batch_size)
+        for orphan in report.deleted:
+            log.info('%s repository %s of project %s (%s)',
+                     'Would delete' if dry_run else 'Deleted',
+                     orphan.repo_id, orphan.project_id, orphan.reason)
+            if not dry_run:
+                current_svnman.record_change('delete-repo', orphan.repo_id, orphan.project_id)
+        for orphan, error in report.failed:
+            log.warning('Failed to delete repository %s of project %s: %s',
+                        orphan.repo_id, orphan.project_id, error)
+
+        total_deleted += len(report.deleted)
+        total_failed += len(report.failed)
+
+        # Failed deletions stay in the queue, so stop when nothing got deleted.
+        if dry_run or len(report.deleted) + len(report.failed) < batch_size \
+                or not report.deleted:
+            break
+
+    log.info('%s %d repositories, %d failed',
+             'Would delete' if dry_run else 'Deleted', total_deleted, total_failed)
+    if total_failed:
+        return 2
+
+
+@manager_svnman.option('-w', '--workers', dest='workers', type=int, default=4,
+                       help='Number of repositories to fetch statistics of concurrently')
+@manager_svnman.option('-b', '--batch-size', dest='batch_size', type=int, default=500,
+                       help='Number of repositories to handle per batch')
+@manager_svnman.option('-l', '--loop', dest='loop', action='store_true', default=False,
+                       help='Keep running, refreshing repositories as they become due')
+@manager_svnman.option('-i', '--idle-sleep', dest='idle_sleep', type=float, default=60.0,
+                       help='With --loop, seconds to sleep when no repositories are due')
+def refresh_stats(workers=4, batch_size=500, loop=False, idle_sleep=60.0):
+    """Refreshes size and activity statistics of repositories that are due."""
+
+    import time
+    from . import EXTENSION_NAME, current_svnman, repostats
+
+    db = current_app.db()
+    intervals = repostats.RefreshIntervals.from_config(current_app.config)
+    repostats.ensure_indices(db, EXTENSION_NAME)
+
+    while True:
+        report = repostats.refresh(db, current_svnman.remote, EXTENSION_NAME,
+                                   intervals=intervals, workers=workers, limit=batch_size)
+        if report.refreshed or report.failed:
+            log.info('Refreshed statistics of %d repositories, %d failed',
+                     report.refreshed, len(report.failed))
+
+        if report.refreshed + len(report.failed) >= batch_size:
+            continue  # There may be more repositories due.
+        if not loop:
+            break
+        try:
+            time.sleep(idle_sleep)
+        except KeyboardInterrupt:
+            log.info('Stopping')
+            break
+
+
+@manager_svnman.option('-r', '--reset', dest='reset', action='store_true', default=False,
+                       help='Forget the cursor and sync all repositories')
+@manager_svnman.option('-p', '--page-size', dest='page_size', type=int, default=500,
+                       help='Number of changed repositories to fetch per request')
+@manager_svnman.option('-l', '--loop', dest='loop', action='store_true', default=False,
+                       help='Keep running, syncing every --interval seconds')
+@manager_svnman.option('-i', '--interval', dest='interval', type=float, default=30.0,
+                       help='With --loop, seconds to sleep between syncs')
+def sync(reset=False, page_size=500, loop=False, interval=30.0):
+    """Applies access changes made on the SVNman server to the projects."""
+
+    import time
+    from . import EXTENSION_NAME, current_svnman, sync as sync_mod
+
+    db = current_app.db()
+    if reset:
+        log.info('Forgetting the sync cursor')
+        sync_mod.save_cursor(db, '')
+
+    while True:
+        report = sync_mod.sync(db, current_svnman.remote, EXTENSION_NAME, page_size=page_size)
+        for repo_id, project_id, user_id, username in report.revoked:
+            current_svnman.record_change('revoke', repo_id, project_id,
+                                         usernames=[username], user_ids=[user_id])
+        for repo_id, project_id in report.deleted:
+            current_svnman.record_change('delete-repo', repo_id, project_id)
+        if report.changes:
+            log.info('Synced %d changed repositories: %d project updates, %d users lost '
+                     'access, %d unknown users, %d repositories deleted',
+                     report.changes, report.updated, len(report.revoked),
+                     len(report.unknown), len(report.deleted))
+
+        if not loop:
+            break
+        try:
+            time.sleep(interval)
+        except KeyboardInterrupt:
+            log.info('Stopping')
+            break
+
+
+@manager_svnman.option('-a', '--after', dest='after', type=int, default=0,
+                       help='Only show events with a sequence number above this one')
+@manager_svnman.option('-f', '--follow', dest='follow', action='store_true', default=False,
+                       help='Keep waiting for new events')
+def events(after=0, follow=False):
+    """Shows repository and access change events as JSON, one per line."""
+
+    import json
+    from . import current_svnman
+
+    stream = current_svnman.event_stream
+    if stream is None:
+        log.error('The event stream is disabled, see SVNMAN_EVENTS')
+        return 1
+
+    def show(event: dict):
+        event['ts'] = event['ts'].isoformat()
+        event['project_id'] = str(event['project_id']) if event['project_id'] else None
+        print(json.dumps(event, sort_keys=True), flush=True)
+
+    if not follow:
+        while True:
+            batch = stream.read(after=after)
+            if not batch:
+                return
+            for event in batch:
+                after = max(after, event['seq'])
+                show(event)
+
+    try:
+        for event in stream.follow(after=after):
+            show(event)
+    except KeyboardInterrupt:
+        log.info('Stopping')
+
+
+@manager_svnman.option('profile_dir', nargs='?', default=None,
+                       help='Directory with profiles; defaults to SVNMAN_PROFILE_DIR')
+@manager_svnman.option('-n', '--name', dest='name', default='',
+                       help='Only include profiles of this route or command')
+@manager_svnman.option('-t', '--top', dest='top', type=int, default=40,
+                       help='Number of functions to show')
+@manager_svnman.option('-r', '--recent', dest='recent', type=int, default=0,
+                       help='Only include this many most recent profiles')
+def profile_summary(profile_dir=None, name='', top=40, recent=0):
+    """Shows the hottest functions aggregated over recorded profiles."""
+
+    from . import profiling
+
+    profile_dir = profile_dir or current_app.config['SVNMAN_PROFILE_DIR']
+    if not profile_dir:
+        log.error('Give a profile directory or set SVNMAN_PROFILE_DIR')
+        return 1
+
+    print(profiling.summarise(profile_dir, name, max_profiles=recent, top=top))
+
+
+@manager_svnman.option('trace_path', help='Trace file recorded with SVNMAN_TRAFFIC_RECORD_PATH')
+@manager_svnman.option('-t', '--target', dest='target', default='http://localhost:5001/api/',
+                       help='SVNman API URL to send the requests to')
+@manager_svnman.option('-s', '--speed', dest='speed', type=float, default=1.0,
+                       help='Replay speed, e.g. 10 for ten times faster than recorded')
+@manager_svnman.option('-w', '--workers', dest='workers', type=int, default=16,
+                       help='Maximum number of requests in flight')
+@manager_svnman.option('--allow-writes', dest='allow_writes', action='store_true', default=False,
+                       help='Also replay requests that create, change or delete repositories')
+def replay(trace_path, target='http://localhost:5001/api/', speed=1.0, workers=16,
+           allow_writes=False):
+    """Replays recorded SVNman API traffic against a (stand-in) server.
+
+    Request bodies are synthesized with the recorded size; no real
+    credentials are sent. Requests that change anything are refused unless
+    --allow-writes is given, as they use the recorded repository IDs.
+    """
+
+    from . import remote, traffic
+
+    entries = traffic.load_trace(trace_path)
+    log.info('Replaying %d requests against %s at %.1fx speed', len(entries), target, speed)
+
+    api = remote.API(remote_url=target, username='', password='', max_retries=0)
+    try:
+        summary = traffic.replay(entries, api, speed=speed, workers=workers,
+                                 allow_writes=allow_writes)
+    except ValueError as ex:
+        log.error('Refusing to replay: %s', ex)
+        return 1
+    print(summary.as_text())
+
+
+@manager_svnman.option('-p', '--port', dest='port', type=int, default=5001)
+@manager_svnman.option('-a', '--autocreate', dest='autocreate', action='store_true',
+                       default=False, help='Create unknown repositories on first use')
+@manager_svnman.option('-l', '--latency', dest='latency', type=float, default=0.0,
+                       help='Seconds to sleep before handling each request')
+def standin(port=5001, autocreate=False, latency=0.0):
+    """Runs an in-memory stand-in for the SVNman API server."""
+
+    from . import standin as standin_server
+
+    app = standin_server.create_app(autocreate=autocreate, latency=latency)
+    app.run('localhost', port, threaded=True)
+
+
+@manager_svnman.option('-u', '--user', dest='username', default=None,
+                       help='Subversion login that was granted or revoked access')
+@manager_svnman.option('-a', '--actor', dest='actor', default=None,
+                       help='Username of the user that made the change')
+@manager_svnman.option('-r', '--repo', dest='repo_id', default=None,
+                       help='Repository ID')
+@manager_svnman.option('-p', '--project', dest='project_url', default=None,
+                       help='Project URL')
+@manager_svnman.option('--action', dest='action', default=None,
+                       help='One of create-repo, delete-repo, grant, revoke')
+@manager_svnman.option('-s', '--since', dest='since', default=None,
+                       help='Only show changes since YYYY-MM-DD[THH:MM[:SS]] (UTC)')
+@manager_svnman.option('-U', '--until', dest='until', default=None,
+                       help='Only show changes before YYYY-MM-DD[THH:MM[:SS]] (UTC)')
+@manager_svnman.option('-l', '--limit', dest='limit', type=int, default=100,
+                       help='Maximum number of changes to show')
+def audit(username=None, actor=None, repo_id=None, project_url=None, action=None,
+          since=None, until=None, limit=100):
+    """Shows the audit trail of repository and access changes, most recent first."""
+
+    import datetime
+    from . import audit as audit_mod, current_svnman
+
+    def parse_time(value: str) -> datetime.datetime:
+        for fmt in ('%Y-%m-%d', '%Y-%m-%dT%H:%M', '%Y-%m-%dT%H:%M:%S'):
+            try:
+                timestamp = datetime.datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+            return timestamp.replace(tzinfo=datetime.timezone.utc)
+        raise ValueError(f'unable to parse {value!r}, use YYYY-MM-DD[THH:MM[:SS]]')
+
+    if current_svnman.audit_log is None:
+        log.error('The audit log is disabled, see SVNMAN_AUDIT_LOG')
+        return 1
+
+    pid = None
+    if project_url:
+        from pillar.api.projects.utils import project_id
+        pid = project_id(project_url)
+
+    if action and action not in audit_mod.ACTIONS:
+        log.error('Unknown action %r, choose from %s',
+                  action, ', '.join(sorted(audit_mod.ACTIONS)))
+        return 1
+
+    entries = current_svnman.audit_log.find(
+        username=username, actor=actor, repo_id=repo_id, project_id=pid, action=action,
+        since=parse_time(since) if since else None,
+        until=parse_time(until) if until else None,
+        limit=limit)
+
+    for entry in entries:
+        actor_info = entry.get('actor') or {}
+        print('{timestamp:%Y-%m-%d %H:%M:%S}  {action:<11}  {repo_id:<20}  by {actor:<16}  {users}'
+              .format(timestamp=entry['timestamp'],
+                      action=entry['action'],
+                      repo_id=entry['repo_id'],
+                      actor=actor_info.get('username') or '-',
+                      users=', '.join(entry.get('usernames') or [])))
+    log.info('Found %d audit entries', len(entries))
+
+
+def register(pillar_manager: Manager = None):
+    """Adds the 'svn' commands to the manager, by default the one of pillar.cli."""
+
+    (pillar_manager or manager).add_command('svn', manager_svnman)
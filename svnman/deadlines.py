@@ -0,0 +1,97 @@
+"""Deadline budgets for handling a request.
+
+The budget of the current Flask request is stored in `flask.g`, so that
+`svnman.remote.API` can bound its retries and timeouts by the time that is
+left, without every function in between having to pass it along.
+"""
+
+import contextlib
+import time
+import typing
+
+import attr
+import flask
+
+_G_KEY = 'svnman_deadline'
+
+
+@attr.s(frozen=True)
+class Deadline:
+    expires_at: float = attr.ib(validator=attr.validators.instance_of(float))
+    """Expiry time, in seconds on the time.monotonic() clock."""
+
+    @classmethod
+    def after(cls, seconds: float) -> 'Deadline':
+        """Returns a deadline that expires the given number of seconds from now."""
+        return cls(time.monotonic() + float(seconds))
+
+    def remaining(self) -> float:
+        """Returns the number of seconds left, or 0.0 if the deadline has passed."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+
+def current() -> typing.Optional[Deadline]:
+    """Returns the deadline of the current request, or None if there is none."""
+
+    if not flask.has_app_context():
+        return None
+    return flask.g.get(_G_KEY)
+
+
+@contextlib.contextmanager
+def budget(seconds: typing.Optional[float]):
+    """Context manager, runs its body with the given budget.
+
+    A nested budget can only shorten the deadline, never extend it.
+    Passing None or 0 runs the body with the enclosing deadline, if any.
+    """
+
+    previous = current()
+    if not seconds or seconds <= 0:
+        yield previous
+        return
+
+    deadline = Deadline.after(seconds)
+    if previous is not None and previous.expires_at < deadline.expires_at:
+        deadline = previous
+
+    setattr(flask.g, _G_KEY, deadline)
+    try:
+        yield deadline
+    finally:
+        setattr(flask.g, _G_KEY, previous)
+
+
+def request_budget() -> typing.Optional[float]:
+    """Returns the budget in seconds for the current request.
+
+    This is SVNMAN_REQUEST_BUDGET, shortened by the value of the
+    SVNMAN_REQUEST_BUDGET_HEADER request header if the client sent it.
+    Clients can only shorten the budget, not extend it.
+    """
+
+    from pillar import current_app
+
+    budget_secs = current_app.config.get('SVNMAN_REQUEST_BUDGET') or None
+    header_name = current_app.config.get('SVNMAN_REQUEST_BUDGET_HEADER')
+    if not header_name or not flask.has_request_context():
+        return budget_secs
+
+    header_value = flask.request.headers.get(header_name)
+    if not header_value:
+        return budget_secs
+
+    try:
+        header_secs = float(header_value)
+    except ValueError:
+        return budget_secs
+    if header_secs <= 0:
+        return budget_secs
+
+    if budget_secs is None:
+        return header_secs
+    return min(budget_secs, header_secs)
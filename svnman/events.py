@@ -0,0 +1,137 @@
+"""Stream of repository and access change events for other services.
+
+Events are stored in a capped collection, so other services can follow them
+with a tailable cursor instead of polling the projects collection:
+
+    stream = EventStream(lambda: pymongo.MongoClient(...)['pillar'])
+    for event in stream.follow(after=last_seen_seq):
+        handle(event)
+        last_seen_seq = event['seq']
+
+Events look like this:
+
+    {'seq': 47, 'ts': datetime, 'type': 'grant', 'repo_id': 'repo-id',
+     'project_id': ObjectId, 'usernames': ['svn-login']}
+
+where 'type' is one of 'create-repo', 'delete-repo', 'grant', and 'revoke'.
+Sequence numbers increase by one per event, in the order the events are
+inserted, so a consumer that resumes after the last sequence number it handled
+never skips an event.
+"""
+
+import datetime
+import logging
+import time
+import typing
+
+log = logging.getLogger(__name__)
+
+COLLECTION = 'svnman_events'
+
+
+class EventStream:
+    def __init__(self, db_getter: typing.Callable[[], typing.Any], *,
+                 size: int = 16 * 1024 * 1024,
+                 max_events: int = 100000):
+        """
+        :param db_getter: returns the MongoDB database.
+        :param size: maximum size of the capped collection in bytes.
+        :param max_events: maximum number of events kept.
+        """
+        self._db_getter = db_getter
+        self.size = size
+        self.max_events = max_events
+        self._collection_created = False
+
+    def collection(self):
+        import pymongo
+        import pymongo.errors
+
+        db = self._db_getter()
+        if not self._collection_created:
+            try:
+                db.create_collection(COLLECTION, capped=True, size=self.size,
+                                     max=self.max_events)
+            except pymongo.errors.CollectionInvalid:
+                pass  # Already exists.
+            db[COLLECTION].create_index([('seq', pymongo.ASCENDING)], unique=True)
+            self._collection_created = True
+        return db[COLLECTION]
+
+    def publish(self, event_type: str, repo_id: str, *,
+                project_id=None,
+                usernames: typing.Iterable[str] = ()) -> int:
+        """Publishes an event, returns its sequence number.
+
+        The sequence number is one above the last inserted event, and the
+        unique index on 'seq' refuses it when a concurrent publisher inserted
+        that number first. Allocating and inserting are thus one atomic step,
+        so events can't be inserted out of sequence order.
+        """
+
+        import pymongo.errors
+
+        coll = self.collection()
+        usernames = list(usernames)
+        while True:
+            seq = self._last_seq(coll) + 1
+            try:
+                coll.insert_one({
+                    'seq': seq,
+                    'ts': datetime.datetime.now(tz=datetime.timezone.utc),
+                    'type': event_type,
+                    'repo_id': repo_id,
+                    'project_id': project_id,
+                    'usernames': usernames,
+                })
+            except pymongo.errors.DuplicateKeyError:
+                log.debug('Event sequence number %d was taken, retrying', seq)
+                continue
+            return seq
+
+    def _last_seq(self, coll) -> int:
+        """Returns the sequence number of the last inserted event, or 0 if there is none."""
+
+        last = coll.find_one({}, projection={'_id': 0, 'seq': 1}, sort=[('seq', -1)])
+        return last['seq'] if last else 0
+
+    def read(self, *, after: int = 0, limit: int = 1000) -> typing.List[dict]:
+        """Returns up to 'limit' events with a sequence number above 'after'."""
+
+        cursor = self.collection().find({'seq': {'$gt': after}}, projection={'_id': 0})
+        return list(cursor.sort('seq', 1).limit(limit))
+
+    def follow(self, *, after: int = 0, max_await: float = 5.0,
+               idle_sleep: float = 1.0) -> typing.Iterator[dict]:
+        """Yields events with a sequence number above 'after', waiting for new ones.
+
+        Uses a tailable cursor, so MongoDB pushes new events to the consumer
+        instead of it polling for them. Never returns; stop iterating to stop.
+
+        :param max_await: seconds MongoDB waits for new events before
+            returning an empty batch.
+        :param idle_sleep: seconds to wait before re-opening the cursor when
+            MongoDB closed it, for example because the collection was empty.
+        """
+
+        import pymongo
+
+        coll = self.collection()
+        while True:
+            # MongoDB closes a tailable cursor whose first batch is empty, so
+            # also match the last seen event to keep the cursor open when the
+            # consumer is caught up. That event is skipped below.
+            query = {'seq': {'$gte': after}} if after > 0 else {}
+            cursor = coll.find(query,
+                               projection={'_id': 0},
+                               cursor_type=pymongo.CursorType.TAILABLE_AWAIT)
+            cursor.max_await_time_ms(int(max_await * 1000))
+
+            while cursor.alive:
+                for event in cursor:
+                    if event['seq'] <= after:
+                        continue
+                    after = event['seq']
+                    yield event
+
+            time.sleep(idle_sleep)
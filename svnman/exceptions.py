@@ -7,6 +7,14 @@ class SVNManException(Exception):
     """Base exception for all SVNMan-specific exceptions."""
 
 
+class DeadlineExceeded(SVNManException):
+    """Raised when the time budget for handling a request has been used up."""
+
+
+class BackendOverloaded(SVNManException):
+    """Raised when too many calls to the SVNman API are already in flight."""
+
+
 class RemoteError(SVNManException):
     """Errors sent to us by the remote SVNMan API.
 
@@ -40,9 +48,14 @@ class RepoNotFound(RemoteError):
         return f'RepoNotFound({self.repo_id!r})'
 
 
+class CursorExpired(RemoteError):
+    """Raised when the change cursor is too old for the API to list changes since."""
+
+
 http_error_map = collections.defaultdict(lambda: RemoteError)
 http_error_map.update({
     400: BadAPIRequest,
     500: InternalAPIServerError,
     404: RepoNotFound,
+    410: CursorExpired,
 })
@@ -0,0 +1,120 @@
+"""Adaptive limit on the number of concurrent calls to the SVNman API.
+
+When the SVNman server slows down, calls pile up and every worker of the
+process can end up waiting for it. The limiter caps the number of calls in
+flight, using additive-increase/multiplicative-decrease (AIMD) on the
+observed latency, and rejects calls quickly when the short wait queue is full.
+"""
+
+import threading
+import time
+import typing
+
+import attr
+
+from pillar import attrs_extra
+
+from . import exceptions
+
+
+@attr.s
+class AdaptiveLimiter:
+    min_limit: int = attr.ib(default=1, validator=attr.validators.instance_of(int))
+    max_limit: int = attr.ib(default=20, validator=attr.validators.instance_of(int))
+    initial_limit: int = attr.ib(default=5, validator=attr.validators.instance_of(int))
+
+    queue_size: int = attr.ib(default=5, validator=attr.validators.instance_of(int))
+    """Maximum number of calls waiting for a slot; more are rejected immediately."""
+
+    queue_timeout: float = attr.ib(default=1.0, converter=float)
+    """Maximum number of seconds a call waits for a slot."""
+
+    latency_target: float = attr.ib(default=2.0, converter=float)
+    """Calls that take longer than this many seconds are treated as congestion."""
+
+    backoff_ratio: float = attr.ib(default=0.7, converter=float)
+    """The limit is multiplied by this factor on congestion."""
+
+    _log = attrs_extra.log('%s.AdaptiveLimiter' % __name__)
+    _limit: float = attr.ib(init=False, repr=False, cmp=False)
+    _in_flight: int = attr.ib(default=0, init=False, repr=False, cmp=False)
+    _waiting: int = attr.ib(default=0, init=False, repr=False, cmp=False)
+    _cond: threading.Condition = attr.ib(default=attr.Factory(threading.Condition),
+                                         init=False, repr=False, cmp=False)
+
+    def __attrs_post_init__(self):
+        if not 1 <= self.min_limit <= self.max_limit:
+            raise ValueError(f'invalid limits: min={self.min_limit} max={self.max_limit}')
+        self._limit = float(min(max(self.initial_limit, self.min_limit), self.max_limit))
+
+    @property
+    def limit(self) -> int:
+        """The current concurrency limit."""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self, timeout: typing.Optional[float] = None):
+        """Waits for a slot to become available.
+
+        :param timeout: maximum number of seconds to wait; defaults to
+            self.queue_timeout, and is never longer than that.
+        :raises svnman.exceptions.BackendOverloaded: when no slot became available.
+        """
+
+        if timeout is None or timeout > self.queue_timeout:
+            timeout = self.queue_timeout
+
+        with self._cond:
+            if self._in_flight < self.limit:
+                self._in_flight += 1
+                return
+
+            if self._waiting >= self.queue_size:
+                self._log.warning('rejecting call: %d in flight, %d waiting, limit %d',
+                                  self._in_flight, self._waiting, self.limit)
+                raise exceptions.BackendOverloaded('too many concurrent calls to SVNman API')
+
+            self._waiting += 1
+            try:
+                wait_until = time.monotonic() + timeout
+                while self._in_flight >= self.limit:
+                    remaining = wait_until - time.monotonic()
+                    if remaining <= 0:
+                        self._log.warning('rejecting call after waiting %.2f seconds: '
+                                          '%d in flight, limit %d',
+                                          timeout, self._in_flight, self.limit)
+                        raise exceptions.BackendOverloaded(
+                            'timeout waiting for a free connection to SVNman API')
+                    self._cond.wait(remaining)
+                self._in_flight += 1
+            finally:
+                self._waiting -= 1
+
+    def release(self, latency: float, success: bool):
+        """Releases the slot, and adapts the limit to the outcome of the call.
+
+        :param latency: duration of the call in seconds.
+        :param success: False when the call failed in a way that indicates
+            the server is in trouble (connection errors, timeouts, 5xx).
+        """
+
+        with self._cond:
+            # Only grow when the limit is actually being used, otherwise it would
+            # creep up to max_limit during quiet periods.
+            limit_used = self._in_flight >= self._limit / 2
+            self._in_flight -= 1
+
+            if success and latency <= self.latency_target:
+                if limit_used:
+                    self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+            else:
+                old_limit = self.limit
+                self._limit = max(float(self.min_limit), self._limit * self.backoff_ratio)
+                if self.limit != old_limit:
+                    self._log.info('lowering concurrency limit from %d to %d '
+                                   '(success=%s, latency=%.2f s)',
+                                   old_limit, self.limit, success, latency)
+            self._cond.notify_all()
@@ -0,0 +1,110 @@
+"""Opt-in profiling of svnman routes and CLI commands.
+
+Set SVNMAN_PROFILE_DIR to enable profiling. A fraction
+SVNMAN_PROFILE_SAMPLE_RATE of requests and CLI runs is then profiled, plus
+requests by admins that send the SVNMAN_PROFILE_HEADER header. Each profile
+is dumped as '<name>-<timestamp>-<pid>-<n>.prof' file; 'svn profile_summary'
+shows the hottest functions aggregated over them.
+
+When SVNMAN_PROFILE_DIR is not set, the overhead is a single config lookup.
+"""
+
+import contextlib
+import glob
+import io
+import itertools
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+
+import flask
+
+log = logging.getLogger(__name__)
+
+SUMMARY_FUNCTION_COUNT = 40
+
+# cProfile can't profile nested calls separately; only the outermost one is profiled.
+_active = threading.local()
+_counter = itertools.count()
+
+
+def _config(key: str, default=None):
+    if not flask.has_app_context():
+        return default
+    return flask.current_app.config.get(key, default)
+
+
+def _should_profile(profile_dir: str) -> bool:
+    if flask.has_request_context():
+        header_name = _config('SVNMAN_PROFILE_HEADER')
+        if header_name and flask.request.headers.get(header_name):
+            from pillar.auth import current_user
+            if current_user.has_cap('admin'):
+                return True
+            log.warning('Ignoring %s header from non-admin user %s',
+                        header_name, current_user.user_id)
+
+    sample_rate = _config('SVNMAN_PROFILE_SAMPLE_RATE', 0.0)
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+@contextlib.contextmanager
+def profiled(name: str):
+    """Context manager, profiles its body if profiling is enabled and sampled."""
+
+    profile_dir = _config('SVNMAN_PROFILE_DIR')
+    if not profile_dir or getattr(_active, 'profiling', False) \
+            or not _should_profile(profile_dir):
+        yield
+        return
+
+    import cProfile
+
+    profiler = cProfile.Profile()
+    _active.profiling = True
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _active.profiling = False
+        try:
+            _dump(profiler, profile_dir, name)
+        except OSError:
+            log.exception('Unable to write profile of %s to %s', name, profile_dir)
+
+
+def _dump(profiler, profile_dir: str, name: str):
+    # Only write the profile; aggregating profiles is too slow for the request path.
+    os.makedirs(profile_dir, exist_ok=True)
+    timestamp = time.strftime('%Y%m%d-%H%M%S')
+    fname = os.path.join(profile_dir,
+                         f'{name}-{timestamp}-{os.getpid()}-{next(_counter)}.prof')
+    profiler.dump_stats(fname)
+    log.info('Wrote profile of %s to %s', name, fname)
+
+
+def summarise(profile_dir: str, name: str = '', *,
+              max_profiles: int = 0, top: int = SUMMARY_FUNCTION_COUNT) -> str:
+    """Returns the hottest functions over the profiles in the directory.
+
+    :param name: only include profiles of this name; all profiles when empty.
+    :param max_profiles: only include this many most recent profiles; 0 for all.
+    """
+
+    pattern = f'{name}-*.prof' if name else '*.prof'
+    fnames = sorted(glob.glob(os.path.join(profile_dir, pattern)), key=os.path.getmtime)
+    if max_profiles:
+        fnames = fnames[-max_profiles:]
+    if not fnames:
+        return 'No profiles found.\n'
+
+    out = io.StringIO()
+    out.write(f'Aggregated over {len(fnames)} profiles\n')
+    stats = pstats.Stats(*fnames, stream=out)
+    stats.sort_stats('cumulative').print_stats(top)
+    stats.sort_stats('tottime').print_stats(top)
+    return out.getvalue()
@@ -0,0 +1,214 @@
+"""Token-bucket rate limiting of the SVNman routes.
+
+Buckets are kept per user and per project, so that a single script or
+runaway client can't flood the SVNman server through us. By default the
+buckets live in process memory; set SVNMAN_RATE_LIMIT_STORE = 'mongo' to
+share them between processes through MongoDB.
+"""
+
+import datetime
+import logging
+import threading
+import time
+import typing
+
+import attr
+
+MONGO_COLLECTION = 'svnman_rate_limits'
+
+log = logging.getLogger(__name__)
+
+
+@attr.s(frozen=True)
+class Limit:
+    rate: float = attr.ib(converter=float)
+    """Number of tokens added per second."""
+    burst: float = attr.ib(converter=float)
+    """Maximum number of tokens in the bucket."""
+
+
+def _refill(tokens: float, updated: float, now: float, limit: Limit) -> float:
+    """Returns the number of tokens in a bucket, after refilling since 'updated'."""
+    elapsed = max(0.0, now - updated)
+    return min(limit.burst, tokens + elapsed * limit.rate)
+
+
+def _wait_time(tokens: float, limit: Limit) -> float:
+    """Returns the number of seconds until the bucket has a whole token."""
+    if limit.rate <= 0:
+        return float('inf')
+    return (1.0 - tokens) / limit.rate
+
+
+def _full_after(limit: Limit) -> float:
+    """Returns the number of seconds it takes to refill an empty bucket."""
+    return limit.burst / limit.rate if limit.rate > 0 else float('inf')
+
+
+class MemoryStore:
+    """Keeps the buckets in process memory."""
+
+    max_buckets = 10000
+
+    def __init__(self):
+        self._buckets = {}  # key: (tokens, updated, full_after)
+        self._lock = threading.Lock()
+
+    def peek(self, key: str, limit: Limit, now: float) -> float:
+        """Returns what take() would return, without taking a token."""
+
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (limit.burst, now, None))
+        tokens = _refill(tokens, updated, now, limit)
+        return _wait_time(tokens, limit) if tokens < 1.0 else 0.0
+
+    def take(self, key: str, limit: Limit, now: float) -> float:
+        """Takes a token from the bucket.
+
+        :returns: 0.0 if a token was taken, otherwise the number of seconds
+            until a token becomes available.
+        """
+
+        full_after = _full_after(limit)
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (limit.burst, now, None))
+            tokens = _refill(tokens, updated, now, limit)
+            if tokens < 1.0:
+                self._buckets[key] = (tokens, now, full_after)
+                return _wait_time(tokens, limit)
+
+            self._buckets[key] = (tokens - 1.0, now, full_after)
+            if len(self._buckets) > self.max_buckets:
+                self._evict(now)
+            return 0.0
+
+    def _evict(self, now: float):
+        """Forgets buckets that would have been refilled completely by now.
+
+        Every bucket is judged by the limit it was last used with, as the
+        buckets of different actions have different limits.
+        """
+        stale = [key for key, (tokens, updated, full_after) in self._buckets.items()
+                 if now - updated >= full_after]
+        for key in stale:
+            del self._buckets[key]
+
+
+class MongoStore:
+    """Keeps the buckets in MongoDB, shared by all processes.
+
+    Uses optimistic concurrency on the 'updated' field; when that fails too
+    often the request is allowed rather than blocking on a contended bucket.
+    """
+
+    max_attempts = 5
+
+    def __init__(self, collection_getter: typing.Callable[[], typing.Any]):
+        self._collection_getter = collection_getter
+        self._index_created = False
+
+    def _collection(self):
+        import pymongo
+
+        coll = self._collection_getter()
+        if not self._index_created:
+            coll.create_index([('expires', pymongo.ASCENDING)], expireAfterSeconds=0)
+            self._index_created = True
+        return coll
+
+    def peek(self, key: str, limit: Limit, now: float) -> float:
+        """Returns what take() would return, without taking a token."""
+
+        doc = self._collection().find_one({'_id': key})
+        if doc is None:
+            return 0.0
+        tokens = _refill(doc['tokens'], doc['updated'], now, limit)
+        return _wait_time(tokens, limit) if tokens < 1.0 else 0.0
+
+    def take(self, key: str, limit: Limit, now: float) -> float:
+        import pymongo.errors
+
+        coll = self._collection()
+        full_after = limit.burst / limit.rate if limit.rate > 0 else 86400.0
+        expires = datetime.datetime.utcfromtimestamp(now + full_after)
+
+        for _ in range(self.max_attempts):
+            doc = coll.find_one({'_id': key})
+            if doc is None:
+                tokens, updated = limit.burst, now
+            else:
+                tokens, updated = doc['tokens'], doc['updated']
+            tokens = _refill(tokens, updated, now, limit)
+
+            wait = _wait_time(tokens, limit) if tokens < 1.0 else 0.0
+            if not wait:
+                tokens -= 1.0
+            new_doc = {'tokens': tokens, 'updated': now, 'expires': expires}
+
+            if doc is None:
+                try:
+                    coll.insert_one(dict(new_doc, _id=key))
+                except pymongo.errors.DuplicateKeyError:
+                    continue
+                return wait
+
+            res = coll.update_one({'_id': key, 'updated': updated}, {'$set': new_doc})
+            if res.matched_count == 1:
+                return wait
+
+        log.warning('rate limit bucket %r is too contended, allowing request', key)
+        return 0.0
+
+
+class RateLimiter:
+    """Checks per-action limits for a set of keys."""
+
+    def __init__(self, store, limits: typing.Mapping[str, Limit]):
+        self.store = store
+        self.limits = dict(limits)
+
+    def check(self, action: str, keys: typing.Iterable[str]) -> float:
+        """Takes a token for the action from the bucket of each key.
+
+        Tokens are only taken when the buckets of all keys allow the action,
+        so a request refused because of one key doesn't drain the others.
+
+        :returns: 0.0 if the action is allowed, otherwise the number of
+            seconds the client should wait before retrying.
+        """
+
+        limit = self.limits.get(action)
+        if limit is None:
+            return 0.0
+
+        now = time.time()
+        bucket_keys = [f'{action}:{key}' for key in keys]
+        retry_after = max((self.store.peek(key, limit, now) for key in bucket_keys),
+                          default=0.0)
+        if retry_after:
+            return retry_after
+
+        for key in bucket_keys:
+            wait = self.store.take(key, limit, now)
+            retry_after = max(retry_after, wait)
+        return retry_after
+
+
+def from_config(config: typing.Mapping[str, typing.Any]) -> typing.Optional[RateLimiter]:
+    """Constructs a RateLimiter from the Flask config, or None if rate limiting is disabled."""
+
+    limits = {action: Limit(**settings)
+              for action, settings in (config.get('SVNMAN_RATE_LIMITS') or {}).items()}
+    if not limits:
+        return None
+
+    store_type = config.get('SVNMAN_RATE_LIMIT_STORE', 'memory')
+    if store_type == 'memory':
+        store = MemoryStore()
+    elif store_type == 'mongo':
+        from pillar import current_app
+        store = MongoStore(lambda: current_app.db(MONGO_COLLECTION))
+    else:
+        raise ValueError(f'unknown SVNMAN_RATE_LIMIT_STORE {store_type!r}')
+
+    return RateLimiter(store, limits)
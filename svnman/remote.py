@@ -1,3 +1,6 @@
+import collections
+import threading
+import time
 import typing
 
 import attr
@@ -5,18 +8,68 @@ import requests
 
 from pillar import attrs_extra
 
-from . import exceptions
+from . import deadlines, exceptions, tracing
+from .limiter import AdaptiveLimiter
+
+if typing.TYPE_CHECKING:
+    from . import traffic
 
 # For replacing the hash type indicator, as Apache only
 # understands BCrypt when using the 2y marker.
 HASH_TYPES_TO_REPLACE = {'$2a$', '$2b$'}
 
+# Batches with more usernames than this are summarised in the INFO logs.
+LOG_USERNAMES_LIMIT = 10
+
+# Requests with these methods can safely be sent again after the connection
+# failed while waiting for the response. Other requests may have been
+# handled already, so they are only retried when no connection was made.
+# DELETE isn't included: resending one that was handled gives a 404, which
+# would look like the repository never existed.
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT'}
+
+ProgressCallback = typing.Callable[[int, int], None]
+"""Called as callback(items_done, items_total) after each submitted page."""
+
 
 @attr.s
 class RepoDescription:
     repo_id: str = attrs_extra.string()
     access: typing.List[str] = attr.ib(validator=attr.validators.instance_of(list))
 
+    def copy(self) -> 'RepoDescription':
+        return attr.evolve(self, access=list(self.access))
+
+
+@attr.s
+class RepoStats:
+    repo_id: str = attrs_extra.string()
+    size: int = attr.ib(validator=attr.validators.instance_of(int))
+    """Size of the repository on disk, in bytes."""
+    revision: int = attr.ib(validator=attr.validators.instance_of(int))
+    """Youngest revision number, 0 for an empty repository."""
+    last_commit: typing.Optional[float] = attr.ib(default=None)
+    """UNIX timestamp of the youngest revision, None for an empty repository."""
+
+
+@attr.s
+class RepoChange:
+    """State of a repository after it changed."""
+
+    repo_id: str = attrs_extra.string()
+    deleted: bool = attr.ib(default=False)
+    access: typing.List[str] = attr.ib(default=attr.Factory(list))
+    """Usernames with access; empty for deleted repositories."""
+
+
+@attr.s
+class ChangesPage:
+    changes: typing.List[RepoChange] = attr.ib()
+    cursor: str = attr.ib()
+    """Pass to changes_since() to get the changes after this page."""
+    more: bool = attr.ib(default=False)
+    """Whether there are more changes available right now."""
+
 
 @attr.s
 class CreateRepo:
@@ -25,6 +78,23 @@ class CreateRepo:
     creator: str = attrs_extra.string()
 
 
+@attr.s
+class _CachedRepo:
+    """Repository description with the validators of the response it came from."""
+
+    description: RepoDescription = attr.ib()
+    etag: str = attr.ib(default='')
+    last_modified: str = attr.ib(default='')
+
+    def conditional_headers(self) -> typing.Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
 @attr.s
 class API:
     # The remote URL and credentials are separate. This way we can log the
@@ -40,23 +110,231 @@ class API:
     password: str = attr.ib(validator=attr.validators.instance_of(str), repr=False)
     """Password for authenticating ourselves with the API."""
 
+    repo_cache_size: int = attr.ib(default=1000, validator=attr.validators.instance_of(int))
+    """Maximum number of repository descriptions kept for conditional GETs."""
+
+    access_page_size: int = attr.ib(default=500, validator=attr.validators.instance_of(int))
+    """Maximum number of grants + revokes sent to the API in one request."""
+
+    access_workers: int = attr.ib(default=1, validator=attr.validators.instance_of(int))
+    """Number of pages of one modify_access() call that are submitted in parallel."""
+
+    timeout: float = attr.ib(default=30.0, converter=float)
+    """Timeout in seconds of a single HTTP request, shortened to fit the request deadline."""
+
+    max_retries: int = attr.ib(default=3, validator=attr.validators.instance_of(int))
+    """Number of times a request is retried when the connection to the API fails."""
+
+    limiter: typing.Optional[AdaptiveLimiter] = attr.ib(default=None, repr=False)
+    """Limits the number of concurrent calls; None means unlimited."""
+
+    recorder: typing.Optional['traffic.TrafficRecorder'] = attr.ib(default=None, repr=False)
+    """Records every request for later replay; None means no recording."""
+
     _log = attrs_extra.log('%s.Remote' % __name__)
     _session = requests.Session()
 
+    # Maps repo ID to a _CachedRepo, in least-recently-used order.
+    _repo_cache = attr.ib(default=attr.Factory(collections.OrderedDict),
+                          init=False, repr=False, cmp=False)
+    _repo_cache_lock = attr.ib(default=attr.Factory(threading.Lock),
+                               init=False, repr=False, cmp=False)
+
+    # Durations in seconds of the most recent calls.
+    _latencies = attr.ib(default=attr.Factory(lambda: collections.deque(maxlen=100)),
+                         init=False, repr=False, cmp=False)
+
     def __attrs_post_init__(self):
         from requests.adapters import HTTPAdapter
-        self._session.mount('/', HTTPAdapter(max_retries=10))
 
-    def _request(self, method: str, rel_url: str, **kwargs) -> requests.Response:
-        """Performs a HTTP request on the API server."""
+        # Retries are handled in _request(), so that they fit the request deadline.
+        for prefix in ('http://', 'https://'):
+            self._session.mount(prefix, HTTPAdapter(max_retries=0))
+        # Requests transparently decompresses the response body.
+        self._session.headers['Accept-Encoding'] = 'gzip, deflate'
+
+    def _request(self, method: str, rel_url: str, *,
+                 deadline: deadlines.Deadline = None,
+                 trace: tracing.Trace = None,
+                 **kwargs) -> requests.Response:
+        """Performs a HTTP request on the API server.
+
+        Connection errors are retried up to self.max_retries times; requests
+        that aren't idempotent, like creating a repository, only when the
+        connection couldn't be made at all, as the server may have handled
+        the request before the connection broke. When the
+        current request has a deadline (see svnman.deadlines), each attempt only
+        gets the remaining budget, and DeadlineExceeded is raised once it's gone.
+
+        The request ID of the current request is sent in the X-Request-Id
+        header, and each attempt is recorded as 'remote' span.
+
+        :param deadline: the deadline to use; defaults to the deadline of the
+            current request. Pass it explicitly when running in another thread.
+        :param trace: the trace to record into; defaults to the trace of the
+            current request. Pass it explicitly when running in another thread.
+        :raises svnman.exceptions.DeadlineExceeded:
+        """
 
         from urllib.parse import urljoin
 
         abs_url = urljoin(self.remote_url, rel_url)
-        self._log.getChild('request').info('%s %s', method, abs_url)
+        deadline = deadline or deadlines.current()
+        trace = trace or tracing.current()
+        request_id = trace.request_id if trace is not None else ''
+
+        self._log.getChild('request').info('%s %s request_id=%s', method, abs_url,
+                                           request_id or '-')
+
+        auth = (self.username, self.password) if self.username or self.password else None
+        if request_id:
+            kwargs['headers'] = dict(kwargs.get('headers') or {}, **{
+                'X-Request-Id': request_id})
+
+        attempt = 0
+        while True:
+            timeout = self._attempt_timeout(deadline, method, abs_url)
+            try:
+                with tracing.span('remote', trace, method=method, path=rel_url) as tags:
+                    resp = self._limited_request(method, abs_url, rel_url=rel_url, auth=auth,
+                                                 timeout=timeout, **kwargs)
+                    tags['status'] = resp.status_code
+                return resp
+            except requests.Timeout as ex:
+                if deadline is not None and deadline.expired:
+                    raise exceptions.DeadlineExceeded(f'{method} {abs_url} timed out') from ex
+                if not isinstance(ex, requests.ConnectionError):
+                    raise
+                error = ex
+            except requests.ConnectionError as ex:
+                error = ex
+
+            if method not in IDEMPOTENT_METHODS and not _failed_to_connect(error):
+                raise error
+
+            attempt += 1
+            if attempt > self.max_retries:
+                raise error
+
+            backoff = min(0.1 * 2 ** (attempt - 1), 2.0)
+            if deadline is not None:
+                backoff = min(backoff, deadline.remaining())
+            self._log.warning('%s %s failed (%s), retry %d of %d in %.1f seconds',
+                              method, abs_url, error, attempt, self.max_retries, backoff)
+            time.sleep(backoff)
+
+    def _limited_request(self, method: str, abs_url: str, *, rel_url: str, timeout: float,
+                         **kwargs) -> requests.Response:
+        """Performs a single HTTP request, within the concurrency limit.
+
+        :raises svnman.exceptions.BackendOverloaded: when the concurrency limit
+            is reached and no slot became available in time.
+        """
+
+        if self.limiter is not None:
+            self.limiter.acquire(timeout=timeout)
+
+        start = time.monotonic()
+        success = False
+        resp = None
+        try:
+            resp = self._session.request(method, abs_url, timeout=timeout, **kwargs)
+            success = resp.status_code < 500
+            return resp
+        except Exception as ex:
+            resp = ex
+            raise
+        finally:
+            latency = time.monotonic() - start
+            self._latencies.append(latency)
+            if self.limiter is not None:
+                self.limiter.release(latency, success)
+            if self.recorder is not None:
+                self._record(method, rel_url, resp, latency)
+
+    def _record(self, method: str, rel_url: str,
+                resp: typing.Union[requests.Response, Exception], latency: float):
+        """Records the request with the traffic recorder, never raising an exception."""
+
+        try:
+            if isinstance(resp, requests.Response):
+                body = resp.request.body or b''
+                self.recorder.record(method, rel_url, len(body), resp.status_code, latency)
+            else:
+                self.recorder.record(method, rel_url, 0, type(resp).__name__, latency)
+        except Exception:
+            self._log.exception('Unable to record %s %s', method, rel_url)
+
+    def _attempt_timeout(self, deadline: typing.Optional[deadlines.Deadline],
+                         method: str, abs_url: str) -> float:
+        """Returns the timeout for a single attempt, fitting in the deadline."""
+
+        if deadline is None:
+            return self.timeout
+
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            self._log.warning('%s %s: request deadline exceeded, not sending request',
+                              method, abs_url)
+            raise exceptions.DeadlineExceeded(f'no time left for {method} {abs_url}')
+        return min(self.timeout, remaining)
+
+    def probe(self, timeout: float = 5.0) -> requests.Response:
+        """Sends a HEAD request to the API root, to check that the API is reachable.
+
+        Bypasses the retries and the concurrency limit, so that it reports
+        on the server itself and not on our own queue.
+        """
 
         auth = (self.username, self.password) if self.username or self.password else None
-        return self._session.request(method, abs_url, auth=auth, **kwargs)
+        return self._session.head(self.remote_url, auth=auth, timeout=timeout)
+
+    def warm_up(self, connections: int, timeout: float = 5.0) -> int:
+        """Opens connections to the API, so that the first requests can reuse them.
+
+        Opens at most as many connections as the connection pool keeps.
+
+        :returns: the number of successful probes.
+        """
+
+        from concurrent import futures
+        from requests.adapters import DEFAULT_POOLSIZE
+
+        if connections < 1:
+            return 0
+        # The adapters mounted in __attrs_post_init__() keep this many
+        # connections per host; the pool discards any more after use.
+        connections = min(connections, DEFAULT_POOLSIZE)
+
+        self._log.info('Warming up %d connections to %s', connections, self.remote_url)
+        with futures.ThreadPoolExecutor(max_workers=connections) as executor:
+            probes = [executor.submit(self.probe, timeout) for _ in range(connections)]
+
+        ok_count = 0
+        for probe in probes:
+            try:
+                probe.result()
+            except requests.RequestException as ex:
+                self._log.warning('Unable to warm up connection to %s: %s', self.remote_url, ex)
+            else:
+                ok_count += 1
+        return ok_count
+
+    def latency_summary(self) -> typing.Dict[str, float]:
+        """Returns statistics in milliseconds of the durations of recent calls."""
+
+        latencies = sorted(self._latencies)
+        if not latencies:
+            return {'count': 0}
+
+        def percentile(pct: float) -> float:
+            index = min(len(latencies) - 1, int(round(pct / 100 * (len(latencies) - 1))))
+            return round(latencies[index] * 1000, 2)
+
+        return {'count': len(latencies),
+                'p50_ms': percentile(50),
+                'p95_ms': percentile(95),
+                'max_ms': round(latencies[-1] * 1000, 2)}
 
     def _raise_for_status(self, resp: requests.Response):
         """Raises the appropriate exception for the given response."""
@@ -68,12 +346,81 @@ class API:
         raise exc_class(resp.text)
 
     def fetch_repo(self, repo_id: str) -> RepoDescription:
-        """Fetches repository information from the remote."""
+        """Fetches repository information from the remote.
 
-        resp = self._request('GET', f'repo/{repo_id}')
+        The validators (ETag and Last-Modified) of the response are kept, so
+        that subsequent fetches of the same repository are conditional. When
+        the remote responds with 304 Not Modified, a copy of the previously
+        parsed description is returned.
+        """
+
+        with self._repo_cache_lock:
+            cached = self._repo_cache.get(repo_id)
+            if cached is not None:
+                self._repo_cache.move_to_end(repo_id)
+
+        headers = cached.conditional_headers() if cached is not None else {}
+        resp = self._request('GET', f'repo/{repo_id}', headers=headers)
+        if resp.status_code == requests.codes.not_modified and cached is not None:
+            self._log.debug('Repository %r not modified, using cached description', repo_id)
+            return cached.description.copy()
         self._raise_for_status(resp)
 
-        return RepoDescription(**resp.json())
+        description = RepoDescription(**resp.json())
+        self._remember_repo(repo_id, resp, description)
+        return description
+
+    def fetch_stats(self, repo_id: str) -> RepoStats:
+        """Fetches size and activity statistics of the repository."""
+
+        resp = self._request('GET', f'repo/{repo_id}/stats')
+        self._raise_for_status(resp)
+        return RepoStats(**resp.json())
+
+    def changes_since(self, cursor: str, *, limit: int = 500) -> ChangesPage:
+        """Lists the repositories that changed since the cursor.
+
+        Every repository is listed at most once per page, with its state
+        after the last change. An empty cursor lists all repositories.
+
+        :raises svnman.exceptions.CursorExpired: when the API no longer knows
+            the changes since the cursor; start again with an empty cursor.
+        """
+
+        resp = self._request('GET', 'changes', params={'since': cursor, 'limit': limit})
+        self._raise_for_status(resp)
+
+        info = resp.json()
+        return ChangesPage(changes=[RepoChange(**change) for change in info['changes']],
+                           cursor=info['cursor'],
+                           more=info.get('more', False))
+
+    def _remember_repo(self, repo_id: str, resp: requests.Response,
+                       description: RepoDescription):
+        """Stores the repository description and its validators for conditional GETs."""
+
+        etag = resp.headers.get('ETag', '')
+        last_modified = resp.headers.get('Last-Modified', '')
+
+        with self._repo_cache_lock:
+            if not etag and not last_modified:
+                # Without validators we can never use the cached copy.
+                self._repo_cache.pop(repo_id, None)
+                return
+
+            # Keep a copy, so that callers changing the description don't change the cache.
+            self._repo_cache[repo_id] = _CachedRepo(description=description.copy(),
+                                                    etag=etag,
+                                                    last_modified=last_modified)
+            self._repo_cache.move_to_end(repo_id)
+            while len(self._repo_cache) > self.repo_cache_size:
+                self._repo_cache.popitem(last=False)
+
+    def _forget_repo(self, repo_id: str):
+        """Removes the repository from the conditional GET cache."""
+
+        with self._repo_cache_lock:
+            self._repo_cache.pop(repo_id, None)
 
     def create_repo(self, create_repo: CreateRepo) -> str:
         """Creates a new repository with the given ID.
@@ -98,14 +445,30 @@ class API:
     def modify_access(self,
                       repo_id: str,
                       grant: typing.List[typing.Tuple[str, str]],
-                      revoke: typing.List[str]):
+                      revoke: typing.List[str],
+                      *,
+                      page_size: int = None,
+                      workers: int = None,
+                      progress: ProgressCallback = None):
         """Modifies user access to the repository.
 
         Does not return anything; no exception means exection was ok.
 
+        Large lists are split into pages of at most `page_size` grants and
+        revokes, and each page is sent in a separate request. Grants are sent
+        before revokes; when pages are submitted in parallel there is no
+        ordering between them, so don't grant and revoke the same user in a
+        single call.
+
         :param repo_id: the repository ID
         :param grant: list of (username password) tuples. The passwords should be BCrypt-hashed.
         :param revoke: list of usernames.
+        :param page_size: maximum number of grants + revokes per request,
+            defaults to self.access_page_size.
+        :param workers: number of pages submitted in parallel,
+            defaults to self.access_workers.
+        :param progress: optional callback, called as progress(items_done, items_total)
+            after each page has been submitted.
         """
 
         # Replace the hash type indicator, as Apache only gets BCrypt
@@ -118,18 +481,92 @@ class API:
         grants = [{'username': u,
                    'password': changehash(p)} for u, p in grant]
 
-        self._log.info('Modifying access rules for repository %r: grants=%s revokes=%s',
-                       repo_id, [u for u, p in grant], revoke)
+        page_size = page_size or self.access_page_size
+        workers = workers or self.access_workers
+        pages = _access_pages(grants, revoke, page_size)
+
+        granted_names = [u for u, p in grant]
+        if len(granted_names) + len(revoke) <= LOG_USERNAMES_LIMIT:
+            self._log.info('Modifying access rules for repository %r: grants=%s revokes=%s',
+                           repo_id, granted_names, revoke)
+        else:
+            self._log.info('Modifying access rules for repository %r: %d grants, %d revokes '
+                           'in %d pages', repo_id, len(grant), len(revoke), len(pages))
+            self._log.debug('Grants for repository %r: %s', repo_id, granted_names)
+            self._log.debug('Revokes for repository %r: %s', repo_id, revoke)
+
+        items_total = len(grants) + len(revoke)
+        items_done = 0
+
+        # Worker threads have no access to flask.g, so pass these along explicitly.
+        deadline = deadlines.current()
+        trace = tracing.current()
+
+        def submit(page: dict) -> int:
+            resp = self._request('POST', f'repo/{repo_id}/access', json=page,
+                                 deadline=deadline, trace=trace)
+            self._raise_for_status(resp)
+            return len(page['grant']) + len(page['revoke'])
+
+        if workers <= 1 or len(pages) == 1:
+            for page in pages:
+                items_done += submit(page)
+                if progress is not None:
+                    progress(items_done, items_total)
+            return
 
-        resp = self._request('POST', f'repo/{repo_id}/access', json={
-            'grant': grants,
-            'revoke': revoke,
-        })
-        self._raise_for_status(resp)
+        from concurrent import futures
+
+        with futures.ThreadPoolExecutor(max_workers=min(workers, len(pages))) as executor:
+            pending = [executor.submit(submit, page) for page in pages]
+            try:
+                for future in futures.as_completed(pending):
+                    items_done += future.result()
+                    if progress is not None:
+                        progress(items_done, items_total)
+            except Exception:
+                for future in pending:
+                    future.cancel()
+                raise
 
     def delete_repo(self, repo_id: str):
         """Deletes a repository, cannot be undone through the API."""
 
         self._log.info('Deleting repository %r', repo_id)
         resp = self._request('DELETE', f'repo/{repo_id}')
+        self._forget_repo(repo_id)
         self._raise_for_status(resp)
+
+
+def _access_pages(grants: typing.List[dict], revoke: typing.List[str],
+                  page_size: int) -> typing.List[dict]:
+    """Splits grants and revokes into request bodies of at most page_size items.
+
+    Always returns at least one page, even when there is nothing to grant or revoke.
+    """
+
+    if page_size < 1:
+        raise ValueError(f'page_size should be positive, not {page_size}')
+
+    pages = []
+    page = {'grant': [], 'revoke': []}
+    for key, items in (('grant', grants), ('revoke', revoke)):
+        for item in items:
+            if len(page['grant']) + len(page['revoke']) >= page_size:
+                pages.append(page)
+                page = {'grant': [], 'revoke': []}
+            page[key].append(item)
+    pages.append(page)
+    return pages
+
+
+def _failed_to_connect(error: requests.ConnectionError) -> bool:
+    """Returns whether the request failed before a connection was made, so it wasn't sent."""
+
+    from urllib3.exceptions import NewConnectionError
+
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, 'reason', reason)
+    return isinstance(reason, NewConnectionError)
@@ -0,0 +1,169 @@
+"""Periodic refresh of repository size and activity statistics.
+
+The statistics are fetched from the SVNman API by the 'svn refresh_stats'
+command, and stored in the project as extension_props.svnman.stats:
+
+    {'size': bytes, 'revision': int, 'last_commit': timestamp or None,
+     'refreshed': timestamp, 'next_refresh': timestamp}
+
+so that pages can show them without talking to the SVNman API. Recently
+active repositories are refreshed more often than idle ones.
+
+The times are stored as UNIX timestamps rather than datetimes, because
+editing a project through pillarsdk stores its datetimes back as strings.
+Use for_display() to get datetimes.
+"""
+
+import datetime
+import logging
+import random
+import typing
+
+import attr
+
+log = logging.getLogger(__name__)
+
+
+@attr.s
+class RefreshIntervals:
+    """Number of seconds between refreshes, depending on the last commit."""
+
+    active: float = attr.ib(default=300)
+    """For repositories with a commit in the last day."""
+    normal: float = attr.ib(default=3600)
+    """For repositories with a commit in the last 30 days."""
+    idle: float = attr.ib(default=86400)
+    """For all other repositories, including empty ones."""
+
+    @classmethod
+    def from_config(cls, config: typing.Mapping[str, typing.Any]) -> 'RefreshIntervals':
+        return cls(active=config['SVNMAN_STATS_REFRESH_ACTIVE'],
+                   normal=config['SVNMAN_STATS_REFRESH_NORMAL'],
+                   idle=config['SVNMAN_STATS_REFRESH_IDLE'])
+
+    def next_refresh(self, last_commit: typing.Optional[datetime.datetime],
+                     now: datetime.datetime) -> datetime.datetime:
+        if last_commit is None:
+            interval = self.idle
+        elif now - last_commit < datetime.timedelta(days=1):
+            interval = self.active
+        elif now - last_commit < datetime.timedelta(days=30):
+            interval = self.normal
+        else:
+            interval = self.idle
+
+        # Spread the refreshes, so that repositories created in bulk
+        # don't all become due at the same time.
+        interval *= random.uniform(0.9, 1.1)
+        return now + datetime.timedelta(seconds=interval)
+
+
+@attr.s
+class RefreshReport:
+    refreshed: int = attr.ib(default=0)
+    failed: typing.List[typing.Tuple[str, str]] = attr.ib(default=attr.Factory(list))
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(tz=datetime.timezone.utc)
+
+
+def for_display(stats: dict) -> dict:
+    """Returns a copy of the stored statistics, with the times as datetimes."""
+
+    stats = dict(stats)
+    for key in ('last_commit', 'refreshed', 'next_refresh'):
+        if isinstance(stats.get(key), (int, float)):
+            stats[key] = datetime.datetime.fromtimestamp(stats[key], tz=datetime.timezone.utc)
+    return stats
+
+
+def ensure_indices(db, extension_name: str):
+    db['projects'].create_index([(f'extension_props.{extension_name}.stats.next_refresh', 1)],
+                                name='svnman_stats_next_refresh',
+                                sparse=True, background=True)
+
+
+def due_repositories(db, extension_name: str, *, now: datetime.datetime,
+                     limit: int = 500) -> typing.List[dict]:
+    """Returns up to 'limit' projects whose repository statistics should be refreshed.
+
+    Repositories that never had their statistics fetched come first,
+    followed by the ones that have been due the longest. Repositories whose
+    next refresh isn't a timestamp, for example because an older version
+    stored it as datetime, are treated as never fetched.
+    """
+
+    prefix = f'extension_props.{extension_name}'
+    live = {'_deleted': {'$ne': True}, f'{prefix}.repo_id': {'$exists': True, '$nin': [None, '']}}
+    projection = {f'{prefix}.repo_id': 1}
+    proj_coll = db['projects']
+
+    never_fetched = {f'{prefix}.stats.next_refresh': {'$not': {'$type': 'number'}}}
+    due = list(proj_coll.find(dict(live, **never_fetched), projection=projection, limit=limit))
+    if len(due) < limit:
+        overdue = {f'{prefix}.stats.next_refresh': {'$lte': now.timestamp()}}
+        due.extend(proj_coll.find(dict(live, **overdue), projection=projection)
+                   .sort(f'{prefix}.stats.next_refresh', 1)
+                   .limit(limit - len(due)))
+    return due
+
+
+def refresh(db, remote, extension_name: str, *,
+            intervals: RefreshIntervals = None,
+            workers: int = 4,
+            limit: int = 500,
+            now: datetime.datetime = None) -> RefreshReport:
+    """Refreshes the statistics of one batch of due repositories.
+
+    :param db: the MongoDB database.
+    :param remote: the svnman.remote.API to fetch the statistics from.
+    """
+
+    import pymongo
+    from pillar.api.utils import random_etag, utcnow
+    from . import bulk
+
+    intervals = intervals or RefreshIntervals()
+    now = now or _utcnow()
+    prefix = f'extension_props.{extension_name}'
+
+    projects = due_repositories(db, extension_name, now=now, limit=limit)
+    report = RefreshReport()
+    if not projects:
+        return report
+
+    def fetch(proj: dict):
+        return remote.fetch_stats(proj['extension_props'][extension_name]['repo_id'])
+
+    updates = []
+    for proj, repo_stats, error in bulk.run_concurrently(fetch, projects, workers=workers):
+        repo_id = proj['extension_props'][extension_name]['repo_id']
+        if error is not None:
+            log.warning('Unable to fetch statistics of repository %s: %s', repo_id, error)
+            report.failed.append((repo_id, str(error)))
+            # Don't retry a failing repository on every run.
+            next_refresh = intervals.next_refresh(None, now)
+            stats_update = {f'{prefix}.stats.next_refresh': next_refresh.timestamp()}
+        else:
+            last_commit = None
+            if repo_stats.last_commit is not None:
+                last_commit = datetime.datetime.fromtimestamp(repo_stats.last_commit,
+                                                              tz=datetime.timezone.utc)
+            stats_update = {f'{prefix}.stats': {
+                'size': repo_stats.size,
+                'revision': repo_stats.revision,
+                'last_commit': repo_stats.last_commit,
+                'refreshed': now.timestamp(),
+                'next_refresh': intervals.next_refresh(last_commit, now).timestamp(),
+            }}
+            report.refreshed += 1
+
+        # Only store the statistics when the project still has the same repository.
+        # A new _etag keeps stale pillarsdk copies of the project from overwriting them.
+        stats_update.update({'_etag': random_etag(), '_updated': utcnow()})
+        updates.append(pymongo.UpdateOne({'_id': proj['_id'], f'{prefix}.repo_id': repo_id},
+                                         {'$set': stats_update}))
+
+    db['projects'].bulk_write(updates, ordered=False)
+    return report
@@ -1,7 +1,7 @@
 import functools
 import logging
 
-from flask import Blueprint, render_template, jsonify, request
+from flask import Blueprint, render_template, jsonify, request, make_response
 import werkzeug.exceptions as wz_exceptions
 
 from pillar.api.utils.authorization import require_login
@@ -17,16 +17,21 @@ blueprint = Blueprint('svnman', __name__)
 log = logging.getLogger(__name__)
 
 
-def require_project_put(projections: dict = None):
-    """Endpoint decorator, translates project_url into an actual project and checks PUT access."""
+def require_project_put(projections: dict = None, *, cached: bool = False):
+    """Endpoint decorator, translates project_url into an actual project and checks PUT access.
+
+    :param cached: use a project resolved by an earlier request of the same
+        user, if it's at most SVNMAN_PROJECT_CACHE_TTL seconds old. The cached
+        project is shared between requests, so endpoints must not change it,
+        and must not rely on its svnman users: access changes don't invalidate
+        it. Its permissions may be stale in other processes for at most the TTL.
+    """
 
     if callable(projections):
         raise TypeError('Use with @require_project_put() <-- note the parentheses')
 
     def decorator(wrapped):
-        @functools.wraps(wrapped)
-        @project_view()
-        def wrapper(project: pillarsdk.Project, *args, **kwargs):
+        def check_put(project: pillarsdk.Project, *args, **kwargs):
             if 'PUT' not in project.allowed_methods:
                 log.warning('User %s has no PUT access to project %s (id=%s) but wants to '
                             'manage a Subversion repository; denying access to %s',
@@ -35,18 +40,90 @@ def require_project_put(projections: dict = None):
 
             return wrapped(project, *args, **kwargs)
 
+        @project_view()
+        def resolve(project: pillarsdk.Project, *args, **kwargs):
+            if cached:
+                current_svnman.project_cache.set(_project_cache_key(project.url), project)
+            return check_put(project, *args, **kwargs)
+
+        @functools.wraps(wrapped)
+        def wrapper(*args, **kwargs):
+            if not cached:
+                return resolve(*args, **kwargs)
+
+            project_url = kwargs.get('project_url')
+            project = current_svnman.project_cache.get(_project_cache_key(project_url))
+            if project is None:
+                return resolve(*args, **kwargs)
+
+            del kwargs['project_url']
+            return check_put(project, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _project_cache_key(project_url: str) -> tuple:
+    """Key of the project in SVNManExtension.project_cache.
+
+    The project includes the allowed methods of the current user, so the
+    key includes the user as well.
+    """
+    return 'project', project_url, str(current_user.user_id)
+
+
+def rate_limited(action: str):
+    """Endpoint decorator, applies the per-user and per-project rate limits of the action.
+
+    Must be applied below @require_project_put(), as it needs the project.
+    """
+
+    def decorator(wrapped):
+        @functools.wraps(wrapped)
+        def wrapper(project: pillarsdk.Project, *args, **kwargs):
+            limiter = current_svnman.rate_limiter
+            if limiter is None:
+                return wrapped(project, *args, **kwargs)
+
+            retry_after = limiter.check(action, [f'user:{current_user.user_id}',
+                                                 f'project:{project["_id"]}'])
+            if retry_after:
+                log.warning('User %s exceeded the %s rate limit on project %s (id=%s), '
+                            'denying access to %s', current_user.user_id, action,
+                            project.url, project['_id'], request.url)
+                return error_rate_limited(retry_after)
+
+            return wrapped(project, *args, **kwargs)
+
         return wrapper
 
     return decorator
 
 
 def wrap_svnman_exceptions(wrapped):
+    """Endpoint decorator, runs the endpoint within the request budget and handles errors."""
+
     @functools.wraps(wrapped)
     def decorator(*args, **kwargs):
-        from . import exceptions
+        from . import deadlines, exceptions, profiling, tracing
 
         try:
-            return wrapped(*args, **kwargs)
+            with profiling.profiled(wrapped.__name__), \
+                    tracing.span('route', endpoint=request.endpoint), \
+                    deadlines.budget(deadlines.request_budget()):
+                return wrapped(*args, **kwargs)
+        except exceptions.DeadlineExceeded as ex:
+            log.warning('%s(%s, %s): request budget exceeded: %s', wrapped, args, kwargs, ex)
+            resp = jsonify(_message='the Subversion server did not respond in time')
+            resp.status_code = 504
+            return resp
+        except exceptions.BackendOverloaded as ex:
+            log.warning('%s(%s, %s): SVNman API overloaded: %s', wrapped, args, kwargs, ex)
+            resp = jsonify(_message='the Subversion server is busy, please try again later')
+            resp.status_code = 503
+            resp.headers['Retry-After'] = '5'
+            return resp
         except (OSError, IOError):
             log.exception('%s(%s, %s): unable to reach SVNman API', wrapped, args, kwargs)
             resp = jsonify(_message='unable to reach SVNman API server')
@@ -63,17 +140,51 @@ def wrap_svnman_exceptions(wrapped):
 
 @blueprint.route('/')
 def index():
-    api = pillar_api()
+    from markupsafe import Markup
 
     # FIXME Sybren: add permission check.
+    # The project list is filtered by the user's permissions, so cache it per user.
+    cache_key = ('dashboard', str(current_user.user_id), current_svnman.dashboard_version())
+    projects_html = current_svnman.fragment_cache.get_or_compute(cache_key,
+                                                                 _render_dashboard_projects)
+
+    return render_template('svnman/index.html',
+                           projects_html=Markup(projects_html))
+
+
+def _render_dashboard_projects() -> str:
+    """Renders the list of projects on the dashboard."""
+
+    api = pillar_api()
+
     # TODO: add projections.
     projects = current_svnman.svnman_projects()
 
     for project in projects['_items']:
         attach_project_pictures(project, api)
 
-    return render_template('svnman/index.html',
-                           projects=projects)
+    repo_stats = current_svnman.repo_stats(project['_id'] for project in projects['_items'])
+    return render_template('svnman/dashboard_projects.html',
+                           projects=projects, repo_stats=repo_stats)
+
+
+@blueprint.route('/api/health')
+def health():
+    """Reports whether the SVNman API is reachable, for load balancers and monitoring."""
+
+    info = current_svnman.health()
+    resp = jsonify(info)
+    resp.status_code = 200 if info['healthy'] else 503
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+
+@blueprint.route('/api/stats')
+@require_login(require_roles={'admin'})
+def usage_stats():
+    """Returns usage statistics of all Subversion repositories as JSON."""
+
+    return jsonify(current_svnman.usage_stats())
 
 
 def project_settings(project: pillarsdk.Project, **template_args: dict):
@@ -98,9 +209,69 @@ def error_service_not_available():
     return render_template('svnman/errors/service_not_available.html')
 
 
+def error_rate_limited(retry_after: float):
+    import math
+
+    retry_after = int(math.ceil(min(retry_after, 86400)))
+    if request.is_xhr:
+        resp = jsonify({'_message': f'Too many requests, please try again in {retry_after} '
+                                    f'seconds'})
+    else:
+        resp = make_response(render_template('svnman/errors/rate_limited.html',
+                                              retry_after=retry_after))
+    resp.status_code = 429
+    resp.headers['Retry-After'] = str(retry_after)
+    return resp
+
+
+@blueprint.route('/<project_url>/access-list/<repo_id>')
+@require_login(require_cap='svn-use', error_view=error_service_not_available)
+@require_project_put(cached=True)
+def access_list(project: pillarsdk.Project, repo_id: str):
+    """Returns one page of the users with access to the repository, as JSON.
+
+    Query parameters: 'after' (last username of the previous page), 'limit'
+    and 'q' (only return users whose username contains this text).
+    """
+
+    from pillar.api.utils import str2id
+
+    if not current_svnman.is_svnman_project(project) or \
+            project.extension_props.svnman.repo_id != repo_id:
+        raise wz_exceptions.NotFound()
+
+    try:
+        limit = int(request.args.get('limit', 50))
+    except ValueError:
+        raise wz_exceptions.BadRequest('limit should be an integer')
+    limit = max(1, min(limit, 500))
+
+    users, next_after = current_svnman.access_list(
+        str2id(project['_id']),
+        after=request.args.get('after', ''),
+        limit=limit,
+        search=request.args.get('q', '').strip(),
+    )
+    for info in users:
+        info['is_self'] = info['user_id'] == str(current_user.user_id)
+
+    return jsonify(_items=users, next_after=next_after)
+
+
+@blueprint.route('/<project_url>/user-search')
+@require_login(require_cap='svn-use', error_view=error_service_not_available)
+@require_project_put(cached=True)
+def user_search(project: pillarsdk.Project):
+    """Returns users that can be granted access, matching the 'q' query parameter."""
+
+    users = current_svnman.search_svn_users(request.args.get('q', ''))
+    return jsonify(_items=users)
+
+
 @blueprint.route('/<project_url>/create-repo', methods=['POST'])
 @require_login(require_cap='svn-use', error_view=error_service_not_available)
 @require_project_put()
+@rate_limited('create-repo')
 @wrap_svnman_exceptions
 def create_repo(project: pillarsdk.Project):
     log.info('going to create repository for project url=%r on behalf of user %s (%s)',
@@ -127,7 +298,8 @@ def delete_repo(project: pillarsdk.Project, repo_id: str):
 
 @blueprint.route('/<project_url>/grant-access/<repo_id>', methods=['POST'])
 @require_login(require_cap='svn-use', error_view=error_service_not_available)
-@require_project_put()
+@require_project_put(cached=True)
+@rate_limited('grant-access')
 @wrap_svnman_exceptions
 def grant_access(project: pillarsdk.Project, repo_id: str):
     user_id = request.form['user_id']
@@ -143,7 +315,8 @@ def grant_access(project: pillarsdk.Project, repo_id: str):
 
 @blueprint.route('/<project_url>/revoke-access/<repo_id>', methods=['POST'])
 @require_login(require_cap='svn-use', error_view=error_service_not_available)
-@require_project_put()
+@require_project_put(cached=True)
+@rate_limited('revoke-access')
 @wrap_svnman_exceptions
 def revoke_access(project: pillarsdk.Project, repo_id: str):
     user_id = request.form['user_id']
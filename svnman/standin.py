@@ -0,0 +1,156 @@
+"""In-memory stand-in for the SVNman API server.
+
+Implements enough of the SVNman API to develop against and to replay
+recorded traffic against (see svnman.traffic), without touching real
+repositories. Run it with 'svn standin'.
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+import flask
+
+
+class StandInState:
+    """The repositories known to the stand-in server."""
+
+    def __init__(self, *, autocreate: bool = False):
+        self.autocreate = autocreate
+        self.lock = threading.Lock()
+        # repo_id: {'project_id', 'creator', 'access': {username: password}, 'stats': {...}}
+        self.repos = {}
+        # Sequence number of the last change per repository, including deleted ones.
+        self.changed = {}
+        self.last_change = 0
+
+    def get_repo(self, repo_id: str):
+        repo = self.repos.get(repo_id)
+        if repo is None and self.autocreate:
+            repo = self.repos[repo_id] = {'project_id': '', 'creator': 'stand-in', 'access': {},
+                                          'stats': empty_stats()}
+            self.touch(repo_id)
+        return repo
+
+    def touch(self, repo_id: str):
+        """Registers a change of the repository, for the changes listing."""
+
+        self.last_change += 1
+        self.changed[repo_id] = self.last_change
+
+
+def empty_stats() -> dict:
+    """Statistics of a new repository; the stand-in doesn't host actual commits."""
+
+    return {'size': 4096, 'revision': 0, 'last_commit': None}
+
+
+def create_app(*, autocreate: bool = False, latency: float = 0.0) -> flask.Flask:
+    """Creates the stand-in server application.
+
+    :param autocreate: create unknown repositories on first use, instead of
+        responding with 404 Not Found. Useful when replaying recorded traffic.
+    :param latency: number of seconds to sleep before handling each request.
+    """
+
+    app = flask.Flask(__name__)
+    state = app.config['SVNMAN_STANDIN_STATE'] = StandInState(autocreate=autocreate)
+
+    if latency > 0:
+        @app.before_request
+        def simulate_latency():
+            time.sleep(latency)
+
+    @app.route('/api/', methods=['GET', 'HEAD'])
+    def root():
+        return '', 204
+
+    @app.route('/api/repo', methods=['POST'])
+    def create_repo():
+        info = flask.request.get_json(force=True)
+        repo_id = info.get('repo_id')
+        if not repo_id:
+            return 'repo_id missing', 400
+        with state.lock:
+            if repo_id in state.repos:
+                return 'repository already exists', 409
+            state.repos[repo_id] = {'project_id': info.get('project_id', ''),
+                                    'creator': info.get('creator', ''),
+                                    'access': {},
+                                    'stats': empty_stats()}
+            state.touch(repo_id)
+        return flask.jsonify(repo_id=repo_id), 201
+
+    @app.route('/api/repo/<repo_id>', methods=['GET'])
+    def fetch_repo(repo_id: str):
+        with state.lock:
+            repo = state.get_repo(repo_id)
+            if repo is None:
+                return 'not found', 404
+            description = {'repo_id': repo_id, 'access': sorted(repo['access'])}
+
+        body = json.dumps(description)
+        etag = hashlib.sha1(body.encode()).hexdigest()
+        if flask.request.if_none_match.contains(etag):
+            resp = flask.make_response('', 304)
+        else:
+            resp = flask.make_response(body, 200, {'Content-Type': 'application/json'})
+        resp.set_etag(etag)
+        return resp
+
+    @app.route('/api/repo/<repo_id>/stats', methods=['GET'])
+    def fetch_stats(repo_id: str):
+        with state.lock:
+            repo = state.get_repo(repo_id)
+            if repo is None:
+                return 'not found', 404
+            return flask.jsonify(repo_id=repo_id, **repo['stats'])
+
+    @app.route('/api/repo/<repo_id>/access', methods=['POST'])
+    def modify_access(repo_id: str):
+        changes = flask.request.get_json(force=True)
+        with state.lock:
+            repo = state.get_repo(repo_id)
+            if repo is None:
+                return 'not found', 404
+            for grant in changes.get('grant', []):
+                repo['access'][grant['username']] = grant['password']
+            for username in changes.get('revoke', []):
+                repo['access'].pop(username, None)
+            state.touch(repo_id)
+        return '', 204
+
+    @app.route('/api/repo/<repo_id>', methods=['DELETE'])
+    def delete_repo(repo_id: str):
+        with state.lock:
+            if state.repos.pop(repo_id, None) is None and not state.autocreate:
+                return 'not found', 404
+            state.touch(repo_id)
+        return '', 204
+
+    @app.route('/api/changes', methods=['GET'])
+    def changes():
+        try:
+            since = int(flask.request.args.get('since') or 0)
+            limit = int(flask.request.args.get('limit') or 500)
+        except ValueError:
+            return 'invalid since or limit', 400
+
+        with state.lock:
+            changed = sorted((seq, repo_id) for repo_id, seq in state.changed.items()
+                             if seq > since)
+            page = changed[:limit]
+            listing = []
+            for _, repo_id in page:
+                repo = state.repos.get(repo_id)
+                if repo is None:
+                    listing.append({'repo_id': repo_id, 'deleted': True, 'access': []})
+                else:
+                    listing.append({'repo_id': repo_id, 'deleted': False,
+                                    'access': sorted(repo['access'])})
+
+        cursor = page[-1][0] if page else since
+        return flask.jsonify(changes=listing, cursor=str(cursor), more=len(changed) > limit)
+
+    return app
@@ -0,0 +1,120 @@
+"""Removal of repositories whose project has been deleted.
+
+Deleting a project queues its repository for removal (see
+SVNManExtension.setup_app()). The sweeper, run by the 'svn sweep' command,
+removes queued repositories as well as repositories still linked to
+soft-deleted projects, with a bounded number of concurrent API calls.
+"""
+
+import datetime
+import logging
+import typing
+
+import attr
+
+log = logging.getLogger(__name__)
+
+QUEUE_COLLECTION = 'svnman_repo_deletions'
+
+
+@attr.s
+class Orphan:
+    repo_id: str = attr.ib()
+    project_id: typing.Any = attr.ib()
+    reason: str = attr.ib()
+
+
+@attr.s
+class SweepReport:
+    deleted: typing.List[Orphan] = attr.ib(default=attr.Factory(list))
+    failed: typing.List[typing.Tuple[Orphan, str]] = attr.ib(default=attr.Factory(list))
+    dry_run: bool = attr.ib(default=False)
+
+
+def queue_repo_deletion(db, repo_id: str, project_id, reason: str):
+    """Queues the repository for removal by the sweeper."""
+
+    log.info('Queueing repository %s of project %s for deletion: %s',
+             repo_id, project_id, reason)
+    db[QUEUE_COLLECTION].update_one(
+        {'_id': repo_id},
+        {'$set': {'project_id': project_id, 'reason': reason},
+         '$setOnInsert': {'queued': datetime.datetime.now(tz=datetime.timezone.utc)}},
+        upsert=True)
+
+
+def find_orphans(db, extension_name: str, *, limit: int = 500) -> typing.List[Orphan]:
+    """Returns up to 'limit' repositories that should be removed."""
+
+    proj_coll = db['projects']
+    repo_field = f'extension_props.{extension_name}.repo_id'
+    orphans = {}
+
+    for queued in db[QUEUE_COLLECTION].find().sort('queued', 1).limit(limit):
+        repo_id = queued['_id']
+        # Don't remove repositories that are (again) linked to a live project.
+        if proj_coll.find_one({repo_field: repo_id, '_deleted': {'$ne': True}},
+                              projection={'_id': 1}):
+            log.warning('Repository %s is queued for deletion but linked to a live project, '
+                        'removing it from the queue', repo_id)
+            db[QUEUE_COLLECTION].delete_one({'_id': repo_id})
+            continue
+        orphans[repo_id] = Orphan(repo_id, queued.get('project_id'),
+                                  queued.get('reason', 'queued'))
+
+    if len(orphans) < limit:
+        deleted_projects = proj_coll.find(
+            {'_deleted': True, repo_field: {'$exists': True, '$nin': [None, '']}},
+            projection={repo_field: 1},
+            limit=limit - len(orphans))
+        for proj in deleted_projects:
+            repo_id = proj['extension_props'][extension_name]['repo_id']
+            orphans.setdefault(repo_id, Orphan(repo_id, proj['_id'], 'project deleted'))
+
+    return list(orphans.values())
+
+
+def sweep(db, remote, extension_name: str, *,
+          dry_run: bool = False, workers: int = 4, limit: int = 500) -> SweepReport:
+    """Removes one batch of orphaned repositories.
+
+    :param db: the MongoDB database.
+    :param remote: the svnman.remote.API to delete repositories with.
+    :param dry_run: only report what would be removed.
+    """
+
+    from . import bulk, exceptions
+
+    orphans = find_orphans(db, extension_name, limit=limit)
+    report = SweepReport(dry_run=dry_run)
+    if dry_run:
+        report.deleted = orphans
+        return report
+
+    def delete(orphan: Orphan):
+        try:
+            remote.delete_repo(orphan.repo_id)
+        except exceptions.RepoNotFound:
+            log.info('Repository %s was already deleted', orphan.repo_id)
+
+    for orphan, _, error in bulk.run_concurrently(delete, orphans, workers=workers):
+        if error is not None:
+            log.error('Unable to delete repository %s of project %s: %s',
+                      orphan.repo_id, orphan.project_id, error)
+            report.failed.append((orphan, str(error)))
+        else:
+            report.deleted.append(orphan)
+
+    if report.deleted:
+        from pillar.api.utils import random_etag, utcnow
+
+        repo_ids = [orphan.repo_id for orphan in report.deleted]
+        prefix = f'extension_props.{extension_name}'
+        db['projects'].update_many({f'{prefix}.repo_id': {'$in': repo_ids}},
+                                   {'$unset': {f'{prefix}.repo_id': True,
+                                               f'{prefix}.users': True,
+                                               f'{prefix}.stats': True},
+                                    '$set': {'_etag': random_etag(), '_updated': utcnow()}})
+        db[QUEUE_COLLECTION].delete_many({'_id': {'$in': repo_ids}})
+
+    return report
@@ -0,0 +1,182 @@
+"""Incremental sync of the access state on the SVNman server to the projects.
+
+Access to repositories can also be changed directly on the SVNman server.
+Instead of fetching every repository, 'svn sync' asks the SVNman API for the
+repositories that changed since the last run (see API.changes_since()), and
+only updates the projects of those repositories. The cursor is kept in
+MongoDB, so every run continues where the previous one stopped.
+
+Users that lost access on the server are removed from the project's 'users'
+dict, and projects whose repository was deleted on the server lose their
+repository ID. Usernames that got access on the server without going through
+Pillar are only reported, as they can't be reliably linked to a Pillar user.
+
+Users that were granted access through Pillar after a page of changes was
+requested may be missing from that page, so they are never revoked by it.
+"""
+
+import datetime
+import logging
+import typing
+
+import attr
+
+log = logging.getLogger(__name__)
+
+STATE_COLLECTION = 'svnman_sync_state'
+STATE_ID = 'access'
+
+# Users granted access this long before a page of changes was requested are
+# skipped as well, to allow for clock differences between the servers and
+# MongoDB storing timestamps with millisecond precision.
+GRANT_MARGIN = datetime.timedelta(seconds=5)
+
+
+@attr.s
+class SyncReport:
+    cursor: str = attr.ib(default='')
+    changes: int = attr.ib(default=0)
+    updated: int = attr.ib(default=0)
+    """Number of revoked users and deleted repositories stored in the projects."""
+    revoked: typing.List[tuple] = attr.ib(default=attr.Factory(list))
+    """(repo_id, project_id, user_id, username) of users that lost access on the server."""
+    unknown: typing.List[typing.Tuple[str, str]] = attr.ib(default=attr.Factory(list))
+    """(repo_id, username) of users that got access on the server only."""
+    deleted: typing.List[tuple] = attr.ib(default=attr.Factory(list))
+    """(repo_id, project_id) of repositories that were deleted on the server."""
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(tz=datetime.timezone.utc)
+
+
+def load_cursor(db) -> str:
+    state = db[STATE_COLLECTION].find_one({'_id': STATE_ID})
+    return state['cursor'] if state else ''
+
+
+def save_cursor(db, cursor: str):
+    db[STATE_COLLECTION].update_one(
+        {'_id': STATE_ID},
+        {'$set': {'cursor': cursor,
+                  'updated': _utcnow()}},
+        upsert=True)
+
+
+def sync(db, remote, extension_name: str, *, page_size: int = 500,
+         max_pages: int = 100) -> SyncReport:
+    """Applies the changes since the stored cursor, and stores the new cursor.
+
+    The cursor is stored after each page of changes, so an interrupted sync
+    doesn't have to start over.
+
+    :param db: the MongoDB database.
+    :param remote: the svnman.remote.API to fetch the changes from.
+    :param max_pages: stop after this many pages, even when there are more changes.
+    """
+
+    from . import exceptions
+
+    report = SyncReport(cursor=load_cursor(db))
+
+    for _ in range(max_pages):
+        requested = _utcnow()
+        try:
+            page = remote.changes_since(report.cursor, limit=page_size)
+        except exceptions.CursorExpired:
+            if not report.cursor:
+                raise
+            log.warning('Sync cursor %r expired, syncing all repositories', report.cursor)
+            report.cursor = ''
+            continue
+
+        _apply_changes(db, extension_name, page.changes, report, requested=requested)
+        report.changes += len(page.changes)
+        report.cursor = page.cursor
+        save_cursor(db, page.cursor)
+
+        if not page.more:
+            break
+
+    return report
+
+
+def _granted_after(user_info: dict, when: datetime.datetime) -> bool:
+    """Returns whether the user was granted access through Pillar after 'when'.
+
+    'granted' is a UNIX timestamp; other values are treated as old grants.
+    """
+
+    granted = user_info.get('granted')
+    if not isinstance(granted, (int, float)):
+        return False
+    return granted >= (when - GRANT_MARGIN).timestamp()
+
+
+def _apply_changes(db, extension_name: str, changes: list, report: SyncReport, *,
+                   requested: datetime.datetime):
+    """Applies a page of changes to the projects.
+
+    :param requested: when the page of changes was requested.
+    """
+
+    import pymongo
+    from pillar.api.utils import random_etag, utcnow
+
+    if not changes:
+        return
+
+    prefix = f'extension_props.{extension_name}'
+    proj_coll = db['projects']
+    by_repo_id = {change.repo_id: change for change in changes}
+    projects = proj_coll.find({f'{prefix}.repo_id': {'$in': list(by_repo_id)}},
+                              projection={f'{prefix}.repo_id': 1, f'{prefix}.users': 1})
+
+    updates = []
+    for proj in projects:
+        eprops = proj['extension_props'][extension_name]
+        repo_id = eprops['repo_id']
+        change = by_repo_id[repo_id]
+        guard = {'_id': proj['_id'], f'{prefix}.repo_id': repo_id}
+
+        if change.deleted:
+            log.warning('Repository %s of project %s was deleted on the SVNman server',
+                        repo_id, proj['_id'])
+            report.deleted.append((repo_id, proj['_id']))
+            updates.append(pymongo.UpdateOne(guard, {
+                '$unset': {f'{prefix}.repo_id': True,
+                           f'{prefix}.users': True,
+                           f'{prefix}.stats': True},
+                '$set': {'_etag': random_etag(), '_updated': utcnow()}}))
+            continue
+
+        users = eprops.get('users') or {}
+        remote_access = set(change.access)
+        revoke_uids = [uid for uid, info in users.items()
+                       if info.get('username') not in remote_access
+                       and not _granted_after(info, requested)]
+        known_usernames = {info.get('username') for info in users.values()}
+
+        for uid in revoke_uids:
+            username = users[uid].get('username')
+            log.info('User %s (%r) lost access to repository %s on the SVNman server',
+                     uid, username, repo_id)
+            report.revoked.append((repo_id, proj['_id'], uid, username))
+            # Leave the user alone when they were granted access again in the meantime;
+            # a new grant has the same username, but a different 'granted' time.
+            granted = users[uid].get('granted')
+            user_guard = {f'{prefix}.users.{uid}.username': username,
+                          f'{prefix}.users.{uid}.granted':
+                              granted if granted is not None else {'$exists': False}}
+            updates.append(pymongo.UpdateOne(
+                dict(guard, **user_guard),
+                {'$unset': {f'{prefix}.users.{uid}': True},
+                 '$set': {'_etag': random_etag(), '_updated': utcnow()}}))
+        for username in sorted(remote_access - known_usernames):
+            log.warning('User %r has access to repository %s on the SVNman server, '
+                        'but not according to project %s', username, repo_id, proj['_id'])
+            report.unknown.append((repo_id, username))
+
+    if updates:
+        res = proj_coll.bulk_write(updates, ordered=False)
+        report.updated += res.modified_count
@@ -0,0 +1,139 @@
+"""Request correlation IDs and timing spans.
+
+Each Flask request gets a request ID, taken from the SVNMAN_REQUEST_ID_HEADER
+request header or generated. The ID is sent along with every call to the
+SVNman API, so that our logs and the SVNman server logs can be correlated.
+
+Timed spans (route, bcrypt, mongo, remote, ...) are collected in a Trace
+stored in `flask.g`, and logged as a single JSON line to the 'svnman.trace'
+logger when the request is torn down.
+"""
+
+import contextlib
+import json
+import logging
+import re
+import threading
+import time
+import typing
+import uuid
+
+import attr
+import flask
+
+_G_KEY = 'svnman_trace'
+_VALID_REQUEST_ID = re.compile(r'^[\w.:-]{1,128}$')
+
+trace_log = logging.getLogger('svnman.trace')
+
+
+@attr.s
+class Span:
+    name: str = attr.ib()
+    duration: float = attr.ib()
+    outcome: str = attr.ib()
+    tags: dict = attr.ib(default=attr.Factory(dict))
+
+    def as_dict(self) -> dict:
+        info = {'name': self.name,
+                'ms': round(self.duration * 1000, 2),
+                'outcome': self.outcome}
+        info.update(self.tags)
+        return info
+
+
+@attr.s
+class Trace:
+    request_id: str = attr.ib()
+    spans: typing.List[Span] = attr.ib(default=attr.Factory(list), repr=False)
+    _lock: threading.Lock = attr.ib(default=attr.Factory(threading.Lock), repr=False, cmp=False)
+
+    def add(self, span: Span):
+        # Spans can be recorded from worker threads, see remote.API.modify_access().
+        with self._lock:
+            self.spans.append(span)
+
+
+def current() -> typing.Optional[Trace]:
+    """Returns the trace of the current request, creating it if necessary.
+
+    Returns None when there is no request context.
+    """
+
+    if not flask.has_request_context():
+        return None
+
+    trace = flask.g.get(_G_KEY)
+    if trace is None:
+        trace = Trace(request_id=_incoming_request_id() or uuid.uuid4().hex)
+        setattr(flask.g, _G_KEY, trace)
+    return trace
+
+
+def request_id() -> str:
+    """Returns the request ID of the current request, or '' if there is none."""
+
+    trace = current()
+    return trace.request_id if trace is not None else ''
+
+
+def _incoming_request_id() -> str:
+    header_name = flask.current_app.config.get('SVNMAN_REQUEST_ID_HEADER')
+    if not header_name:
+        return ''
+
+    incoming = flask.request.headers.get(header_name, '')
+    if not _VALID_REQUEST_ID.match(incoming):
+        return ''
+    return incoming
+
+
+@contextlib.contextmanager
+def span(name: str, trace: Trace = None, **tags):
+    """Context manager, records the duration and outcome of its body.
+
+    The outcome is 'ok', or the class name of the exception that was raised.
+    Yields the tags dict, so that the body can add to it.
+
+    :param trace: the trace to record into; defaults to the trace of the
+        current request. Pass it explicitly when running in another thread.
+    """
+
+    if trace is None:
+        trace = current()
+
+    outcome = 'ok'
+    start = time.perf_counter()
+    try:
+        yield tags
+    except BaseException as ex:
+        outcome = type(ex).__name__
+        raise
+    finally:
+        if trace is not None:
+            trace.add(Span(name, time.perf_counter() - start, outcome, tags))
+
+
+def flush(exc: BaseException = None):
+    """Logs the spans of the current request as one line.
+
+    Called by the teardown_request handler registered in SVNManExtension.setup_app().
+    """
+
+    trace = flask.g.get(_G_KEY)
+    if trace is None or not trace.spans:
+        return
+    setattr(flask.g, _G_KEY, None)
+
+    if not trace_log.isEnabledFor(logging.INFO):
+        return
+
+    line = {
+        'request_id': trace.request_id,
+        'method': flask.request.method,
+        'path': flask.request.path,
+        'spans': [s.as_dict() for s in trace.spans],
+    }
+    if exc is not None:
+        line['error'] = type(exc).__name__
+    trace_log.info('%s', json.dumps(line, sort_keys=True))
@@ -0,0 +1,192 @@
+"""Recording and replaying of SVNman API traffic.
+
+When SVNMAN_TRAFFIC_RECORD_PATH is set, remote.API writes one compact JSON
+line per HTTP request to that file:
+
+    {"ts": 1557480000.123, "m": "POST", "p": "repo/abc/access", "b": 812, "s": 204, "ms": 41.2}
+
+Only the method, the path relative to the API URL (without query string),
+the body size, the response status and the latency are recorded; no
+credentials, usernames or password hashes. Use '{pid}' in the path to
+get one file per process.
+
+The trace can be replayed against a stand-in server (see svnman.standin)
+at a multiple of the original speed with 'svn replay'. As the recorded paths
+contain real repository IDs, replaying requests that change anything has to
+be allowed explicitly.
+"""
+
+import collections
+import json
+import logging
+import os
+import random
+import string
+import threading
+import time
+import typing
+
+import attr
+
+log = logging.getLogger(__name__)
+
+# Methods that can be replayed without allow_writes.
+READ_ONLY_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+
+class TrafficRecorder:
+    """Appends one JSON line per API request to a file."""
+
+    def __init__(self, path: str):
+        self.path = path.format(pid=os.getpid())
+        self._lock = threading.Lock()
+        self._file = open(self.path, 'a', encoding='utf8')
+        log.info('Recording SVNman API traffic to %s', self.path)
+
+    def record(self, method: str, rel_url: str, body_size: int, status: typing.Union[int, str],
+               latency: float):
+        """Records a request.
+
+        :param status: the HTTP status code, or the exception class name
+            when no response was received.
+        """
+
+        line = json.dumps({
+            'ts': round(time.time(), 3),
+            'm': method,
+            'p': rel_url.split('?', 1)[0],
+            'b': body_size,
+            's': status,
+            'ms': round(latency * 1000, 1),
+        }, separators=(',', ':'))
+
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def load_trace(path: str) -> typing.List[dict]:
+    """Loads a recorded trace, sorted by timestamp."""
+
+    with open(path, encoding='utf8') as infile:
+        entries = [json.loads(line) for line in infile if line.strip()]
+    entries.sort(key=lambda entry: entry['ts'])
+    return entries
+
+
+def _path_pattern(rel_url: str) -> str:
+    """Replaces the repository ID in the path, to group similar requests."""
+
+    parts = rel_url.split('/')
+    if len(parts) > 1 and parts[0] == 'repo':
+        parts[1] = '<repo_id>'
+    return '/'.join(parts)
+
+
+def _synthetic_body(entry: dict) -> typing.Optional[dict]:
+    """Returns a JSON body of about the recorded size, without real data."""
+
+    size = entry.get('b') or 0
+    if entry['m'] != 'POST' or not size:
+        return None
+
+    parts = entry['p'].split('/')
+    if parts == ['repo']:
+        return {'repo_id': _random_name(24), 'project_id': 24 * '0',
+                'creator': 'replay'.ljust(max(6, size - 80), '.')}
+    if len(parts) == 3 and parts[2] == 'access':
+        # Revokes of non-existent users, of roughly the recorded total size.
+        return {'grant': [], 'revoke': [_random_name(14) for _ in range(max(1, size // 18))]}
+    return {'padding': 'x' * size}
+
+
+def _random_name(length: int) -> str:
+    return ''.join(random.choice(string.ascii_lowercase) for _ in range(length))
+
+
+@attr.s
+class ReplaySummary:
+    requests: int = attr.ib(default=0)
+    errors: int = attr.ib(default=0)
+    duration: float = attr.ib(default=0.0)
+    latencies: typing.Dict[str, typing.List[float]] = attr.ib(
+        default=attr.Factory(lambda: collections.defaultdict(list)))
+    statuses: typing.Counter = attr.ib(default=attr.Factory(collections.Counter))
+
+    def as_text(self) -> str:
+        rate = self.requests / self.duration if self.duration else 0.0
+        lines = [f'{self.requests} requests in {self.duration:.1f} seconds '
+                 f'({rate:.1f} req/sec), {self.errors} errors',
+                 'Statuses: ' + ', '.join(f'{status}: {count}'
+                                          for status, count in sorted(self.statuses.items(),
+                                                                      key=str))]
+        for pattern, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            p50 = latencies[len(latencies) // 2] * 1000
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000
+            lines.append(f'{pattern:30} n={len(latencies):<6} p50={p50:8.1f} ms '
+                         f'p95={p95:8.1f} ms')
+        return '\n'.join(lines)
+
+
+def replay(entries: typing.List[dict], api, *, speed: float = 1.0,
+           workers: int = 16, allow_writes: bool = False) -> ReplaySummary:
+    """Replays the recorded requests with the original relative timing.
+
+    :param api: the svnman.remote.API to send the requests with.
+    :param speed: 1.0 replays at the recorded speed, 10.0 ten times faster.
+    :param workers: maximum number of requests in flight.
+    :param allow_writes: also replay requests that create, change or delete
+        repositories. Only use this against a stand-in server, as the
+        requests use the recorded repository IDs.
+    :raises ValueError: when the trace contains such requests and
+        allow_writes is False. Nothing is sent then.
+    """
+
+    from concurrent import futures
+
+    if not allow_writes:
+        writes = collections.Counter(entry['m'] for entry in entries
+                                     if entry['m'] not in READ_ONLY_METHODS)
+        if writes:
+            raise ValueError('trace contains requests that change repositories (%s); '
+                             'allow writes to replay them'
+                             % ', '.join(f'{count} {method}' for method, count
+                                         in sorted(writes.items())))
+
+    summary = ReplaySummary()
+    lock = threading.Lock()
+    if not entries:
+        return summary
+
+    def send(entry: dict):
+        body = _synthetic_body(entry)
+        start = time.monotonic()
+        try:
+            resp = api._request(entry['m'], entry['p'], json=body)
+        except Exception as ex:
+            status, error = type(ex).__name__, True
+        else:
+            status, error = resp.status_code, resp.status_code >= 500
+        latency = time.monotonic() - start
+
+        with lock:
+            summary.requests += 1
+            summary.errors += error
+            summary.statuses[status] += 1
+            summary.latencies[f"{entry['m']} {_path_pattern(entry['p'])}"].append(latency)
+
+    first_ts = entries[0]['ts']
+    start = time.monotonic()
+    with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for entry in entries:
+            delay = (entry['ts'] - first_ts) / speed - (time.monotonic() - start)
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, entry)
+    summary.duration = time.monotonic() - start
+    return summary
@@ -1,4 +1,5 @@
 import json
+from unittest import mock
 
 import requests
 import responses
@@ -56,6 +57,40 @@ class TestAPI(AbstractSVNManTest):
         )
         self.assertEqual(expect, resp)
 
+    @responses.activate
+    def test_fetch_stats(self):
+        from svnman.remote import RepoStats
+        responses.add(responses.GET,
+                      'http://svnman_api_url/api/repo/repo-id/stats',
+                      json={'repo_id': 'repo-id', 'size': 123456, 'revision': 47,
+                            'last_commit': 1557500000.0},
+                      status=200)
+
+        self.assertEqual(RepoStats(repo_id='repo-id', size=123456, revision=47,
+                                   last_commit=1557500000.0),
+                         self.remote.fetch_stats('repo-id'))
+
+    @responses.activate
+    def test_changes_since(self):
+        from svnman.remote import ChangesPage, RepoChange
+        from svnman.exceptions import CursorExpired
+
+        responses.add(responses.GET, 'http://svnman_api_url/api/changes?since=41&limit=2',
+                      match_querystring=True,
+                      json={'changes': [{'repo_id': 'repo-1', 'deleted': False,
+                                         'access': ['harry']},
+                                        {'repo_id': 'repo-2', 'deleted': True, 'access': []}],
+                            'cursor': '47', 'more': True})
+        responses.add(responses.GET, 'http://svnman_api_url/api/changes?since=3&limit=2',
+                      match_querystring=True, status=410)
+
+        self.assertEqual(ChangesPage(changes=[RepoChange('repo-1', False, ['harry']),
+                                              RepoChange('repo-2', True, [])],
+                                     cursor='47', more=True),
+                         self.remote.changes_since('41', limit=2))
+        with self.assertRaises(CursorExpired):
+            self.remote.changes_since('3', limit=2)
+
     @responses.activate
     def test_fetch_repo_internal_server_error(self):
         from svnman.exceptions import InternalAPIServerError
@@ -105,3 +140,259 @@ class TestAPI(AbstractSVNManTest):
         self.remote.modify_access('repo-id',
                                   grant=[('username', '$2a$1234'), ('username2', '$2y$5555')],
                                   revoke=['someone-else'])
+
+    @responses.activate
+    def test_fetch_repo_not_modified(self):
+        from svnman.remote import RepoDescription
+
+        def request_callback(request):
+            if request.headers.get('If-None-Match') == '"etag-1"':
+                return 304, {}, ''
+            body = json.dumps({'repo_id': 'repo-id', 'access': ['someuser']})
+            return 200, {'ETag': '"etag-1"', 'Content-Type': 'application/json'}, body
+
+        responses.add_callback(responses.GET, 'http://svnman_api_url/api/repo/repo-id',
+                               callback=request_callback)
+
+        expect = RepoDescription(repo_id='repo-id', access=['someuser'])
+        description = self.remote.fetch_repo('repo-id')
+        self.assertEqual(expect, description)
+        # Changing the returned description shouldn't change the cached one.
+        description.access.append('intruder')
+        description = self.remote.fetch_repo('repo-id')
+        self.assertEqual(expect, description)
+        description.access.append('intruder')
+        self.assertEqual(expect, self.remote.fetch_repo('repo-id'))
+
+        self.assertEqual(3, len(responses.calls))
+        self.assertNotIn('If-None-Match', responses.calls[0].request.headers)
+        self.assertEqual('"etag-1"', responses.calls[1].request.headers['If-None-Match'])
+
+    @responses.activate
+    def test_fetch_repo_without_validators(self):
+        responses.add(responses.GET, 'http://svnman_api_url/api/repo/repo-id',
+                      json={'repo_id': 'repo-id', 'access': []})
+
+        self.remote.fetch_repo('repo-id')
+        self.remote.fetch_repo('repo-id')
+
+        self.assertNotIn('If-None-Match', responses.calls[1].request.headers)
+        self.assertNotIn('If-Modified-Since', responses.calls[1].request.headers)
+
+    @responses.activate
+    def test_modify_access_paged(self):
+        payloads = []
+
+        def request_callback(request):
+            payloads.append(json.loads(request.body))
+            return 204, {}, ''
+
+        responses.add_callback(responses.POST, 'http://svnman_api_url/api/repo/repo-id/access',
+                               callback=request_callback)
+
+        progress = []
+        self.remote.modify_access('repo-id',
+                                  grant=[(f'user{i}', '$2a$1234') for i in range(3)],
+                                  revoke=['gone1', 'gone2'],
+                                  page_size=2,
+                                  progress=lambda done, total: progress.append((done, total)))
+
+        self.assertEqual([
+            {'grant': [{'username': 'user0', 'password': '$2y$1234'},
+                       {'username': 'user1', 'password': '$2y$1234'}],
+             'revoke': []},
+            {'grant': [{'username': 'user2', 'password': '$2y$1234'}],
+             'revoke': ['gone1']},
+            {'grant': [], 'revoke': ['gone2']},
+        ], payloads)
+        self.assertEqual([(2, 5), (4, 5), (5, 5)], progress)
+
+    @responses.activate
+    def test_modify_access_parallel(self):
+        responses.add(responses.POST, 'http://svnman_api_url/api/repo/repo-id/access',
+                      status=204)
+
+        progress = []
+        self.remote.modify_access('repo-id',
+                                  grant=[],
+                                  revoke=[f'user{i}' for i in range(10)],
+                                  page_size=3,
+                                  workers=4,
+                                  progress=lambda done, total: progress.append(done))
+
+        self.assertEqual(4, len(responses.calls))
+        self.assertEqual(10, max(progress))
+
+    @responses.activate
+    def test_modify_access_parallel_error(self):
+        from svnman.exceptions import InternalAPIServerError
+
+        responses.add(responses.POST, 'http://svnman_api_url/api/repo/repo-id/access',
+                      status=500)
+
+        with self.assertRaises(InternalAPIServerError):
+            self.remote.modify_access('repo-id', grant=[],
+                                      revoke=[f'user{i}' for i in range(10)],
+                                      page_size=3, workers=4)
+
+    @responses.activate
+    def test_retry_connection_error(self):
+        responses.add(responses.GET, 'http://svnman_api_url/api/repo/repo-id',
+                      body=requests.ConnectionError('connection reset by peer'))
+        responses.add(responses.GET, 'http://svnman_api_url/api/repo/repo-id',
+                      json={'repo_id': 'repo-id', 'access': []})
+
+        self.remote.fetch_repo('repo-id')
+        self.assertEqual(2, len(responses.calls))
+
+    @responses.activate
+    def test_no_delete_retry_after_sending(self):
+        responses.add(responses.DELETE, 'http://svnman_api_url/api/repo/repo-id',
+                      body=requests.ConnectionError('connection reset by peer'))
+
+        with self.assertRaises(requests.ConnectionError):
+            self.remote.delete_repo('repo-id')
+        self.assertEqual(1, len(responses.calls))
+
+    @responses.activate
+    def test_no_retry_after_sending(self):
+        from svnman.remote import CreateRepo
+
+        responses.add(responses.POST, 'http://svnman_api_url/api/repo',
+                      body=requests.ConnectionError('connection reset by peer'))
+
+        cr = CreateRepo(repo_id='UPPERCASE', project_id='someproject', creator='me <here@there>')
+        with self.assertRaises(requests.ConnectionError):
+            self.remote.create_repo(cr)
+        # The server may have created the repository, so it shouldn't be created again.
+        self.assertEqual(1, len(responses.calls))
+
+    @responses.activate
+    def test_retry_connect_error(self):
+        from urllib3.exceptions import MaxRetryError, NewConnectionError
+        from svnman.remote import CreateRepo
+
+        refused = NewConnectionError(None, 'connection refused')
+        responses.add(responses.POST, 'http://svnman_api_url/api/repo',
+                      body=requests.ConnectionError(
+                          MaxRetryError(None, 'http://svnman_api_url/api/repo', refused)))
+        responses.add(responses.POST, 'http://svnman_api_url/api/repo',
+                      json={'repo_id': 'repo-id'}, status=requests.codes.created)
+
+        cr = CreateRepo(repo_id='UPPERCASE', project_id='someproject', creator='me <here@there>')
+        self.assertEqual('repo-id', self.remote.create_repo(cr))
+        self.assertEqual(2, len(responses.calls))
+
+    @responses.activate
+    def test_deadline_exceeded(self):
+        import time
+        from svnman import deadlines
+        from svnman.exceptions import DeadlineExceeded
+
+        responses.add(responses.DELETE, 'http://svnman_api_url/api/repo/repo-id',
+                      body=requests.ConnectionError('connection refused'))
+
+        with self.app.test_request_context():
+            with deadlines.budget(0.05):
+                time.sleep(0.06)
+                with self.assertRaises(DeadlineExceeded):
+                    self.remote.delete_repo('repo-id')
+
+        self.assertEqual(0, len(responses.calls))
+
+    def test_deadline_budget_header(self):
+        from svnman import deadlines
+
+        self.app.config['SVNMAN_REQUEST_BUDGET'] = 10.0
+        with self.app.test_request_context(headers={'X-Request-Budget': '2.5'}):
+            self.assertEqual(2.5, deadlines.request_budget())
+        with self.app.test_request_context(headers={'X-Request-Budget': '600'}):
+            self.assertEqual(10.0, deadlines.request_budget())
+        with self.app.test_request_context(headers={'X-Request-Budget': 'soon'}):
+            self.assertEqual(10.0, deadlines.request_budget())
+
+        with self.app.test_request_context():
+            with deadlines.budget(1.0) as outer:
+                with deadlines.budget(100.0) as inner:
+                    self.assertIs(outer, inner)
+            self.assertIsNone(deadlines.current())
+
+    @responses.activate
+    def test_request_id_and_spans(self):
+        from svnman import tracing
+
+        responses.add(responses.DELETE, 'http://svnman_api_url/api/repo/repo-id',
+                      status=requests.codes.no_content)
+
+        with self.app.test_request_context(headers={'X-Request-Id': 'incoming-id'}):
+            self.remote.delete_repo('repo-id')
+
+            trace = tracing.current()
+            self.assertEqual('incoming-id', trace.request_id)
+            self.assertEqual(['remote'], [span.name for span in trace.spans])
+            self.assertEqual(204, trace.spans[0].tags['status'])
+
+            with self.assertLogs('svnman.trace', level='INFO') as logs:
+                tracing.flush()
+            line = json.loads(logs.records[0].getMessage())
+            self.assertEqual('incoming-id', line['request_id'])
+            self.assertEqual('DELETE', line['spans'][0]['method'])
+
+        self.assertEqual('incoming-id', responses.calls[0].request.headers['X-Request-Id'])
+
+        # Invalid incoming request IDs are replaced by a generated one.
+        with self.app.test_request_context(headers={'X-Request-Id': 'bad id!'}):
+            self.assertRegex(tracing.request_id(), '^[0-9a-f]{32}$')
+
+    @responses.activate
+    def test_probe_and_latency(self):
+        responses.add(responses.HEAD, 'http://svnman_api_url/api/', status=200)
+        responses.add(responses.DELETE, 'http://svnman_api_url/api/repo/repo-id',
+                      status=requests.codes.no_content)
+
+        self.assertEqual({'count': 0}, self.remote.latency_summary())
+        self.assertEqual(3, self.remote.warm_up(3))
+        self.assertEqual(3, len(responses.calls))
+        # Any connections beyond the size of the pool would be discarded.
+        self.assertEqual(10, self.remote.warm_up(25))
+
+        self.remote.delete_repo('repo-id')
+        summary = self.remote.latency_summary()
+        self.assertEqual(1, summary['count'])
+        self.assertLessEqual(summary['p50_ms'], summary['max_ms'])
+
+    @mock.patch('svnman.threading.Thread')
+    def test_warm_up_once_per_process(self, mock_thread):
+        self.app.config['SVNMAN_WARMUP_CONNECTIONS'] = 3
+
+        # setUp() already used the API in this process.
+        self.assertIs(self.remote, self.svnman.remote)
+        mock_thread.assert_not_called()
+
+        # Pretend this is a freshly forked worker process.
+        self.svnman._warmed_up_pid = -1
+        self.assertIs(self.remote, self.svnman.remote)
+        self.assertIs(self.remote, self.svnman.remote)
+        mock_thread.assert_called_once_with(target=self.remote.warm_up, args=(3,),
+                                            name='svnman-warmup', daemon=True)
+
+    @responses.activate
+    def test_health_cached(self):
+        responses.add(responses.HEAD, 'http://svnman_api_url/api/', status=500)
+
+        info = self.svnman.health()
+        self.assertTrue(info['reachable'])
+        self.assertFalse(info['healthy'])
+        self.assertEqual(500, info['status'])
+
+        self.svnman.health()
+        self.assertEqual(1, len(responses.calls))
+
+    @responses.activate
+    def test_health_unreachable(self):
+        responses.add(responses.HEAD, 'http://svnman_api_url/api/',
+                      body=requests.ConnectionError('svnman-internal.example:8080 refused'))
+
+        info = self.svnman.health()
+        self.assertFalse(info['reachable'])
+        self.assertEqual('unreachable', info['error'])
@@ -0,0 +1,124 @@
+import datetime
+import threading
+import unittest
+from unittest import mock
+
+
+class FakeCollection:
+    def __init__(self, fail_times=0):
+        self.batches = []
+        self.fail_times = fail_times
+        self.inserted = threading.Event()
+        self.create_index = mock.Mock()
+
+    def insert_many(self, docs, ordered=True):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise IOError('MongoDB is down')
+        self.batches.append(list(docs))
+        self.inserted.set()
+
+
+class AuditLogTest(unittest.TestCase):
+    def test_batches(self):
+        from svnman.audit import AuditLog
+
+        coll = FakeCollection()
+        audit_log = AuditLog(lambda: coll, batch_size=2, flush_interval=60)
+        audit_log._start_thread = mock.Mock()  # flush explicitly
+
+        for idx in range(5):
+            audit_log.record('grant', 'repo-id', usernames=[f'user-{idx}'])
+
+        self.assertEqual(5, audit_log.flush())
+        self.assertEqual([2, 2, 1], [len(batch) for batch in coll.batches])
+        self.assertEqual(['user-0'], coll.batches[0][0]['usernames'])
+        self.assertEqual('grant', coll.batches[0][0]['action'])
+        self.assertEqual(0, audit_log.flush())
+        coll.create_index.assert_called()
+
+    def test_failed_flush_keeps_entries(self):
+        from svnman.audit import AuditLog
+
+        coll = FakeCollection(fail_times=1)
+        audit_log = AuditLog(lambda: coll, batch_size=10, flush_interval=60)
+        audit_log._start_thread = mock.Mock()
+
+        audit_log.record('create-repo', 'repo-1')
+        audit_log.record('delete-repo', 'repo-1')
+
+        with self.assertRaises(IOError):
+            audit_log.flush()
+        self.assertEqual(2, audit_log.flush())
+        self.assertEqual(['create-repo', 'delete-repo'],
+                         [entry['action'] for entry in coll.batches[0]])
+
+    def test_full_buffer_drops_oldest(self):
+        from svnman.audit import AuditLog
+
+        coll = FakeCollection()
+        audit_log = AuditLog(lambda: coll, batch_size=10, max_buffer=2, flush_interval=60)
+        audit_log._start_thread = mock.Mock()
+
+        for repo_id in ('repo-1', 'repo-2', 'repo-3'):
+            audit_log.record('create-repo', repo_id)
+
+        audit_log.flush()
+        self.assertEqual(1, audit_log.dropped)
+        self.assertEqual(['repo-2', 'repo-3'], [entry['repo_id'] for entry in coll.batches[0]])
+
+    def test_full_buffer_after_failed_flush(self):
+        from svnman.audit import AuditLog
+
+        coll = FakeCollection(fail_times=1)
+        audit_log = AuditLog(lambda: coll, batch_size=10, max_buffer=2, flush_interval=60)
+        audit_log._start_thread = mock.Mock()
+
+        audit_log.record('create-repo', 'repo-1')
+        audit_log.record('create-repo', 'repo-2')
+
+        # A new entry is recorded while the failing batch is being written.
+        insert_many = coll.insert_many
+
+        def record_and_insert(docs, ordered=True):
+            audit_log.record('create-repo', 'repo-3')
+            coll.insert_many = insert_many
+            return insert_many(docs, ordered)
+
+        coll.insert_many = record_and_insert
+        with self.assertRaises(IOError):
+            audit_log.flush()
+
+        self.assertEqual(1, audit_log.dropped)
+        audit_log.flush()
+        self.assertEqual(['repo-2', 'repo-3'], [entry['repo_id'] for entry in coll.batches[0]])
+
+    def test_background_flush(self):
+        from svnman.audit import AuditLog
+
+        coll = FakeCollection()
+        audit_log = AuditLog(lambda: coll, batch_size=10, flush_interval=0.01)
+        audit_log.record('revoke', 'repo-id', usernames=['harry'])
+
+        self.assertTrue(coll.inserted.wait(5))
+        audit_log.close()
+        self.assertEqual(['harry'], coll.batches[0][0]['usernames'])
+
+    def test_unknown_action(self):
+        from svnman.audit import AuditLog
+
+        with self.assertRaises(ValueError):
+            AuditLog(lambda: None).record('chmod', 'repo-id')
+
+    def test_find_query(self):
+        from svnman.audit import find
+
+        coll = mock.MagicMock()
+        since = datetime.datetime(2019, 5, 1, tzinfo=datetime.timezone.utc)
+        find(coll, username='harry', repo_id='repo-id', since=since, limit=5)
+
+        coll.find.assert_called_once_with(
+            {'usernames': 'harry', 'repo_id': 'repo-id', 'timestamp': {'$gte': since}},
+            projection={'_id': 0})
+        coll.find.return_value.sort.assert_called_once_with('timestamp', -1)
+        coll.find.return_value.sort.return_value.limit.assert_called_once_with(5)
@@ -0,0 +1,50 @@
+import time
+import unittest
+
+
+class TTLCacheTest(unittest.TestCase):
+    def test_expiry(self):
+        from svnman.cache import TTLCache
+
+        cache = TTLCache(ttl=0.05)
+        cache.set('key', 'value')
+        self.assertEqual('value', cache.get('key'))
+
+        time.sleep(0.06)
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(0, len(cache))
+
+    def test_maxsize(self):
+        from svnman.cache import TTLCache
+
+        cache = TTLCache(ttl=60, maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(2, cache.get('b'))
+        self.assertEqual(3, cache.get('c'))
+
+    def test_pop_where(self):
+        from svnman.cache import TTLCache
+
+        cache = TTLCache(ttl=60)
+        cache.set(('proj', 'a'), 1)
+        cache.set(('proj', 'b'), 2)
+        cache.set(('other', 'a'), 3)
+        self.assertEqual(2, cache.pop_where(lambda key: key[0] == 'proj'))
+        self.assertEqual(3, cache.get(('other', 'a')))
+
+    def test_get_or_compute(self):
+        from svnman.cache import TTLCache
+
+        cache = TTLCache(ttl=60)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(1, cache.get_or_compute('key', compute))
+        self.assertEqual(1, cache.get_or_compute('key', compute))
+        self.assertEqual(1, len(calls))
@@ -0,0 +1,125 @@
+from unittest import mock
+
+from bson import ObjectId
+
+from tests.abstract_svnman_test import AbstractSVNManTest
+
+
+class ProvisionTest(AbstractSVNManTest):
+    @mock.patch('svnman.remote.API.modify_access')
+    @mock.patch('svnman.remote.API.create_repo')
+    def test_provision(self, mock_create_repo, mock_modify_access):
+        from svnman import EXTENSION_NAME, UNSET_PASSWORD
+        from svnman.cli import provision
+
+        owner_id = self.create_user(24 * 'b', roles={'subscriber-pro'})
+        self.app.db('projects').update_one({'_id': self.proj_id}, {'$set': {'user': owner_id}})
+        other_id, _ = self.ensure_project_exists(project_overrides={
+            '_id': ObjectId(24 * 'c'),
+            'url': 'other-project',
+            'extension_props': {EXTENSION_NAME: {'repo_id': 'existing-repo-id'}},
+        })
+        mock_create_repo.return_value = 'new-repo-id'
+
+        with self.app.app_context():
+            provision([self.project['url'], 'other-project'], workers=2)
+
+        # The project that already had a repository should be skipped.
+        self.assertEqual(1, mock_create_repo.call_count)
+        mock_modify_access.assert_called_once_with(
+            'new-repo-id', grant=[(self._username(owner_id), UNSET_PASSWORD)],
+            revoke=[])
+
+        db_proj = self.fetch_project_from_db(self.proj_id)
+        eprops = db_proj['extension_props'][EXTENSION_NAME]
+        self.assertIn('granted', eprops['users'][str(owner_id)])
+        del eprops['users'][str(owner_id)]['granted']
+        self.assertEqual({
+            'repo_id': 'new-repo-id',
+            'users': {str(owner_id): {'username': self._username(owner_id),
+                                      'pw_set': False}},
+        }, eprops)
+
+        db_proj = self.fetch_project_from_db(other_id)
+        self.assertEqual('existing-repo-id',
+                         db_proj['extension_props'][EXTENSION_NAME]['repo_id'])
+
+        with self.app.app_context():
+            events = self.svnman.event_stream.read()
+        self.assertEqual([('create-repo', 'new-repo-id', []),
+                          ('grant', 'new-repo-id', [self._username(owner_id)])],
+                         [(event['type'], event['repo_id'], event['usernames'])
+                          for event in events])
+
+    @mock.patch('svnman.remote.API.modify_access')
+    @mock.patch('svnman.remote.API.create_repo')
+    def test_provision_grant_fails(self, mock_create_repo, mock_modify_access):
+        from svnman import EXTENSION_NAME
+        from svnman.cli import provision
+
+        owner_id = self.create_user(24 * 'b', roles={'subscriber-pro'})
+        self.app.db('projects').update_one({'_id': self.proj_id}, {'$set': {'user': owner_id}})
+        mock_create_repo.return_value = 'new-repo-id'
+        mock_modify_access.side_effect = OSError('connection reset')
+
+        with self.app.app_context():
+            self.assertEqual(2, provision([self.project['url']]))
+
+        # The repository exists, so it should still be attached to the project.
+        db_proj = self.fetch_project_from_db(self.proj_id)
+        self.assertEqual({'repo_id': 'new-repo-id', 'users': {}},
+                         db_proj['extension_props'][EXTENSION_NAME])
+
+    @mock.patch('svnman.remote.API.create_repo')
+    def test_provision_lost_race(self, mock_create_repo):
+        from svnman import EXTENSION_NAME
+        from svnman.cli import provision
+        from svnman.sweeper import QUEUE_COLLECTION
+
+        def create_concurrently(*args, **kwargs):
+            # Another request attached a repository while this one was creating one.
+            self.app.db('projects').update_one({'_id': self.proj_id}, {'$set': {
+                'extension_props': {EXTENSION_NAME: {'repo_id': 'concurrent-repo-id'}}}})
+            return 'new-repo-id'
+
+        mock_create_repo.side_effect = create_concurrently
+
+        with self.app.app_context():
+            provision([self.project['url']])
+
+        db_proj = self.fetch_project_from_db(self.proj_id)
+        self.assertEqual('concurrent-repo-id',
+                         db_proj['extension_props'][EXTENSION_NAME]['repo_id'])
+        self.assertIsNotNone(self.app.db(QUEUE_COLLECTION).find_one({'_id': 'new-repo-id'}))
+        with self.app.app_context():
+            self.assertEqual([], self.svnman.event_stream.read())
+
+    @mock.patch('svnman.remote.API.create_repo')
+    def test_provision_save_fails(self, mock_create_repo):
+        from svnman import EXTENSION_NAME
+        from svnman.cli import provision
+        from svnman.sweeper import QUEUE_COLLECTION
+
+        # MongoDB can't $set a field inside null.
+        self.app.db('projects').update_one({'_id': self.proj_id}, {'$set': {
+            'extension_props': {EXTENSION_NAME: None}}})
+        mock_create_repo.return_value = 'new-repo-id'
+
+        with self.app.app_context():
+            self.assertEqual(2, provision([self.project['url']]))
+            self.assertEqual([], self.svnman.event_stream.read())
+
+        queued = self.app.db(QUEUE_COLLECTION).find_one({'_id': 'new-repo-id'})
+        self.assertEqual('unable to save the repository ID in the project', queued['reason'])
+
+    def _username(self, user_id: ObjectId) -> str:
+        return self.app.db('users').find_one(user_id)['username']
+
+
+class RegisterTest(AbstractSVNManTest):
+    def test_setup_cli(self):
+        from svnman import cli
+
+        manager = mock.Mock()
+        self.svnman.setup_cli(manager)
+        manager.add_command.assert_called_once_with('svn', cli.manager_svnman)
@@ -0,0 +1,86 @@
+import itertools
+import threading
+from unittest import mock
+
+from tests.abstract_svnman_test import AbstractSVNManTest
+
+
+class EventStreamTest(AbstractSVNManTest):
+    def setUp(self, **kwargs):
+        super().setUp(**kwargs)
+
+        from svnman.events import EventStream
+
+        db = self.app.db()
+        self.stream = EventStream(lambda: db, size=64 * 1024, max_events=100)
+
+    def test_publish_and_read(self):
+        seq1 = self.stream.publish('create-repo', 'repo-id', project_id=self.proj_id)
+        seq2 = self.stream.publish('grant', 'repo-id', project_id=self.proj_id,
+                                   usernames=['harry'])
+        self.assertEqual(seq1 + 1, seq2)
+
+        events = self.stream.read()
+        self.assertEqual([(seq1, 'create-repo', []), (seq2, 'grant', ['harry'])],
+                         [(event['seq'], event['type'], event['usernames'])
+                          for event in events])
+        self.assertEqual([seq2], [event['seq'] for event in self.stream.read(after=seq1)])
+
+    def test_publish_concurrently(self):
+        first = self.stream.publish('create-repo', 'repo-id')
+        last_seq = self.stream._last_seq
+
+        def publish_in_between(coll):
+            # Another publisher inserts an event after this one read the last sequence number.
+            seq = last_seq(coll)
+            if mock_last_seq.call_count == 1:
+                with mock.patch.object(self.stream, '_last_seq', last_seq):
+                    self.stream.publish('grant', 'repo-id', usernames=['harry'])
+            return seq
+
+        with mock.patch.object(self.stream, '_last_seq',
+                               side_effect=publish_in_between) as mock_last_seq:
+            seq = self.stream.publish('revoke', 'repo-id', usernames=['sally'])
+
+        self.assertEqual(first + 2, seq)
+        events = self.stream.read(after=first)
+        self.assertEqual([(first + 1, 'grant'), (first + 2, 'revoke')],
+                         [(event['seq'], event['type']) for event in events])
+        # A consumer that already handled the concurrent event still gets this one.
+        self.assertEqual(['revoke'], [event['type'] for event in self.stream.read(after=first + 1)])
+
+    def test_capped(self):
+        for idx in range(150):
+            self.stream.publish('revoke', f'repo-{idx}')
+
+        events = self.stream.read(limit=1000)
+        self.assertEqual(100, len(events))
+        self.assertEqual('repo-149', events[-1]['repo_id'])
+
+    def test_follow(self):
+        first = self.stream.publish('create-repo', 'repo-1')
+
+        # Publish while the consumer is waiting for new events.
+        timer = threading.Timer(0.2, self.stream.publish, args=('delete-repo', 'repo-1'))
+        timer.start()
+        try:
+            events = list(itertools.islice(self.stream.follow(after=first - 1, max_await=1),
+                                           2))
+        finally:
+            timer.join()
+
+        self.assertEqual(['create-repo', 'delete-repo'], [event['type'] for event in events])
+
+    def test_follow_caught_up(self):
+        first = self.stream.publish('create-repo', 'repo-1')
+
+        # Following from the last event should skip it and wait for the next one.
+        timer = threading.Timer(0.2, self.stream.publish, args=('delete-repo', 'repo-1'))
+        timer.start()
+        try:
+            events = list(itertools.islice(self.stream.follow(after=first, max_await=1), 1))
+        finally:
+            timer.join()
+
+        self.assertEqual([(first + 1, 'delete-repo')],
+                         [(event['seq'], event['type']) for event in events])
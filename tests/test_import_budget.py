@@ -0,0 +1,62 @@
+"""Memory budget and lazily loaded modules of the extension.
+
+Web workers only need the extension class; the CLI, the SVNman API client
+and the other optional parts should be loaded on first use.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+# Bytes that importing svnman and constructing the extension may take,
+# on top of the Flask/Pillar modules it depends on anyway.
+MEMORY_BUDGET = 1024 * 1024
+
+# The only svnman modules a web worker needs before handling svnman requests.
+ALLOWED_MODULES = {'svnman', 'svnman.cache'}
+
+# Modules that svnman shouldn't load by itself when it's imported.
+LAZY_MODULES = {'flask_script', 'bcrypt'}
+
+MEASURE_SCRIPT = '''
+import json, sys, tracemalloc
+
+# Dependencies of svnman/__init__.py, which are loaded by Pillar anyway.
+import flask, werkzeug.local, werkzeug.exceptions
+import pillarsdk, pillar, pillar.extension, pillar.auth, pillar.api.projects.utils
+import pillar.api.users.avatar, pillar.api.utils, pillar.api.utils.authorization, pillar.web.utils
+
+preloaded = set(sys.modules)
+tracemalloc.start()
+
+import svnman
+svnman.SVNManExtension().flask_config()
+
+_, peak = tracemalloc.get_traced_memory()
+print(json.dumps({
+    'peak_memory': peak,
+    'modules': sorted(name for name in sys.modules if name.split('.')[0] == 'svnman'),
+    'loaded': sorted(set(sys.modules) - preloaded),
+}))
+'''
+
+
+class ImportBudgetTest(unittest.TestCase):
+    def measure(self) -> dict:
+        # Run in a fresh interpreter, as this process has loaded everything already.
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.check_output([sys.executable, '-c', MEASURE_SCRIPT], cwd=root)
+        return json.loads(output.decode())
+
+    def test_lazy_modules(self):
+        measurement = self.measure()
+        self.assertEqual(sorted(ALLOWED_MODULES), measurement['modules'])
+        loaded_lazy_modules = {name for name in measurement['loaded']
+                               if name.split('.')[0] in LAZY_MODULES}
+        self.assertEqual(set(), loaded_lazy_modules)
+
+    def test_memory_budget(self):
+        measurement = self.measure()
+        self.assertLess(measurement['peak_memory'], MEMORY_BUDGET)
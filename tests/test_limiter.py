@@ -0,0 +1,70 @@
+import threading
+import unittest
+
+
+class AdaptiveLimiterTest(unittest.TestCase):
+    def test_decrease_on_failure(self):
+        from svnman.limiter import AdaptiveLimiter
+
+        limiter = AdaptiveLimiter(min_limit=1, max_limit=10, initial_limit=8,
+                                  backoff_ratio=0.5)
+        limiter.acquire()
+        limiter.release(latency=0.1, success=False)
+        self.assertEqual(4, limiter.limit)
+
+        limiter.acquire()
+        limiter.release(latency=100.0, success=True)
+        self.assertEqual(2, limiter.limit)
+
+        for _ in range(10):
+            limiter.acquire()
+            limiter.release(latency=0.1, success=False)
+        self.assertEqual(1, limiter.limit)
+        self.assertEqual(0, limiter.in_flight)
+
+    def test_increase_when_used(self):
+        from svnman.limiter import AdaptiveLimiter
+
+        limiter = AdaptiveLimiter(min_limit=1, max_limit=3, initial_limit=1)
+        for _ in range(10):
+            slots = limiter.limit
+            for _ in range(slots):
+                limiter.acquire()
+            for _ in range(slots):
+                limiter.release(latency=0.1, success=True)
+        self.assertEqual(3, limiter.limit)
+
+        # Sequential calls only use one slot, and shouldn't grow the limit.
+        limiter = AdaptiveLimiter(min_limit=1, max_limit=10, initial_limit=4)
+        for _ in range(10):
+            limiter.acquire()
+            limiter.release(latency=0.1, success=True)
+        self.assertEqual(4, limiter.limit)
+
+    def test_reject_when_queue_full(self):
+        from svnman.limiter import AdaptiveLimiter
+        from svnman.exceptions import BackendOverloaded
+
+        limiter = AdaptiveLimiter(min_limit=1, max_limit=1, initial_limit=1,
+                                  queue_size=0, queue_timeout=5.0)
+        limiter.acquire()
+        with self.assertRaises(BackendOverloaded):
+            limiter.acquire()
+
+    def test_wait_for_slot(self):
+        from svnman.limiter import AdaptiveLimiter
+        from svnman.exceptions import BackendOverloaded
+
+        limiter = AdaptiveLimiter(min_limit=1, max_limit=1, initial_limit=1,
+                                  queue_size=1, queue_timeout=5.0)
+        limiter.acquire()
+
+        # Times out when the slot isn't released.
+        with self.assertRaises(BackendOverloaded):
+            limiter.acquire(timeout=0.05)
+
+        timer = threading.Timer(0.05, limiter.release, kwargs={'latency': 0.1, 'success': True})
+        timer.start()
+        limiter.acquire()
+        timer.join()
+        self.assertEqual(1, limiter.in_flight)
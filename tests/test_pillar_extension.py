@@ -71,6 +71,15 @@ class TestPillarExtension(AbstractSVNManTest):
         db_proj = self.fetch_project_from_db(self.proj_id)
         self.assertEqual('new-repo-id', db_proj['extension_props'][EXTENSION_NAME]['repo_id'])
 
+        entries = self.svnman.audit_log.find(repo_id='new-repo-id')
+        self.assertEqual(1, len(entries))
+        self.assertEqual('create-repo', entries[0]['action'])
+        self.assertEqual(self.proj_id, entries[0]['project_id'])
+
+        events = self.svnman.event_stream.read()
+        self.assertEqual([('create-repo', 'new-repo-id')],
+                         [(event['type'], event['repo_id']) for event in events])
+
     @mock.patch('svnman.remote.API.create_repo')
     def test_create_repo_already_exists(self, mock_create_repo):
         from svnman import EXTENSION_NAME
@@ -79,7 +88,9 @@ class TestPillarExtension(AbstractSVNManTest):
         self.login_api_as(24 * 'a', roles={'admin'})
 
         mock_create_repo.return_value = 'new-repo-id'
-        self.sdk_project.extension_props = {EXTENSION_NAME: {'repo_id': 'existing-repo-id'}}
+        # The repository was attached after self.sdk_project was fetched.
+        self.app.db('projects').update_one({'_id': self.proj_id}, {'$set': {
+            'extension_props': {EXTENSION_NAME: {'repo_id': 'existing-repo-id'}}}})
 
         returned_repo_id = self.svnman.create_repo(
             self.sdk_project,
@@ -89,6 +100,113 @@ class TestPillarExtension(AbstractSVNManTest):
 
         self.assertEqual('existing-repo-id', returned_repo_id)
 
+    @mock.patch('svnman.remote.API.create_repo')
+    def test_create_repo_null_extension_props(self, mock_create_repo):
+        from svnman import EXTENSION_NAME
+
+        self.enter_app_context()
+        self.login_api_as(24 * 'a', roles={'admin'})
+
+        self.app.db('projects').update_one({'_id': self.proj_id},
+                                           {'$set': {'extension_props': None}})
+        self.sdk_project.extension_props = None
+        mock_create_repo.return_value = 'new-repo-id'
+
+        self.assertEqual('new-repo-id', self.svnman.create_repo(self.sdk_project, 'tester'))
+
+        db_proj = self.fetch_project_from_db(self.proj_id)
+        self.assertEqual({EXTENSION_NAME: {'repo_id': 'new-repo-id'}},
+                         db_proj['extension_props'])
+        self.assertNotEqual(self.project['_etag'], db_proj['_etag'])
+
+    @mock.patch('svnman.remote.API.create_repo')
+    def test_create_repo_lost_race(self, mock_create_repo):
+        from svnman import EXTENSION_NAME
+        from svnman.sweeper import QUEUE_COLLECTION
+
+        self.enter_app_context()
+        self.login_api_as(24 * 'a', roles={'admin'})
+
+        def create_concurrently(*args, **kwargs):
+            # Another request attached a repository while this one was creating one.
+            self.app.db('projects').update_one({'_id': self.proj_id}, {'$set': {
+                'extension_props': {EXTENSION_NAME: {'repo_id': 'concurrent-repo-id'}}}})
+            return 'new-repo-id'
+
+        mock_create_repo.side_effect = create_concurrently
+
+        self.assertEqual('concurrent-repo-id',
+                         self.svnman.create_repo(self.sdk_project, 'tester'))
+
+        db_proj = self.fetch_project_from_db(self.proj_id)
+        self.assertEqual('concurrent-repo-id',
+                         db_proj['extension_props'][EXTENSION_NAME]['repo_id'])
+        self.assertIsNotNone(self.app.db(QUEUE_COLLECTION).find_one({'_id': 'new-repo-id'}))
+        # The losing repository is never attached, so followers shouldn't hear about it.
+        self.assertEqual([], self.svnman.event_stream.read())
+
+    @mock.patch('svnman.remote.API.modify_access')
+    def test_revoke_access_keeps_concurrent_grants(self, mock_modify_access):
+        from svnman import EXTENSION_NAME
+
+        self.enter_app_context()
+        self.login_api_as(24 * 'a', roles={'admin'})
+
+        users = {24 * 'a': {'username': 'harry', 'pw_set': True},
+                 24 * 'b': {'username': 'sally', 'pw_set': False}}
+        self.sdk_project.extension_props = {EXTENSION_NAME: {'repo_id': 'repo-id',
+                                                             'users': dict(users)}}
+        # Another request granted access after self.sdk_project was fetched.
+        users[24 * 'c'] = {'username': 'marie', 'pw_set': True}
+        self.app.db('projects').update_one({'_id': self.proj_id}, {'$set': {
+            'extension_props': {EXTENSION_NAME: {'repo_id': 'repo-id', 'users': users}}}})
+
+        self.svnman.modify_access(self.sdk_project, 'repo-id', revoke_user_id=24 * 'a')
+
+        mock_modify_access.assert_called_once_with('repo-id', grant=[], revoke=['harry'])
+        db_proj = self.fetch_project_from_db(self.proj_id)
+        self.assertEqual({24 * 'b', 24 * 'c'},
+                         set(db_proj['extension_props'][EXTENSION_NAME]['users']))
+
+    @mock.patch('svnman.remote.API.modify_access')
+    def test_grant_access_not_published_on_failure(self, mock_modify_access):
+        from svnman import EXTENSION_NAME
+
+        self.enter_app_context()
+        self.login_api_as(24 * 'a', roles={'admin'})
+        self.app.db('projects').update_one({'_id': self.proj_id}, {'$set': {
+            'extension_props': {EXTENSION_NAME: {'repo_id': 'repo-id'}}}})
+
+        def detach_concurrently(*args, **kwargs):
+            self.app.db('projects').update_one({'_id': self.proj_id}, {'$unset': {
+                f'extension_props.{EXTENSION_NAME}.repo_id': True}})
+
+        mock_modify_access.side_effect = detach_concurrently
+        user_id = self.create_user(24 * 'b', roles={'subscriber-pro'})
+
+        with self.assertRaises(ValueError):
+            self.svnman.modify_access(self.sdk_project, 'repo-id', grant_user_id=str(user_id))
+        self.assertEqual([], self.svnman.event_stream.read())
+
+    @mock.patch('svnman.remote.API.modify_access')
+    def test_revoke_access_stale_project(self, mock_modify_access):
+        from svnman import EXTENSION_NAME
+
+        self.enter_app_context()
+        self.login_api_as(24 * 'a', roles={'admin'})
+
+        # Access was granted after self.sdk_project was fetched.
+        self.sdk_project.extension_props = {EXTENSION_NAME: {'repo_id': 'repo-id'}}
+        self.app.db('projects').update_one({'_id': self.proj_id}, {'$set': {
+            'extension_props': {EXTENSION_NAME: {'repo_id': 'repo-id', 'users': {
+                24 * 'a': {'username': 'harry', 'pw_set': True}}}}}})
+
+        self.svnman.modify_access(self.sdk_project, 'repo-id', revoke_user_id=24 * 'a')
+
+        mock_modify_access.assert_called_once_with('repo-id', grant=[], revoke=['harry'])
+        db_proj = self.fetch_project_from_db(self.proj_id)
+        self.assertEqual({}, db_proj['extension_props'][EXTENSION_NAME]['users'])
+
     @mock.patch('svnman.remote.API.create_repo')
     @mock.patch('svnman._random_id')
     def test_create_repo_never_unique(self, mock_random_id, mock_create_repo):
@@ -158,3 +276,148 @@ class TestPillarExtension(AbstractSVNManTest):
         for _ in range(10):  # just try a couple of different ones.
             rid = _random_id()
             self.assertRegex(rid, '^[a-z]{2}[a-zA-Z0-9]{22}$')
+
+    def test_usage_stats(self):
+        from bson import ObjectId
+        from svnman import EXTENSION_NAME
+
+        proj_coll = self.app.db('projects')
+        proj_coll.update_one({'_id': self.proj_id}, {'$set': {
+            'extension_props': {EXTENSION_NAME: {
+                'repo_id': 'abRepo1',
+                'users': {'5551234': {'username': 'heyhey', 'pw_set': False},
+                          '5554321': {'username': 'hoho', 'pw_set': True}},
+            }}}})
+        for repo_id, deleted in (('abRepo2', False), ('cdRepo3', False), ('efRepo4', True)):
+            proj_coll.insert_one({
+                '_id': ObjectId(),
+                '_deleted': deleted,
+                'extension_props': {EXTENSION_NAME: {
+                    'repo_id': repo_id,
+                    'users': {'5551234': {'username': 'heyhey', 'pw_set': False}},
+                }},
+            })
+
+        with self.app.app_context():
+            stats = self.svnman.usage_stats()
+
+        self.assertEqual(3, stats['repos'])
+        self.assertEqual([{'users': 1, 'repos': 2}, {'users': 2, 'repos': 1}],
+                         stats['users_per_repo'])
+        self.assertEqual(1, stats['users_without_password'])
+        self.assertEqual({'ab': 2, 'cd': 1}, stats['repos_per_shard'])
+
+        # The result should be cached.
+        proj_coll.delete_many({'_id': {'$ne': self.proj_id}})
+        with self.app.app_context():
+            self.assertEqual(3, self.svnman.usage_stats()['repos'])
+
+    def test_access_list(self):
+        from svnman import EXTENSION_NAME
+
+        user_ids = [self.create_user(f'{i:024x}', roles={'subscriber-pro'}) for i in range(1, 6)]
+        users = {str(uid): {'username': f'user-{4 - i}', 'pw_set': i % 2 == 0}
+                 for i, uid in enumerate(user_ids)}
+        self.app.db('projects').update_one({'_id': self.proj_id}, {'$set': {
+            'extension_props': {EXTENSION_NAME: {'repo_id': 'existing-repo-id', 'users': users}},
+        }})
+
+        with self.app.app_context():
+            page, next_after = self.svnman.access_list(self.proj_id, limit=2)
+            self.assertEqual(['user-0', 'user-1'], [info['username'] for info in page])
+            self.assertEqual('user-1', next_after)
+            self.assertEqual(str(user_ids[4]), page[0]['user_id'])
+            self.assertTrue(page[0]['pw_set'])
+            self.assertFalse(page[1]['pw_set'])
+
+            page, next_after = self.svnman.access_list(self.proj_id, after=next_after, limit=2)
+            self.assertEqual(['user-2', 'user-3'], [info['username'] for info in page])
+
+            page, next_after = self.svnman.access_list(self.proj_id, after=next_after, limit=2)
+            self.assertEqual(['user-4'], [info['username'] for info in page])
+            self.assertEqual('', next_after)
+
+            page, next_after = self.svnman.access_list(self.proj_id, search='ER-3')
+            self.assertEqual(['user-3'], [info['username'] for info in page])
+            self.assertEqual('', next_after)
+
+    def test_search_svn_users(self):
+        users_coll = self.app.db('users')
+        svn_uid = self.create_user(24 * 'b', roles={'subscriber-pro'})
+        users_coll.update_one({'_id': svn_uid}, {'$set': {
+            'username': 'harry', 'full_name': 'Harry de Bøker', 'email': 'harry@example.com'}})
+        other_uid = self.create_user(24 * 'c', roles={'subscriber'})
+        users_coll.update_one({'_id': other_uid}, {'$set': {
+            'username': 'harriet', 'full_name': 'Harriet', 'email': 'harriet@example.com'}})
+
+        with self.app.app_context():
+            for query in ('harr', 'Harr', 'harry@', 'Harry de'):
+                found = self.svnman.search_svn_users(query)
+                self.assertEqual([str(svn_uid)], [user['user_id'] for user in found], query)
+
+            self.assertEqual([], self.svnman.search_svn_users('Bøker'))
+            self.assertEqual([], self.svnman.search_svn_users('   '))
+
+    def test_invalidate_project_caches(self):
+        cache = self.svnman.fragment_cache
+        cache.set(('sidebar', str(self.proj_id), 'url', 'repo-id'), 'sidebar-html')
+        cache.set(('sidebar', 24 * 'f', 'other-url', 'other-repo-id'), 'other-sidebar-html')
+        cache.set(('dashboard', 24 * 'a', 0), 'dashboard-html')
+
+        with self.app.app_context():
+            self.assertEqual(0, self.svnman.dashboard_version())
+            self.svnman._invalidate_project_caches(self.proj_id)
+            # Other processes can't see the local invalidation, only the new version.
+            self.assertEqual(1, self.svnman.dashboard_version())
+
+        self.assertIsNone(cache.get(('sidebar', str(self.proj_id), 'url', 'repo-id')))
+        self.assertIsNone(cache.get(('dashboard', 24 * 'a', 0)))
+        self.assertEqual('other-sidebar-html',
+                         cache.get(('sidebar', 24 * 'f', 'other-url', 'other-repo-id')))
+
+    def test_invalidate_project_caches_projects(self):
+        cache = self.svnman.project_cache
+        cache.set(('project', 'url', 24 * 'a'), 'project')
+        cache.set(('project', 'other-url', 24 * 'a'), 'other-project')
+
+        with self.app.app_context():
+            self.svnman._invalidate_project_caches(self.proj_id, 'url')
+            self.assertIsNone(cache.get(('project', 'url', 24 * 'a')))
+            self.assertEqual('other-project', cache.get(('project', 'other-url', 24 * 'a')))
+
+            self.svnman._invalidate_project_caches(self.proj_id)
+            self.assertEqual(0, len(cache))
+
+    def test_project_and_user_updated(self):
+        from bson import ObjectId
+
+        cache = self.svnman.project_cache
+        cache.set(('project', 'url', 24 * 'a'), 'project')
+        cache.set(('project', 'other-url', 24 * 'a'), 'other-project')
+        cache.set(('project', 'other-url', 24 * 'b'), 'other-project')
+
+        self.svnman._project_updated({'permissions': {}}, {'_id': self.proj_id, 'url': 'url'})
+        self.assertIsNone(cache.get(('project', 'url', 24 * 'a')))
+        self.assertEqual(2, len(cache))
+
+        self.svnman._user_updated({'groups': []}, {'_id': ObjectId(24 * 'b')})
+        self.assertIsNone(cache.get(('project', 'other-url', 24 * 'b')))
+        self.assertEqual('other-project', cache.get(('project', 'other-url', 24 * 'a')))
+
+    @mock.patch('svnman.remote.API.delete_repo')
+    def test_delete_repo_invalidates_caches(self, mock_delete_repo):
+        from svnman import EXTENSION_NAME
+        from pillar.api.projects.utils import put_project
+
+        self.enter_app_context()
+        self.login_api_as(24 * 'a', roles={'admin'})
+
+        self.project['extension_props'] = {EXTENSION_NAME: {'repo_id': 'existing-repo-id'}}
+        self.sdk_project = pillarsdk.Project(pillar.tests.mongo_to_sdk(self.project))
+        put_project(self.project)
+
+        cache_key = ('sidebar', str(self.proj_id), self.project['url'], 'existing-repo-id')
+        self.svnman.fragment_cache.set(cache_key, 'sidebar-html')
+
+        self.svnman.delete_repo(self.sdk_project, 'existing-repo-id')
+        self.assertIsNone(self.svnman.fragment_cache.get(cache_key))
@@ -0,0 +1,55 @@
+import glob
+import os
+import tempfile
+
+from tests.abstract_svnman_test import AbstractSVNManTest
+
+
+class ProfilingTest(AbstractSVNManTest):
+    def setUp(self, **kwargs):
+        super().setUp(**kwargs)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.profile_dir = os.path.join(self.tmpdir.name, 'profiles')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        super().tearDown()
+
+    def _work(self):
+        return sum(i * i for i in range(1000))
+
+    def test_disabled(self):
+        from svnman import profiling
+
+        self.app.config['SVNMAN_PROFILE_SAMPLE_RATE'] = 1.0
+        with self.app.app_context(), profiling.profiled('test'):
+            self._work()
+        self.assertFalse(os.path.exists(self.profile_dir))
+
+    def test_sampled(self):
+        from svnman import profiling
+
+        self.app.config['SVNMAN_PROFILE_DIR'] = self.profile_dir
+        self.app.config['SVNMAN_PROFILE_SAMPLE_RATE'] = 1.0
+        with self.app.app_context():
+            for _ in range(2):
+                with profiling.profiled('test'):
+                    # Nested calls shouldn't produce a separate profile.
+                    with profiling.profiled('nested'):
+                        self._work()
+
+        self.assertEqual(2, len(glob.glob(os.path.join(self.profile_dir, 'test-*.prof'))))
+        self.assertEqual([], glob.glob(os.path.join(self.profile_dir, 'nested-*.prof')))
+
+        self.assertIn('_work', profiling.summarise(self.profile_dir))
+        self.assertIn('_work', profiling.summarise(self.profile_dir, 'test', max_profiles=1))
+
+    def test_not_sampled(self):
+        from svnman import profiling
+
+        self.app.config['SVNMAN_PROFILE_DIR'] = self.profile_dir
+        self.app.config['SVNMAN_PROFILE_SAMPLE_RATE'] = 0.0
+        with self.app.test_request_context():
+            with profiling.profiled('test'):
+                self._work()
+        self.assertEqual([], glob.glob(os.path.join(self.profile_dir, '*.prof')))
@@ -0,0 +1,69 @@
+import unittest
+
+from tests.abstract_svnman_test import AbstractSVNManTest
+
+
+class MemoryStoreTest(unittest.TestCase):
+    def test_token_bucket(self):
+        from svnman.ratelimit import Limit, MemoryStore
+
+        store = MemoryStore()
+        limit = Limit(rate=0.5, burst=2)
+
+        self.assertEqual(0.0, store.take('key', limit, now=100.0))
+        self.assertEqual(0.0, store.take('key', limit, now=100.0))
+        self.assertAlmostEqual(2.0, store.take('key', limit, now=100.0))
+
+        # Other keys have their own bucket.
+        self.assertEqual(0.0, store.take('other', limit, now=100.0))
+
+        # After one second there is half a token, after two seconds a whole one.
+        self.assertAlmostEqual(1.0, store.take('key', limit, now=101.0))
+        self.assertEqual(0.0, store.take('key', limit, now=102.0))
+
+    def test_evict_per_limit(self):
+        from svnman.ratelimit import Limit, MemoryStore
+
+        store = MemoryStore()
+        store.max_buckets = 1
+
+        store.take('slow', Limit(rate=0.01, burst=1), now=100.0)
+        store.take('fast', Limit(rate=1, burst=1), now=110.0)
+
+        # The fast bucket is full again after a second, the slow one only after 100 seconds.
+        store.take('fast', Limit(rate=1, burst=1), now=120.0)
+        self.assertEqual({'slow', 'fast'}, set(store._buckets))
+        self.assertGreater(store.peek('slow', Limit(rate=0.01, burst=1), now=120.0), 0.0)
+
+    def test_rate_limiter(self):
+        from svnman.ratelimit import Limit, MemoryStore, RateLimiter
+
+        limiter = RateLimiter(MemoryStore(), {'create-repo': Limit(rate=0.1, burst=1)})
+
+        self.assertEqual(0.0, limiter.check('create-repo', ['user:a', 'project:p']))
+        self.assertGreater(limiter.check('create-repo', ['user:b', 'project:p']), 0.0)
+        self.assertGreater(limiter.check('create-repo', ['user:a', 'project:q']), 0.0)
+
+        # The refused requests didn't take a token from the buckets that allowed them.
+        self.assertEqual(0.0, limiter.check('create-repo', ['user:b', 'project:q']))
+
+        # Actions without limits are always allowed.
+        for _ in range(10):
+            self.assertEqual(0.0, limiter.check('grant-access', ['user:a']))
+
+
+class MongoStoreTest(AbstractSVNManTest):
+    def test_token_bucket(self):
+        from svnman.ratelimit import Limit, MongoStore, MONGO_COLLECTION
+
+        store = MongoStore(lambda: self.app.db(MONGO_COLLECTION))
+        limit = Limit(rate=0.5, burst=2)
+
+        with self.app.app_context():
+            self.assertEqual(0.0, store.take('key', limit, now=100.0))
+            self.assertEqual(0.0, store.take('key', limit, now=100.0))
+            self.assertAlmostEqual(2.0, store.take('key', limit, now=100.0))
+            self.assertEqual(0.0, store.take('key', limit, now=102.0))
+
+            doc = self.app.db(MONGO_COLLECTION).find_one({'_id': 'key'})
+            self.assertAlmostEqual(0.0, doc['tokens'])
@@ -0,0 +1,109 @@
+import datetime
+from unittest import mock
+
+from bson import ObjectId
+
+from tests.abstract_svnman_test import AbstractSVNManTest
+
+
+class RefreshIntervalsTest(AbstractSVNManTest):
+    def test_next_refresh(self):
+        from svnman.repostats import RefreshIntervals
+
+        intervals = RefreshIntervals(active=100, normal=1000, idle=10000)
+        now = datetime.datetime(2019, 5, 10, 12, tzinfo=datetime.timezone.utc)
+
+        def seconds(last_commit) -> float:
+            return (intervals.next_refresh(last_commit, now) - now).total_seconds()
+
+        self.assertAlmostEqual(100, seconds(now - datetime.timedelta(hours=1)), delta=10)
+        self.assertAlmostEqual(1000, seconds(now - datetime.timedelta(days=3)), delta=100)
+        self.assertAlmostEqual(10000, seconds(now - datetime.timedelta(days=90)), delta=1000)
+        self.assertAlmostEqual(10000, seconds(None), delta=1000)
+
+
+class RefreshTest(AbstractSVNManTest):
+    def setUp(self, **kwargs):
+        super().setUp(**kwargs)
+
+        from svnman import EXTENSION_NAME
+
+        self.db = self.app.db()
+        self.now = datetime.datetime(2019, 5, 10, 12, tzinfo=datetime.timezone.utc)
+        proj_coll = self.db['projects']
+        proj_coll.update_one({'_id': self.proj_id}, {'$set': {
+            'extension_props': {EXTENSION_NAME: {'repo_id': 'new-repo'}}}})
+
+        # Refreshed recently, so not due yet.
+        self.fresh_pid = ObjectId()
+        proj_coll.insert_one({
+            '_id': self.fresh_pid,
+            'extension_props': {EXTENSION_NAME: {'repo_id': 'fresh-repo', 'stats': {
+                'size': 1, 'revision': 1, 'last_commit': None,
+                'refreshed': self.now.timestamp(),
+                'next_refresh': self.now.timestamp() + 3600}}},
+        })
+
+        # Due, and failing to fetch.
+        self.failing_pid = ObjectId()
+        proj_coll.insert_one({
+            '_id': self.failing_pid,
+            'extension_props': {EXTENSION_NAME: {'repo_id': 'failing-repo', 'stats': {
+                'size': 1, 'revision': 1, 'last_commit': None,
+                'refreshed': self.now.timestamp(),
+                'next_refresh': self.now.timestamp() - 3600}}},
+        })
+
+        # Saved through pillarsdk, which turned the datetimes into strings.
+        self.edited_pid = ObjectId()
+        proj_coll.insert_one({
+            '_id': self.edited_pid,
+            'extension_props': {EXTENSION_NAME: {'repo_id': 'edited-repo', 'stats': {
+                'size': 1, 'revision': 1, 'last_commit': None,
+                'refreshed': 'Fri, 10 May 2019 12:00:00 GMT',
+                'next_refresh': 'Fri, 10 May 2019 13:00:00 GMT'}}},
+        })
+
+    def test_refresh(self):
+        from svnman import EXTENSION_NAME
+        from svnman.exceptions import RepoNotFound
+        from svnman.remote import RepoStats
+        from svnman.repostats import refresh, RefreshIntervals
+
+        last_commit = self.now - datetime.timedelta(minutes=5)
+
+        def fetch_stats(repo_id):
+            if repo_id == 'failing-repo':
+                raise RepoNotFound(repo_id)
+            return RepoStats(repo_id=repo_id, size=2048, revision=3,
+                             last_commit=last_commit.timestamp())
+
+        remote = mock.Mock()
+        remote.fetch_stats.side_effect = fetch_stats
+        intervals = RefreshIntervals(active=100, normal=1000, idle=10000)
+        report = refresh(self.db, remote, EXTENSION_NAME, intervals=intervals, now=self.now)
+
+        self.assertEqual(2, report.refreshed)
+        self.assertEqual(['failing-repo'], [repo_id for repo_id, _ in report.failed])
+        self.assertEqual({'new-repo', 'failing-repo', 'edited-repo'},
+                         {call[0][0] for call in remote.fetch_stats.call_args_list})
+
+        with self.app.app_context():
+            stats = self.svnman.repo_stats([self.proj_id, self.fresh_pid])
+        new_stats = stats[str(self.proj_id)]
+        self.assertEqual(2048, new_stats['size'])
+        self.assertEqual(3, new_stats['revision'])
+        self.assertEqual(last_commit, new_stats['last_commit'])
+        self.assertEqual(self.now, new_stats['refreshed'])
+        self.assertEqual(1, stats[str(self.fresh_pid)]['size'])
+
+        # The failing repository keeps its old statistics, and is retried later.
+        db_proj = self.fetch_project_from_db(self.failing_pid)
+        failing_stats = db_proj['extension_props'][EXTENSION_NAME]['stats']
+        self.assertEqual(1, failing_stats['size'])
+        self.assertGreater(failing_stats['next_refresh'], self.now.timestamp())
+
+        # Refreshed repositories are due again later.
+        remote.fetch_stats.reset_mock()
+        refresh(self.db, remote, EXTENSION_NAME, intervals=intervals, now=self.now)
+        remote.fetch_stats.assert_not_called()
@@ -0,0 +1,74 @@
+from unittest import mock
+
+from bson import ObjectId
+
+from tests.abstract_svnman_test import AbstractSVNManTest
+
+
+class SweeperTest(AbstractSVNManTest):
+    def setUp(self, **kwargs):
+        super().setUp(**kwargs)
+
+        from svnman import EXTENSION_NAME
+        from svnman.sweeper import queue_repo_deletion
+
+        self.db = self.app.db()
+        proj_coll = self.db['projects']
+
+        # Live project, its repository should never be removed.
+        proj_coll.update_one({'_id': self.proj_id}, {'$set': {
+            'extension_props': {EXTENSION_NAME: {'repo_id': 'live-repo'}}}})
+
+        # Soft-deleted project that still has a repository.
+        self.deleted_pid = ObjectId()
+        proj_coll.insert_one({
+            '_id': self.deleted_pid,
+            '_deleted': True,
+            'extension_props': {EXTENSION_NAME: {'repo_id': 'deleted-repo',
+                                                 'users': {'5551234': {'username': 'hey'}}}},
+        })
+
+        queue_repo_deletion(self.db, 'missing-repo', ObjectId(), 'project deleted')
+        queue_repo_deletion(self.db, 'live-repo', self.proj_id, 'project deleted')
+
+    def test_dry_run(self):
+        from svnman import EXTENSION_NAME
+        from svnman.sweeper import sweep
+
+        remote = mock.Mock()
+        report = sweep(self.db, remote, EXTENSION_NAME, dry_run=True)
+
+        self.assertEqual({'missing-repo', 'deleted-repo'},
+                         {orphan.repo_id for orphan in report.deleted})
+        remote.delete_repo.assert_not_called()
+
+    def test_sweep(self):
+        from svnman import EXTENSION_NAME
+        from svnman.exceptions import RepoNotFound
+        from svnman.sweeper import sweep, QUEUE_COLLECTION
+
+        remote = mock.Mock()
+        remote.delete_repo.side_effect = [None, RepoNotFound('missing-repo')]
+        report = sweep(self.db, remote, EXTENSION_NAME, workers=1)
+
+        self.assertEqual([], report.failed)
+        self.assertEqual({'missing-repo', 'deleted-repo'},
+                         {orphan.repo_id for orphan in report.deleted})
+
+        self.assertEqual(0, self.db[QUEUE_COLLECTION].count())
+        deleted_proj = self.db['projects'].find_one(self.deleted_pid)
+        self.assertEqual({}, deleted_proj['extension_props'][EXTENSION_NAME])
+        live_proj = self.db['projects'].find_one(self.proj_id)
+        self.assertEqual('live-repo', live_proj['extension_props'][EXTENSION_NAME]['repo_id'])
+
+    def test_sweep_failure_stays_queued(self):
+        from svnman import EXTENSION_NAME
+        from svnman.exceptions import InternalAPIServerError
+        from svnman.sweeper import sweep, QUEUE_COLLECTION
+
+        remote = mock.Mock()
+        remote.delete_repo.side_effect = InternalAPIServerError('oops')
+        report = sweep(self.db, remote, EXTENSION_NAME)
+
+        self.assertEqual(2, len(report.failed))
+        self.assertIsNotNone(self.db[QUEUE_COLLECTION].find_one('missing-repo'))
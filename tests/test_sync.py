@@ -0,0 +1,121 @@
+from unittest import mock
+
+from bson import ObjectId
+
+from tests.abstract_svnman_test import AbstractSVNManTest
+
+
+class SyncTest(AbstractSVNManTest):
+    def setUp(self, **kwargs):
+        super().setUp(**kwargs)
+
+        from svnman import EXTENSION_NAME
+
+        self.db = self.app.db()
+        proj_coll = self.db['projects']
+        proj_coll.update_one({'_id': self.proj_id}, {'$set': {
+            'extension_props': {EXTENSION_NAME: {'repo_id': 'repo-1', 'users': {
+                24 * 'a': {'username': 'harry', 'pw_set': True},
+                24 * 'b': {'username': 'sally', 'pw_set': False},
+            }}}}})
+
+        self.other_pid = ObjectId()
+        proj_coll.insert_one({
+            '_id': self.other_pid,
+            'extension_props': {EXTENSION_NAME: {'repo_id': 'repo-2', 'users': {
+                24 * 'c': {'username': 'marie', 'pw_set': True},
+            }}},
+        })
+
+    def test_sync(self):
+        from svnman import EXTENSION_NAME
+        from svnman.remote import ChangesPage, RepoChange
+        from svnman.sync import sync, load_cursor
+
+        remote = mock.Mock()
+        remote.changes_since.side_effect = [
+            ChangesPage([RepoChange('repo-1', False, ['harry', 'newbie']),
+                         RepoChange('unknown-repo', False, [])], cursor='10', more=True),
+            ChangesPage([RepoChange('repo-2', True, [])], cursor='12', more=False),
+        ]
+
+        report = sync(self.db, remote, EXTENSION_NAME, page_size=2)
+
+        self.assertEqual([mock.call('', limit=2), mock.call('10', limit=2)],
+                         remote.changes_since.call_args_list)
+        self.assertEqual('12', report.cursor)
+        self.assertEqual('12', load_cursor(self.db))
+        self.assertEqual(3, report.changes)
+        self.assertEqual(2, report.updated)
+        self.assertEqual([('repo-1', self.proj_id, 24 * 'b', 'sally')], report.revoked)
+        self.assertEqual([('repo-1', 'newbie')], report.unknown)
+        self.assertEqual([('repo-2', self.other_pid)], report.deleted)
+
+        db_proj = self.fetch_project_from_db(self.proj_id)
+        self.assertEqual({24 * 'a': {'username': 'harry', 'pw_set': True}},
+                         db_proj['extension_props'][EXTENSION_NAME]['users'])
+        db_proj = self.fetch_project_from_db(self.other_pid)
+        self.assertEqual({}, db_proj['extension_props'][EXTENSION_NAME])
+
+    def test_sync_keeps_new_grants(self):
+        import datetime
+        from svnman import EXTENSION_NAME
+        from svnman.remote import ChangesPage, RepoChange
+        from svnman.sync import sync
+
+        def changes_since(cursor, limit):
+            # Pillar grants 'marie' access while the page is being fetched.
+            self.db['projects'].update_one({'_id': self.proj_id}, {'$set': {
+                f'extension_props.{EXTENSION_NAME}.users.{24 * "c"}': {
+                    'username': 'marie', 'pw_set': True,
+                    'granted': datetime.datetime.now(tz=datetime.timezone.utc).timestamp()}}})
+            return ChangesPage([RepoChange('repo-1', False, [])], cursor='10')
+
+        remote = mock.Mock()
+        remote.changes_since.side_effect = changes_since
+
+        report = sync(self.db, remote, EXTENSION_NAME)
+
+        self.assertEqual(['harry', 'sally'],
+                         sorted(username for _, _, _, username in report.revoked))
+        db_proj = self.fetch_project_from_db(self.proj_id)
+        self.assertEqual({24 * 'c'}, set(db_proj['extension_props'][EXTENSION_NAME]['users']))
+
+    def test_sync_edited_project(self):
+        from svnman import EXTENSION_NAME
+        from svnman.remote import ChangesPage, RepoChange
+        from svnman.sync import sync
+
+        # Saved through pillarsdk by an older version, which stored 'granted' as datetime.
+        users_field = f'extension_props.{EXTENSION_NAME}.users'
+        self.db['projects'].update_one({'_id': self.proj_id}, {'$set': {
+            f'{users_field}.{24 * "b"}.granted': 'Fri, 10 May 2019 12:00:00 GMT'}})
+        etag = self.fetch_project_from_db(self.proj_id)['_etag']
+
+        remote = mock.Mock()
+        remote.changes_since.return_value = ChangesPage(
+            [RepoChange('repo-1', False, ['harry'])], cursor='10')
+
+        report = sync(self.db, remote, EXTENSION_NAME)
+
+        self.assertEqual(['sally'], [username for _, _, _, username in report.revoked])
+        db_proj = self.fetch_project_from_db(self.proj_id)
+        self.assertEqual({24 * 'a'}, set(db_proj['extension_props'][EXTENSION_NAME]['users']))
+        # Stale copies of the project can't be saved over the revoke.
+        self.assertNotEqual(etag, db_proj['_etag'])
+
+    def test_cursor_expired(self):
+        from svnman import EXTENSION_NAME
+        from svnman.exceptions import CursorExpired
+        from svnman.remote import ChangesPage
+        from svnman.sync import sync, save_cursor
+
+        save_cursor(self.db, 'ancient')
+        remote = mock.Mock()
+        remote.changes_since.side_effect = [CursorExpired('gone'),
+                                            ChangesPage([], cursor='99', more=False)]
+
+        report = sync(self.db, remote, EXTENSION_NAME)
+        self.assertEqual('99', report.cursor)
+        self.assertEqual([mock.call('ancient', limit=500), mock.call('', limit=500)],
+                         remote.changes_since.call_args_list)
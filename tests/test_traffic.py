@@ -0,0 +1,126 @@
+import json
+import os
+import re
+import tempfile
+import unittest
+
+import responses
+
+from tests.abstract_svnman_test import AbstractSVNManTest
+
+
+class TrafficTest(AbstractSVNManTest):
+    def setUp(self, **kwargs):
+        super().setUp(**kwargs)
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        super().tearDown()
+
+    @responses.activate
+    def test_record_and_replay(self):
+        from svnman import remote, traffic
+
+        responses.add(responses.POST, 'http://svnman_api_url/api/repo/repo-id/access',
+                      status=204)
+        responses.add(responses.DELETE, 'http://svnman_api_url/api/repo/repo-id', status=404)
+
+        recorder = traffic.TrafficRecorder(os.path.join(self.tmpdir.name, 'trace-{pid}.jsonl'))
+        self.remote.recorder = recorder
+        try:
+            self.remote.modify_access('repo-id', grant=[('username', '$2y$secret-hash')],
+                                      revoke=[])
+            with self.assertRaises(Exception):
+                self.remote.delete_repo('repo-id')
+        finally:
+            self.remote.recorder = None
+            recorder.close()
+
+        self.assertTrue(recorder.path.endswith(f'trace-{os.getpid()}.jsonl'))
+        with open(recorder.path) as infile:
+            raw_trace = infile.read()
+        self.assertNotIn('secret-hash', raw_trace)
+        self.assertNotIn('username', raw_trace)
+
+        entries = traffic.load_trace(recorder.path)
+        self.assertEqual([('POST', 'repo/repo-id/access', 204), ('DELETE', 'repo/repo-id', 404)],
+                         [(entry['m'], entry['p'], entry['s']) for entry in entries])
+        self.assertGreater(entries[0]['b'], 0)
+
+        # Replay against another server, as fast as possible.
+        responses.add(responses.POST, re.compile(r'http://standin/api/repo/.*/access'),
+                      status=204)
+        responses.add(responses.DELETE, re.compile(r'http://standin/api/repo/.*'), status=204)
+
+        api = remote.API(remote_url='http://standin/api/', username='', password='')
+        with self.assertRaises(ValueError):
+            traffic.replay(entries, api, speed=1000)
+        self.assertEqual(2, len(responses.calls))
+
+        summary = traffic.replay(entries, api, speed=1000, allow_writes=True)
+        self.assertEqual(2, summary.requests)
+        self.assertEqual(0, summary.errors)
+        self.assertEqual({204: 2}, dict(summary.statuses))
+        self.assertIn('POST repo/<repo_id>/access', summary.as_text())
+
+
+class StandInTest(unittest.TestCase):
+    def test_repo_lifecycle(self):
+        from svnman import standin
+
+        client = standin.create_app().test_client()
+
+        resp = client.post('/api/repo', data=json.dumps({'repo_id': 'abc', 'project_id': 'p',
+                                                         'creator': 'me'}))
+        self.assertEqual(201, resp.status_code)
+        resp = client.post('/api/repo', data=json.dumps({'repo_id': 'abc'}))
+        self.assertEqual(409, resp.status_code)
+
+        resp = client.post('/api/repo/abc/access', data=json.dumps({
+            'grant': [{'username': 'harry', 'password': '$2y$hash'}], 'revoke': []}))
+        self.assertEqual(204, resp.status_code)
+
+        resp = client.get('/api/repo/abc')
+        self.assertEqual({'repo_id': 'abc', 'access': ['harry']}, json.loads(resp.data))
+        resp = client.get('/api/repo/abc', headers={'If-None-Match': resp.headers['ETag']})
+        self.assertEqual(304, resp.status_code)
+
+        resp = client.get('/api/repo/abc/stats')
+        self.assertEqual({'repo_id': 'abc', 'size': 4096, 'revision': 0, 'last_commit': None},
+                         json.loads(resp.data))
+
+        self.assertEqual(204, client.delete('/api/repo/abc').status_code)
+        self.assertEqual(404, client.get('/api/repo/abc').status_code)
+
+    def test_changes(self):
+        from svnman import standin
+
+        client = standin.create_app().test_client()
+        for repo_id in ('abc', 'def'):
+            client.post('/api/repo', data=json.dumps({'repo_id': repo_id}))
+
+        changes = json.loads(client.get('/api/changes?since=').data)
+        self.assertEqual(['abc', 'def'], [change['repo_id'] for change in changes['changes']])
+        self.assertFalse(changes['more'])
+        cursor = changes['cursor']
+
+        client.post('/api/repo/abc/access', data=json.dumps({
+            'grant': [{'username': 'harry', 'password': '$2y$hash'}], 'revoke': []}))
+        client.delete('/api/repo/def')
+
+        changes = json.loads(client.get(f'/api/changes?since={cursor}&limit=1').data)
+        self.assertEqual([{'repo_id': 'abc', 'deleted': False, 'access': ['harry']}],
+                         changes['changes'])
+        self.assertTrue(changes['more'])
+
+        changes = json.loads(client.get(f'/api/changes?since={changes["cursor"]}').data)
+        self.assertEqual([{'repo_id': 'def', 'deleted': True, 'access': []}],
+                         changes['changes'])
+        self.assertFalse(changes['more'])
+
+    def test_autocreate(self):
+        from svnman import standin
+
+        client = standin.create_app(autocreate=True).test_client()
+        self.assertEqual(200, client.get('/api/repo/unknown').status_code)